@@ -1,18 +1,22 @@
-from typing import Dict, Any, List
-import anthropic
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 import os
 
-# Initialize Claude client
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", "dummy_key"))
+from agents.router import FAST_PATH_ENABLED, route_locally, router_stats
+from agents.intent_classifier import append_routing_log, get_intent_classifier
+from utils.history import history_messages
+from utils.llm import acreate_message, cacheable_system, create_message
 
-def coordinator_agent(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Central coordinator agent that directs requests to specialized agents.
-    """
+# Minimum probability before the intent classifier's label is trusted
+INTENT_MIN_CONFIDENCE = float(os.environ.get("INTENT_MIN_CONFIDENCE", "0.8"))
+
+# When set, every LLM routing decision is appended here as classifier training data
+ROUTING_LOG_PATH = os.environ.get("ROUTING_LOG_PATH")
+
+def _build_request(state: Dict[str, Any]):
+    """Build the system message and messages array for the coordinator call."""
     input_text = state["input"]
     context = state["context"]
     role = context.get("role", "unknown")
-    history = context.get("conversation_history", [])
     
     # Create system message content
     system_message = """You are an intelligent supply chain coordination assistant.
@@ -30,12 +34,9 @@ def coordinator_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     # Prepare messages array (without system message)
     messages = []
     
-    # Add conversation history
-    for entry in history[-5:]:  # Last 5 exchanges for context
-        messages.append({
-            "role": "user" if entry["role"] == "user" else "assistant",
-            "content": entry["content"]
-        })
+    # Add conversation history: recent turns within this agent's token budget,
+    # plus a summary of older ones
+    messages.extend(history_messages(context, "coordinator"))
     
     # Add current request
     messages.append({
@@ -43,16 +44,60 @@ def coordinator_agent(state: Dict[str, Any]) -> Dict[str, Any]:
         "content": f"User role: {role}\nUser request: {input_text}\n\nWhich agent should handle this and why?"
     })
     
-    # Get response from Claude with system message as parameter
-    response = client.messages.create(
-        model="claude-3-sonnet-20240229",
-        max_tokens=1000,
-        system=system_message,
-        messages=messages
-    )
+    return cacheable_system(system_message, agent="coordinator"), messages
+
+def _fast_path(state: Dict[str, Any]):
+    """
+    Route locally when the request is unambiguous; returns None otherwise.
+
+    The keyword router is tried first, then the trained intent classifier
+    if a model is available.
+    """
+    route = route_batch([state["input"]])[0]
+    return _route_to(state, *route) if route is not None else None
+
+def route_batch(texts: Sequence[str]) -> List[Optional[Tuple[str, str, str]]]:
+    """
+    Local routing for many requests at once, as (agent, path, reason) or None.
+
+    Keyword routing runs per request; the intent classifier then scores all
+    the requests the keywords left undecided in a single pass.
+    """
+    routes: List[Optional[Tuple[str, str, str]]] = [None] * len(texts)
+    if not FAST_PATH_ENABLED:
+        return routes
+    
+    undecided = []
+    for i, text in enumerate(texts):
+        decision = route_locally(text)
+        if decision.agent is not None:
+            routes[i] = (decision.agent, "fast_path", decision.reason)
+        else:
+            undecided.append(i)
     
-    # Parse the response to determine which agent to route to
-    content = response.content[0].text
+    classifier = get_intent_classifier()
+    if classifier is not None and undecided:
+        probabilities = classifier.predict_proba([texts[i] for i in undecided])
+        for i, row in zip(undecided, probabilities):
+            best = int(row.argmax())
+            agent, probability = classifier.labels[best], float(row[best])
+            if probability >= INTENT_MIN_CONFIDENCE:
+                routes[i] = (agent, "classifier", f"Intent classifier routing to {agent} (p={probability:.2f})")
+    return routes
+
+def _route_to(state: Dict[str, Any], next_agent: str, path: str, reason: str) -> Dict[str, Any]:
+    """Record a local routing decision in the context."""
+    context = state["context"]
+    context["routing_reason"] = reason
+    context["routing_path"] = path
+    context["next_agent"] = next_agent
+    router_stats.record(path, next_agent)
+    return {"input": state["input"], "context": context, "next": next_agent}
+
+def _route_from_reply(state: Dict[str, Any], content: str) -> Dict[str, Any]:
+    """Parse the coordinator's reply and pick the next agent."""
+    input_text = state["input"]
+    context = state["context"]
     
     # Simple routing logic
     if "route_optimizer" in content.lower():
@@ -69,7 +114,56 @@ def coordinator_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     
     # Update context with reasoning
     context["routing_reason"] = content
+    context["routing_path"] = "llm"
     context["next_agent"] = next_agent
+    router_stats.record("llm", next_agent)
+    if ROUTING_LOG_PATH:
+        append_routing_log(ROUTING_LOG_PATH, input_text, next_agent)
     
     # Return updated state
-    return {"input": input_text, "context": context, "next": next_agent} 
\ No newline at end of file
+    return {"input": input_text, "context": context, "next": next_agent}
+
+def coordinator_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Central coordinator agent that directs requests to specialized agents.
+    Unambiguous requests are routed locally without calling the LLM.
+    """
+    routed = _fast_path(state)
+    if routed is not None:
+        return routed
+    
+    system_message, messages = _build_request(state)
+    
+    # Get response from Claude with system message as parameter
+    response = create_message(
+        agent="coordinator",
+        system=system_message,
+        messages=messages
+    )
+    
+    return _route_from_reply(state, response.content[0].text)
+
+async def coordinator_agent_async(state: Dict[str, Any], route: Optional[Tuple[str, str, str]] = None) -> Dict[str, Any]:
+    """
+    Non-blocking variant of coordinator_agent for the API's async pipeline.
+
+    route is an (agent, path, reason) decision already made by route_batch.
+    """
+    routed = _route_to(state, *route) if route is not None else _fast_path(state)
+    if routed is not None:
+        return routed
+    return await ask_coordinator_llm_async(state)
+
+async def ask_coordinator_llm_async(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Route with the coordinator LLM only, skipping the local fast paths.
+    """
+    system_message, messages = _build_request(state)
+    
+    response = await acreate_message(
+        agent="coordinator",
+        system=system_message,
+        messages=messages
+    )
+    
+    return _route_from_reply(state, response.content[0].text)
@@ -1,19 +1,18 @@
-from typing import Dict, Any, List
-import anthropic
+from typing import Dict, Any, List, Optional, Callable
 import os
 import json
 import random
 from datetime import datetime
 from langgraph.graph import END
 
-# Initialize Claude client
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", "dummy_key"))
+from utils.history import truncate
+from utils.llm import acreate_message, cacheable_system, create_message
 
-def data_retriever_agent(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Agent specialized in retrieving external data like weather conditions,
-    traffic information, and other relevant environmental factors.
-    """
+# Cap on the weather and traffic block, so the prompt doesn't grow with the data
+DATA_BLOCK_MAX_TOKENS = int(os.environ.get("DATA_RETRIEVER_MAX_DATA_TOKENS", "1500"))
+
+def _build_request(state: Dict[str, Any]):
+    """Build the system message and messages array for the data retrieval call."""
     input_text = state["input"]
     context = state["context"]
     mock_data = context.get("mock_data", {})
@@ -34,30 +33,33 @@ def data_retriever_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     Respond as if you're actively fetching this data from real APIs.
     """
     
+    # Only the weather and traffic this agent reports on, compact and capped; it
+    # is the same for every request until the snapshot is reloaded, so it goes
+    # in the system prefix rather than the user turn
+    data_block = truncate(
+        "Available mock data:\n"
+        f"- Weather: {json.dumps(weather_data, sort_keys=True, separators=(',', ':'))}\n"
+        f"- Traffic: {json.dumps(traffic_data, sort_keys=True, separators=(',', ':'))}",
+        DATA_BLOCK_MAX_TOKENS
+    )
+    
     # Prepare messages array (without system message)
     messages = [
         {
             "role": "user",
             "content": f"""I need the following data based on this request: {input_text}
             
-            Available mock data:
-            - Weather: {json.dumps(weather_data, indent=2)}
-            - Traffic: {json.dumps(traffic_data, indent=2)}
-            
-            Please retrieve and format the relevant information.
+            Please retrieve and format the relevant information from the mock data.
             """
         }
     ]
     
-    # Get response from Claude
-    response = client.messages.create(
-        model="claude-3-sonnet-20240229",
-        max_tokens=1000,
-        system=system_message,
-        messages=messages
-    )
-    
-    content = response.content[0].text
+    return cacheable_system(system_message, data_block, agent="data_retriever"), messages
+
+def _apply_reply(state: Dict[str, Any], content: str) -> Dict[str, Any]:
+    """Record the retrieved data in the context and finish the run."""
+    input_text = state["input"]
+    context = state["context"]
     
     # Update context with the retrieved data
     context["retrieved_data"] = {
@@ -77,4 +79,37 @@ def data_retriever_agent(state: Dict[str, Any]) -> Dict[str, Any]:
         "input": content,
         "context": context,
         "next": next_agent
-    } 
\ No newline at end of file
+    }
+
+def data_retriever_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Agent specialized in retrieving external data like weather conditions,
+    traffic information, and other relevant environmental factors.
+    """
+    system_message, messages = _build_request(state)
+    
+    # Get response from Claude
+    response = create_message(
+        agent="data_retriever",
+        system=system_message,
+        messages=messages
+    )
+    
+    return _apply_reply(state, response.content[0].text)
+
+async def data_retriever_agent_async(state: Dict[str, Any], on_text: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Non-blocking variant of data_retriever_agent for the API's async pipeline.
+
+    Pass on_text to stream the reply; it receives each text delta as it arrives.
+    """
+    system_message, messages = _build_request(state)
+    
+    response = await acreate_message(
+        agent="data_retriever",
+        on_text=on_text,
+        system=system_message,
+        messages=messages
+    )
+    
+    return _apply_reply(state, response.content[0].text)
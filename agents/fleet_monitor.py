@@ -1,32 +1,49 @@
-from typing import Dict, Any, List
-import anthropic
+from typing import Dict, Any, List, Optional, Callable
 import os
 import json
+import math
 import random
+import re
 from datetime import datetime, timedelta
 from langgraph.graph import END
 
-# Initialize Claude client
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", "dummy_key"))
+from logistics.geocoder import geocoder
+from logistics.route_plan import PLANNABLE_STATUSES
+from logistics.vehicle_index import fleet_index
+from models.order import dimensions_volume_m3
+from utils.history import history_messages
+from utils.llm import acreate_message, cacheable_system, create_message
 
-def fleet_monitor_agent(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Agent specialized in monitoring fleet status, vehicle maintenance,
-    and driver performance.
-    """
+# Vehicles listed for "which vehicle is closest to ORD-1004" questions
+NEAREST_VEHICLES = 3
+
+_ORDER_ID_RE = re.compile(r"\bORD-\d+\b", re.IGNORECASE)
+_PROXIMITY_RE = re.compile(r"\b(?:closest|nearest|near|nearby|proximity)\b", re.IGNORECASE)
+
+def _build_request(state: Dict[str, Any]):
+    """Build the system message and messages array for the fleet monitoring call."""
     input_text = state["input"]
     context = state["context"]
     role = context.get("role", "unknown")
-    history = context.get("conversation_history", [])
     mock_data = context.get("mock_data", {})
     
     # Extract vehicle data from mock data
     vehicles = mock_data.get("vehicles", [])
     
-    # Create detailed fleet summary if requested
+    # Create detailed fleet summary if requested; it only changes with the
+    # data snapshot, so it goes in the system prefix
+    data_block = None
     if "summary" in input_text.lower() or "status" in input_text.lower() or "overview" in input_text.lower():
         fleet_summary = create_fleet_summary(vehicles)
-        input_text = f"{input_text}\n\nHere's the current fleet data:\n{fleet_summary}"
+        data_block = f"Here's the current fleet data:\n{fleet_summary}"
+    
+    # Answer proximity questions about specific orders from the spatial index
+    # instead of the handful of vehicles in the summary
+    nearby = ""
+    if _PROXIMITY_RE.search(input_text):
+        blocks = [nearest_vehicles_text(mock_data, order_id.upper()) for order_id in dict.fromkeys(_ORDER_ID_RE.findall(input_text))]
+        if blocks:
+            nearby = "\n        " + "\n\n        ".join(blocks) + "\n"
     
     # Create system message content
     system_message = """You are an intelligent fleet monitoring agent for a supply chain system.
@@ -44,12 +61,9 @@ def fleet_monitor_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     # Prepare messages array (without system message)
     messages = []
     
-    # Add conversation history
-    for entry in history[-5:]:  # Last 5 exchanges for context
-        messages.append({
-            "role": "user" if entry["role"] == "user" else "assistant",
-            "content": entry["content"]
-        })
+    # Add conversation history: recent turns within this agent's token budget,
+    # plus a summary of older ones
+    messages.extend(history_messages(context, "fleet_monitor"))
     
     # Add current request with context
     messages.append({
@@ -62,20 +76,16 @@ def fleet_monitor_agent(state: Dict[str, Any]) -> Dict[str, Any]:
         - Maintenance records: Available for all vehicles
         - Real-time locations: GPS tracking active
         - Driver logs: Performance metrics available
-        
+        {nearby}
         Please respond with fleet status or relevant information.
         """
     })
     
-    # Get response from Claude
-    response = client.messages.create(
-        model="claude-3-sonnet-20240229",
-        max_tokens=2000,
-        system=system_message,
-        messages=messages
-    )
-    
-    content = response.content[0].text
+    return input_text, cacheable_system(system_message, data_block, agent="fleet_monitor"), messages
+
+def _apply_reply(state: Dict[str, Any], input_text: str, content: str) -> Dict[str, Any]:
+    """Store the fleet report or hand it to the next agent."""
+    context = state["context"]
     
     # Determine if we need to fetch additional data or send notifications
     if "weather" in input_text.lower() or "traffic" in input_text.lower():
@@ -96,6 +106,75 @@ def fleet_monitor_agent(state: Dict[str, Any]) -> Dict[str, Any]:
         "next": next_agent
     }
 
+def fleet_monitor_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Agent specialized in monitoring fleet status, vehicle maintenance,
+    and driver performance.
+    """
+    input_text, system_message, messages = _build_request(state)
+    
+    # Get response from Claude
+    response = create_message(
+        agent="fleet_monitor",
+        system=system_message,
+        messages=messages
+    )
+    
+    return _apply_reply(state, input_text, response.content[0].text)
+
+async def fleet_monitor_agent_async(state: Dict[str, Any], on_text: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Non-blocking variant of fleet_monitor_agent for the API's async pipeline.
+
+    Pass on_text to stream the reply; it receives each text delta as it arrives.
+    """
+    input_text, system_message, messages = _build_request(state)
+    
+    response = await acreate_message(
+        agent="fleet_monitor",
+        on_text=on_text,
+        system=system_message,
+        messages=messages
+    )
+    
+    return _apply_reply(state, input_text, response.content[0].text)
+
+def nearest_vehicles_text(mock_data: Dict[str, Any], order_id: str, k: int = NEAREST_VEHICLES) -> str:
+    """
+    The k available vehicles nearest an order's delivery address that have
+    room for its package, as text for the LLM.
+    """
+    order = next((o for o in mock_data.get("orders", []) if o.get("order_id") == order_id), None)
+    if order is None:
+        return f"{order_id}: no such order."
+    location = geocoder.geocode(order.get("address", ""))
+    if location is None:
+        return f"{order_id}: the address {order.get('address')} could not be located."
+    package = order.get("package_details", {})
+    weight_kg = package.get("weight_kg", 0.0)
+    volume_m3 = dimensions_volume_m3(package.get("dimensions"))
+    known_volume = not math.isnan(volume_m3)
+
+    # With unreadable dimensions only the weight can be checked; say so rather than assume an empty box
+    fleet_index.sync(mock_data.get("vehicles", []))
+    neighbors = fleet_index.nearest(location.latitude, location.longitude, k=k, statuses=PLANNABLE_STATUSES,
+                                    min_kg=weight_kg, min_m3=volume_m3 if known_volume else 0.0)
+    volume_text = f"{volume_m3:.3f} m3" if known_volume else "volume unknown"
+    header = (f"Nearest available vehicles to {order_id} ({order.get('address')}; "
+              f"package {weight_kg} kg, {volume_text}):")
+    if not neighbors:
+        return f"{header}\n        - none: no {'/'.join(PLANNABLE_STATUSES)} vehicle has enough free capacity"
+    vehicles = {v.get("vehicle_id"): v for v in mock_data.get("vehicles", [])}
+    lines = [header]
+    for neighbor in neighbors:
+        vehicle = vehicles.get(neighbor.vehicle_id, {})
+        lines.append(
+            f"        - {neighbor.vehicle_id} ({vehicle.get('type', 'vehicle')}, {vehicle.get('driver_name', 'unassigned driver')}): "
+            f"{neighbor.distance_km:.1f} km away, {neighbor.status}, "
+            f"{neighbor.free_kg:.0f} kg / {neighbor.free_m3:.1f} m3 free"
+        )
+    return "\n".join(lines)
+
 def create_fleet_summary(vehicles):
     """Create a text summary of fleet status from mock vehicle data."""
     if not vehicles:
@@ -0,0 +1,147 @@
+"""
+Offline intent classifier for coordinator routing.
+
+A multinomial logistic regression over hashed word and character n-grams,
+trained on the (input, next_agent) pairs the coordinator LLM logs when
+ROUTING_LOG_PATH is set. The model is a single small .npz file, so it loads
+in milliseconds at startup and classifies without any network call.
+
+Train from a routing log:
+    python -m agents.intent_classifier --log data/routing_log.jsonl --out data/intent_model.npz
+"""
+
+import argparse
+import json
+import os
+import re
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+LABELS = ["route_optimizer", "fleet_monitor", "data_retriever", "notification"]
+
+# Hashed feature space size; 4096 buckets is plenty for four routing labels
+N_FEATURES = 2 ** 12
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "intent_model.npz")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[0-9]+)?")
+
+def _ngrams(text: str) -> List[str]:
+    """Word unigrams and bigrams plus character trigrams of each word."""
+    words = _TOKEN_RE.findall(text.lower())
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"^{w}$"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return grams
+
+def hash_features(texts: Sequence[str], n_features: int = N_FEATURES) -> np.ndarray:
+    """Map texts to L2-normalised hashed n-gram count vectors."""
+    X = np.zeros((len(texts), n_features), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for gram in _ngrams(text):
+            X[row, zlib.crc32(gram.encode()) % n_features] += 1.0
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.maximum(norms, 1e-12)
+
+class IntentClassifier:
+    """Multinomial logistic regression over hashed n-gram features."""
+
+    def __init__(self, labels: Sequence[str] = LABELS, n_features: int = N_FEATURES):
+        self.labels = list(labels)
+        self.n_features = n_features
+        self.W = np.zeros((n_features, len(self.labels)), dtype=np.float32)
+        self.b = np.zeros(len(self.labels), dtype=np.float32)
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str], epochs: int = 300, lr: float = 2.0, l2: float = 1e-4) -> "IntentClassifier":
+        """Train with full-batch gradient descent on the cross-entropy loss."""
+        X = hash_features(texts, self.n_features)
+        index = {label: i for i, label in enumerate(self.labels)}
+        Y = np.zeros((len(labels), len(self.labels)), dtype=np.float32)
+        Y[np.arange(len(labels)), [index[label] for label in labels]] = 1.0
+
+        for _ in range(epochs):
+            P = self._softmax(X @ self.W + self.b)
+            grad = (P - Y) / len(X)
+            self.W -= lr * (X.T @ grad + l2 * self.W)
+            self.b -= lr * grad.sum(axis=0)
+        return self
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Class probabilities, one row per text, columns in self.labels order."""
+        return self._softmax(hash_features(texts, self.n_features) @ self.W + self.b)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Return the most likely label for one text and its probability."""
+        proba = self.predict_proba([text])[0]
+        best = int(proba.argmax())
+        return self.labels[best], float(proba[best])
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, W=self.W.astype(np.float16), b=self.b, labels=np.array(self.labels))
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        with np.load(path) as data:
+            model = cls(labels=[str(label) for label in data["labels"]], n_features=data["W"].shape[0])
+            model.W = data["W"].astype(np.float32)
+            model.b = data["b"].astype(np.float32)
+        return model
+
+    @staticmethod
+    def _softmax(Z: np.ndarray) -> np.ndarray:
+        Z = Z - Z.max(axis=1, keepdims=True)
+        E = np.exp(Z)
+        return E / E.sum(axis=1, keepdims=True)
+
+def read_routing_log(path: str) -> Tuple[List[str], List[str]]:
+    """Read (input, next_agent) pairs from a JSONL routing log or replay set."""
+    texts, labels = [], []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            label = record.get("next_agent") or record.get("label")
+            if label in LABELS:
+                texts.append(record["input"])
+                labels.append(label)
+    return texts, labels
+
+def append_routing_log(path: str, input_text: str, next_agent: str) -> None:
+    """Append one coordinator decision to the routing log used for training."""
+    with open(path, "a") as f:
+        f.write(json.dumps({"input": input_text, "next_agent": next_agent}) + "\n")
+
+_model: Optional[IntentClassifier] = None
+_model_loaded = False
+
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """Load the trained model once (INTENT_MODEL_PATH); None if there isn't one."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        path = os.environ.get("INTENT_MODEL_PATH", DEFAULT_MODEL_PATH)
+        _model = IntentClassifier.load(path) if os.path.exists(path) else None
+        _model_loaded = True
+    return _model
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the coordinator intent classifier from a routing log")
+    parser.add_argument("--log", required=True, nargs="+", help="JSONL files of {input, next_agent} records")
+    parser.add_argument("--out", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=300)
+    args = parser.parse_args()
+
+    texts, labels = [], []
+    for path in args.log:
+        t, l = read_routing_log(path)
+        texts += t
+        labels += l
+
+    model = IntentClassifier().fit(texts, labels, epochs=args.epochs)
+    model.save(args.out)
+    accuracy = np.mean([label == model.labels[i] for label, i in zip(labels, model.predict_proba(texts).argmax(axis=1))])
+    print(f"Trained on {len(texts)} examples, training accuracy {accuracy:.3f}, saved to {args.out}")
@@ -1,17 +1,12 @@
-from typing import Dict, Any, List
-import anthropic
+from typing import Dict, Any, List, Optional, Callable
 import os
 from datetime import datetime
 from langgraph.graph import END
 
-# Initialize Claude client
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", "dummy_key"))
+from utils.llm import acreate_message, cacheable_system, create_message
 
-def notification_agent(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Agent specialized in sending notifications and alerts to drivers,
-    admins, and other stakeholders.
-    """
+def _build_request(state: Dict[str, Any]):
+    """Build the system message and messages array for the notification call."""
     input_text = state["input"]
     context = state["context"]
     role = context.get("role", "unknown")
@@ -43,15 +38,11 @@ def notification_agent(state: Dict[str, Any]) -> Dict[str, Any]:
         }
     ]
     
-    # Get response from Claude
-    response = client.messages.create(
-        model="claude-3-sonnet-20240229",
-        max_tokens=1000,
-        system=system_message,
-        messages=messages
-    )
-    
-    content = response.content[0].text
+    return cacheable_system(system_message, agent="notification"), messages
+
+def _apply_reply(state: Dict[str, Any], content: str) -> Dict[str, Any]:
+    """Log the notification in the context and finish the run."""
+    context = state["context"]
     
     # Log the notification
     notification_log = {
@@ -72,4 +63,37 @@ def notification_agent(state: Dict[str, Any]) -> Dict[str, Any]:
         "input": content,
         "context": context,
         "next": END
-    } 
\ No newline at end of file
+    }
+
+def notification_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Agent specialized in sending notifications and alerts to drivers,
+    admins, and other stakeholders.
+    """
+    system_message, messages = _build_request(state)
+    
+    # Get response from Claude
+    response = create_message(
+        agent="notification",
+        system=system_message,
+        messages=messages
+    )
+    
+    return _apply_reply(state, response.content[0].text)
+
+async def notification_agent_async(state: Dict[str, Any], on_text: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Non-blocking variant of notification_agent for the API's async pipeline.
+
+    Pass on_text to stream the reply; it receives each text delta as it arrives.
+    """
+    system_message, messages = _build_request(state)
+    
+    response = await acreate_message(
+        agent="notification",
+        on_text=on_text,
+        system=system_message,
+        messages=messages
+    )
+    
+    return _apply_reply(state, response.content[0].text)
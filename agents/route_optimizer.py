@@ -1,75 +1,63 @@
-from typing import Dict, Any, List
-import anthropic
+from typing import Dict, Any, List, Optional, Callable
+import asyncio
 import os
 import json
 import random
 from datetime import datetime, timedelta
 from langgraph.graph import END
 
-# Initialize Claude client
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", "dummy_key"))
+from logistics.route_plan import format_plan, plan_routes
+from utils.history import history_messages
+from utils.llm import acreate_message, cacheable_system, create_message
 
-def route_optimizer_agent(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Agent specialized in optimizing delivery routes based on orders,
-    traffic conditions, and weather data.
-    """
+def _build_request(state: Dict[str, Any], plan: str):
+    """Build the system message and messages array for the route optimization call; plan is format_plan's text."""
     input_text = state["input"]
     context = state["context"]
     role = context.get("role", "unknown")
-    history = context.get("conversation_history", [])
-    mock_data = context.get("mock_data", {})
     
     # Create system message content
     system_message = """You are an advanced route optimization agent for a supply chain system.
     
     Your capabilities include:
-    - Analyzing delivery orders and generating optimal routes
+    - Explaining delivery routes computed by the routing solver
     - Considering traffic conditions, weather, and time windows
     - Providing ETAs and turn-by-turn directions
     - Adjusting routes based on real-time conditions
     
-    You have access to vehicle data, order information, and external APIs.
-    Respond as if you're actively processing and optimizing routes.
-    
-    When generating routes, include realistic stops with addresses, ETAs, and any relevant details.
+    Each request comes with the current delivery plan, computed by a routing
+    solver from the actual orders, vehicles, capacities and delivery windows.
+    Base your answer on that plan: explain it, highlight late or unassigned
+    orders and suggest what the dispatcher could do about them. Never invent
+    stops, vehicles, addresses or ETAs that are not in the plan.
     """
     
     # Prepare the messages for Claude (without system message)
     messages = []
     
-    # Add conversation history
-    for entry in history[-5:]:  # Last 5 exchanges for context
-        messages.append({
-            "role": "user" if entry["role"] == "user" else "assistant",
-            "content": entry["content"]
-        })
+    # Add conversation history: recent turns within this agent's token budget,
+    # plus a summary of older ones
+    messages.extend(history_messages(context, "route_optimizer"))
     
-    # Add current request with context
+    # Add current request with the computed plan
     messages.append({
         "role": "user", 
         "content": f"""User role: {role}
         User request: {input_text}
         
-        Available mock data:
-        - Orders: {len(mock_data.get('orders', []))} delivery orders
-        - Vehicles: {len(mock_data.get('vehicles', []))} vehicles in fleet
-        - Weather: Current conditions available
-        - Traffic: Real-time traffic data available
+        Current delivery plan from the routing solver:
+        {plan}
         
-        Please respond with optimized routes or relevant information.
+        Please respond with the optimized routes or relevant information.
         """
     })
     
-    # Get response from Claude
-    response = client.messages.create(
-        model="claude-3-sonnet-20240229",
-        max_tokens=2000,
-        system=system_message,
-        messages=messages
-    )
-    
-    content = response.content[0].text
+    return cacheable_system(system_message, agent="route_optimizer"), messages
+
+def _apply_reply(state: Dict[str, Any], content: str) -> Dict[str, Any]:
+    """Store the plan or hand it to the next agent."""
+    input_text = state["input"]
+    context = state["context"]
     
     # Determine next step - data retriever, notification, or end
     if "weather" in input_text.lower() or "traffic" in input_text.lower():
@@ -88,4 +76,40 @@ def route_optimizer_agent(state: Dict[str, Any]) -> Dict[str, Any]:
         "input": content if next_agent != END else input_text,
         "context": context,
         "next": next_agent
-    } 
\ No newline at end of file
+    }
+
+def route_optimizer_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Agent specialized in optimizing delivery routes based on orders,
+    traffic conditions, and weather data.
+    """
+    plan = format_plan(plan_routes(state["context"].get("mock_data", {})))
+    system_message, messages = _build_request(state, plan)
+    
+    # Get response from Claude
+    response = create_message(
+        agent="route_optimizer",
+        system=system_message,
+        messages=messages
+    )
+    
+    return _apply_reply(state, response.content[0].text)
+
+async def route_optimizer_agent_async(state: Dict[str, Any], on_text: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Non-blocking variant of route_optimizer_agent for the API's async pipeline.
+
+    Pass on_text to stream the reply; it receives each text delta as it arrives.
+    The plan is solved on a worker thread so it doesn't hold up the event loop.
+    """
+    plan = format_plan(await asyncio.to_thread(plan_routes, state["context"].get("mock_data", {})))
+    system_message, messages = _build_request(state, plan)
+    
+    response = await acreate_message(
+        agent="route_optimizer",
+        on_text=on_text,
+        system=system_message,
+        messages=messages
+    )
+    
+    return _apply_reply(state, response.content[0].text)
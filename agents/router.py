@@ -0,0 +1,121 @@
+"""
+Local fast-path router for the coordinator.
+
+Scores a request against keyword patterns for each specialist agent and,
+when one agent clearly wins, routes to it without an LLM round trip. Only
+ambiguous requests (no matches, or several agents scoring close together)
+fall through to the coordinator LLM.
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Set ROUTER_FAST_PATH=0 to always ask the coordinator LLM
+FAST_PATH_ENABLED = os.environ.get("ROUTER_FAST_PATH", "1") != "0"
+
+# Minimum share of the total keyword score the winning agent must hold
+MIN_CONFIDENCE = float(os.environ.get("ROUTER_MIN_CONFIDENCE", "0.75"))
+
+# Minimum keyword score before a single weak match is trusted
+MIN_SCORE = 1.5
+
+# (pattern, weight) pairs per agent; patterns are matched on the lowercased request
+ROUTING_PATTERNS: Dict[str, List[Tuple[str, float]]] = {
+    "route_optimizer": [
+        (r"\b(re)?rout(e|es|ed|ing)\b", 2.0),
+        (r"\boptimi[sz](e|ed|ation|ing)\b", 1.5),
+        (r"\b(path|directions?|navigat(e|ion)|eta|stops?)\b", 1.5),
+        (r"\bdeliver(y|ies)\b", 1.0),
+        (r"\b(schedule|itinerary)\b", 0.5),
+    ],
+    "fleet_monitor": [
+        (r"\bfleet\b", 2.0),
+        (r"\b(vehicles?|trucks?|vans?|veh-\d+)\b", 1.5),
+        (r"\b(maintenance|service|servicing|repairs?|engine|brakes?|fuel|telematics)\b", 1.5),
+        (r"\bdrivers?\b", 1.0),
+    ],
+    "data_retriever": [
+        (r"\b(weather|forecast|rain(y|ing)?|snow(ing)?|storms?|fog(gy)?|wind)\b", 2.0),
+        (r"\b(traffic|congestion|incidents?|road closures?)\b", 2.0),
+        (r"\b(interstate|highway|expressway|route 66)\b", 1.0),
+        (r"\bconditions?\b", 0.5),
+    ],
+    "notification": [
+        (r"\bnotif(y|ied|ication|ications)\b", 2.0),
+        (r"\b(alert|alerts|broadcast)\b", 2.0),
+        (r"\b(send|message|inform|tell|email|sms|text)\b", 1.0),
+    ],
+}
+
+_COMPILED = {
+    agent: [(re.compile(pattern), weight) for pattern, weight in patterns]
+    for agent, patterns in ROUTING_PATTERNS.items()
+}
+
+@dataclass
+class RoutingDecision:
+    """Outcome of the local router; agent is None when the request is ambiguous."""
+    agent: Optional[str]
+    confidence: float
+    scores: Dict[str, float]
+
+    @property
+    def reason(self) -> str:
+        ranked = ", ".join(f"{agent}={score:g}" for agent, score in sorted(self.scores.items(), key=lambda kv: -kv[1]) if score)
+        return f"Fast-path keyword routing to {self.agent} (confidence {self.confidence:.2f}; scores: {ranked})"
+
+def score_request(text: str) -> Dict[str, float]:
+    """Sum the keyword weights each agent's patterns match in the text."""
+    lowered = text.lower()
+    return {
+        agent: sum(weight for pattern, weight in patterns if pattern.search(lowered))
+        for agent, patterns in _COMPILED.items()
+    }
+
+def route_locally(text: str, min_confidence: float = MIN_CONFIDENCE) -> RoutingDecision:
+    """Pick an agent if it scores at least MIN_SCORE and holds min_confidence of the total."""
+    scores = score_request(text)
+    total = sum(scores.values())
+    if total == 0:
+        return RoutingDecision(None, 0.0, scores)
+
+    agent, top = max(scores.items(), key=lambda kv: kv[1])
+    confidence = top / total
+    confident = top >= MIN_SCORE and confidence >= min_confidence
+    return RoutingDecision(agent if confident else None, confidence, scores)
+
+class RouterStats:
+    """Thread-safe counters of how often each routing path is taken."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.paths = Counter()
+        self.agents = Counter()
+
+    def record(self, path: str, agent: str) -> None:
+        with self._lock:
+            self.paths[path] += 1
+            self.agents[(path, agent)] += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            total = sum(self.paths.values())
+            by_agent: Dict[str, Dict[str, int]] = {}
+            for (path, agent), count in self.agents.items():
+                by_agent.setdefault(path, {})[agent] = count
+            local = self.paths["fast_path"] + self.paths["classifier"]
+            return {
+                "total": total,
+                "fast_path": self.paths["fast_path"],
+                "classifier": self.paths["classifier"],
+                "llm": self.paths["llm"],
+                "fast_path_ratio": self.paths["fast_path"] / total if total else 0.0,
+                "local_ratio": local / total if total else 0.0,
+                "by_agent": by_agent
+            }
+
+router_stats = RouterStats()
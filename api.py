@@ -1,30 +1,51 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Dict, Any, Optional, List
+import asyncio
+import hashlib
 import json
 import time
-import anthropic
 import os
-from datetime import datetime
+import uuid
 import uvicorn
 
 # Import the agent functions
-from agents.coordinator import coordinator_agent
-from agents.route_optimizer import route_optimizer_agent
-from agents.fleet_monitor import fleet_monitor_agent
-from agents.data_retriever import data_retriever_agent
-from agents.notification import notification_agent
-from utils.api_mock import load_mock_data
-
-# Initialize Claude client
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", "dummy_key"))
+from agents.coordinator import coordinator_agent_async, route_batch
+from agents.router import route_locally, router_stats
+from agents.route_optimizer import route_optimizer_agent_async
+from agents.fleet_monitor import create_fleet_summary, fleet_monitor_agent_async
+from agents.data_retriever import data_retriever_agent_async
+from agents.notification import notification_agent_async
+from logistics.distance_matrix import matrix_service
+from logistics.geocoder import geocoder
+from logistics.vehicle_index import fleet_index
+from utils.admission import QueueFull, create_admission_controller
+from utils.api_mock import get_data_snapshot
+from utils.deadline import DEFAULT_DEADLINE_SECONDS, MAX_DEADLINE_SECONDS, MIN_FALLBACK_SECONDS, MIN_OPTIONAL_HOP_SECONDS, Deadline, DeadlineExceeded
+from utils.fast_json import FastJSONResponse, dumps
+from utils.history import append_turn
+from utils.idempotency import IdempotencyConflict, StoredResponse, create_idempotency_store
+from utils.session_store import create_session_backend
+from utils.singleflight import SingleFlight
+from utils.usage import UsageMeter, add_session_usage, empty_usage, usage_totals
+from utils.circuit_breaker import CircuitOpenError
+from utils.llm import DEFAULT_MODEL, acreate_message, cacheable_system, close_async_client, current_deadline, gateway_stats, llm_breaker, request_scope, response_cache
+from utils.model_tiers import AGENT_TIERS, model_for, tier_report
+from utils.metrics import CONTENT_TYPE, agent_latency, agent_requests, fallback_requests, metrics, track
 
 # Define request model
 class QueryRequest(BaseModel):
     input: str
     role: Optional[str] = "admin"
     session_id: Optional[str] = None
+    bypass_cache: Optional[bool] = False
+    deadline_ms: Optional[int] = Field(None, gt=0, le=int(MAX_DEADLINE_SECONDS * 1000))
+
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]
+    max_parallel: Optional[int] = None
 
 # Define response model
 class QueryResponse(BaseModel):
@@ -33,6 +54,11 @@ class QueryResponse(BaseModel):
 # Create FastAPI app
 app = FastAPI(title="Supply Chain Multi-Agent API")
 
+@app.on_event("shutdown")
+async def shutdown_llm_client():
+    """Release the shared LLM connection pool."""
+    await close_async_client()
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -42,151 +68,593 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store session data
-sessions = {}
+# Store session data, bounded by count and idle time (see SESSION_BACKEND)
+sessions = create_session_backend()
+
+metrics.gauge("supply_chain_sessions", "Live sessions in the session store.", fn=lambda: len(sessions))
+metrics.gauge("supply_chain_llm_in_flight", "Messages API calls currently holding a gateway concurrency slot.", fn=lambda: gateway_stats()["in_flight"])
+if llm_breaker is not None:
+    metrics.gauge("supply_chain_llm_circuit_open", "1 while the LLM circuit breaker is rejecting calls.", fn=lambda: int(llm_breaker.is_open))
+
+# Bound concurrent agent runs, queueing by role priority (see ADMISSION_*)
+admission = create_admission_controller()
+if admission is not None:
+    metrics.gauge("supply_chain_admission_in_flight", "Queries currently running the agent pipeline.", fn=lambda: admission.in_flight)
+    metrics.gauge("supply_chain_admission_queue_depth", "Queries waiting for admission, by role.", ("role",),
+                  fn=lambda: {(role,): depth for role, depth in admission.queue_depth_by_role().items()})
+
+@app.exception_handler(QueueFull)
+async def queue_full_handler(request: Request, exc: QueueFull):
+    """Shed load with 429 and a Retry-After hint when the admission queue is full."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+# Largest accepted /query/batch and the most of its queries run at once
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "500"))
+BATCH_MAX_PARALLEL = int(os.environ.get("BATCH_MAX_PARALLEL", "8"))
+
+# Completed /query responses by Idempotency-Key, replayed to retries
+idempotent_responses = create_idempotency_store()
+
+# Coalesce identical queries that are in flight at the same time
+SINGLEFLIGHT_ENABLED = os.environ.get("SINGLEFLIGHT_ENABLED", "1") != "0"
+query_flights = SingleFlight()
 
 def determine_next_agent(user_message):
     """Determine which specialized agent to call based on the message content."""
-    user_message = user_message.lower()
-    if "route" in user_message or "path" in user_message or "delivery" in user_message:
-        return "route_optimizer"
-    elif "fleet" in user_message or "vehicle" in user_message or "driver" in user_message:
-        return "fleet_monitor"
-    elif "weather" in user_message or "traffic" in user_message or "condition" in user_message:
-        return "data_retriever"
-    elif "notify" in user_message or "alert" in user_message or "send" in user_message:
-        return "notification"
-    return None
+    return route_locally(user_message).agent
+
+# Specialized agents the coordinator can hand off to
+SPECIALIST_AGENTS = {
+    "route_optimizer": route_optimizer_agent_async,
+    "fleet_monitor": fleet_monitor_agent_async,
+    "data_retriever": data_retriever_agent_async,
+    "notification": notification_agent_async
+}
+
+def emit_event(on_event, event, data):
+    """Forward a pipeline event to the listener, if there is one."""
+    if on_event is not None:
+        on_event(event, data)
+
+def text_forwarder(on_event, agent_name):
+    """Build an on_text callback that reports token deltas as events."""
+    if on_event is None:
+        return None
+    return lambda text: on_event("delta", {"agent": agent_name, "text": text})
 
 # Manual agent orchestration instead of using LangGraph
-def process_with_agents(user_input, context):
-    """Process the user input through our agent system manually without LangGraph."""
+async def process_with_agents(user_input, context, on_event=None, deadline=None, route=None):
+    """
+    Process the user input through our agent system manually without LangGraph.
+
+    Every agent call is awaited on the shared async client, so a slow LLM
+    response only suspends this request instead of blocking the event loop.
+    If on_event is given it is called as on_event(event, data) for routing
+    decisions, agent hand-offs and the specialist agents' token deltas.
+
+    With a deadline, each stage runs within the remaining budget. The
+    coordinator and specialist are required; the optional data_retriever and
+    notification hops are skipped (or cut short) when time runs low, and the
+    specialist's reply is returned as a partial answer.
+
+    route is a routing decision already made for this input (see
+    route_batch); the coordinator then only records it.
+    """
     # Initialize state
     state = {
         "input": user_input,
         "context": context,
         "next": ""
     }
-    
+    skipped = []
+
     # Step 1: First, let coordinator determine which agent to use
     try:
-        coordinator_result = coordinator_agent(state)
+        with track(agent_requests, agent_latency, agent="coordinator"):
+            coordinator_result = await within(deadline, coordinator_agent_async(state, route), "coordinator")
         next_agent = coordinator_result.get("next", "")
         state = coordinator_result  # Update state
     except Exception as e:
         print(f"Error in coordinator_agent: {str(e)}")
         return {"error": str(e), "context": context}
-    
+
+    emit_event(on_event, "routing", {
+        "agent": next_agent,
+        "path": state["context"].get("routing_path", "llm"),
+        "reason": state["context"].get("routing_reason", "")
+    })
+
     # Step 2: Call the specialized agent determined by coordinator
     try:
-        if next_agent == "route_optimizer":
-            agent_result = route_optimizer_agent(state)
-        elif next_agent == "fleet_monitor":
-            agent_result = fleet_monitor_agent(state)
-        elif next_agent == "data_retriever":
-            agent_result = data_retriever_agent(state)
-        elif next_agent == "notification":
-            agent_result = notification_agent(state)
-        else:
-            # If no specific agent is identified, use route_optimizer as default
-            agent_result = route_optimizer_agent(state)
+        # If no specific agent is identified, use route_optimizer as default
+        if next_agent not in SPECIALIST_AGENTS:
+            next_agent = "route_optimizer"
+        emit_event(on_event, "handoff", {"from": "coordinator", "to": next_agent})
+        with track(agent_requests, agent_latency, agent=next_agent):
+            agent_result = await within(deadline, SPECIALIST_AGENTS[next_agent](state, on_text=text_forwarder(on_event, next_agent)), next_agent)
         
         # Update state
         state = agent_result
     except Exception as e:
         print(f"Error in {next_agent}: {str(e)}")
         return {"error": str(e), "context": context}
-    
+
     # Step 3: If needed, call the data retriever
+    if state.get("next") == "data_retriever" and not optional_hop_allowed(deadline):
+        state = skip_hop(state, next_agent, skipped, on_event)
     if state.get("next") == "data_retriever":
         try:
-            data_result = data_retriever_agent(state)
+            emit_event(on_event, "handoff", {"from": next_agent, "to": "data_retriever"})
+            with track(agent_requests, agent_latency, agent="data_retriever"):
+                data_result = await within(deadline, data_retriever_agent_async(state, on_text=text_forwarder(on_event, "data_retriever")), "data_retriever")
             state = data_result
+        except DeadlineExceeded:
+            state = skip_hop(state, next_agent, skipped, on_event)
         except Exception as e:
             print(f"Error in data_retriever: {str(e)}")
             return {"error": str(e), "context": context}
-    
+
     # Step 4: If needed, call the notification agent
+    if state.get("next") == "notification" and not optional_hop_allowed(deadline):
+        state = skip_hop(state, next_agent, skipped, on_event)
     if state.get("next") == "notification":
         try:
-            notif_result = notification_agent(state)
+            emit_event(on_event, "handoff", {"from": next_agent, "to": "notification"})
+            with track(agent_requests, agent_latency, agent="notification"):
+                notif_result = await within(deadline, notification_agent_async(state, on_text=text_forwarder(on_event, "notification")), "notification")
             state = notif_result
+        except DeadlineExceeded:
+            state = skip_hop(state, next_agent, skipped, on_event)
         except Exception as e:
             print(f"Error in notification_agent: {str(e)}")
             return {"error": str(e), "context": context}
-    
+
     # Return the final state
-    return {"result": state, "context": state.get("context", context)}
+    return {"result": state, "context": state.get("context", context), "skipped": skipped}
+
+async def within(deadline, awaitable, stage):
+    """Await a pipeline stage, bounded by the deadline if there is one."""
+    if deadline is None:
+        return await awaitable
+    return await deadline.run(awaitable, stage)
+
+def optional_hop_allowed(deadline):
+    """Whether enough budget is left to start an optional hop."""
+    return deadline is None or deadline.allows(MIN_OPTIONAL_HOP_SECONDS)
+
+def skip_hop(state, from_agent, skipped, on_event=None):
+    """
+    Skip the optional hop state["next"] for lack of time.
+
+    The previous agent's reply (carried in state["input"]) becomes the final
+    answer, as if that agent had ended the run itself.
+    """
+    hop = state["next"]
+    skipped.append(hop)
+    emit_event(on_event, "skipped", {"agent": hop, "from": from_agent, "reason": "deadline"})
+    context = state["context"]
+    context["messages"] = context.get("messages", []) + [{"role": "assistant", "content": state["input"]}]
+    return {"input": state["input"], "context": context, "next": ""}
 
 @app.post("/query", response_model=QueryResponse)
-async def process_query(request: QueryRequest):
+async def process_query(request: QueryRequest, idempotency_key: Optional[str] = Header(None)):
     """
     Process a query through the multi-agent system.
+
+    With an Idempotency-Key header, a retry of a completed request gets the
+    original response bytes back (marked Idempotency-Replayed: true) without
+    re-running the agents or touching the session again; a retry of one
+    still in progress waits for it.
+    """
+    if idempotency_key is None:
+        return FastJSONResponse(await admitted_query(request))
+
+    async def run():
+        response = FastJSONResponse(await admitted_query(request))
+        return StoredResponse(response.status_code, response.body, response.media_type, fingerprint)
+
+    fingerprint = hashlib.sha256(request.model_dump_json().encode()).hexdigest()
+    try:
+        stored, replayed = await idempotent_responses.run(idempotency_key, fingerprint, run)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    headers = {"Idempotency-Replayed": "true"} if replayed else {}
+    return Response(content=stored.body, status_code=stored.status_code, media_type=stored.media_type, headers=headers)
+
+async def admitted_query(request: QueryRequest):
+    """Run handle_query once admission control lets the request in."""
+    if admission is None:
+        return await handle_query(request)
+    async with admission.admit(request.role):
+        return await handle_query(request)
+
+@app.post("/query/stream")
+async def process_query_stream(request: QueryRequest):
+    """
+    Process a query and stream progress as server-sent events.
+
+    Emits `routing`, `handoff` and `delta` events while the agents run and
+    finishes with a `done` event carrying the same envelope as /query.
+    """
+    # Wait for admission before the stream starts, so a full queue is a plain 429
+    if admission is not None:
+        await admission.acquire(request.role)
+    queue = asyncio.Queue()
+
+    async def run():
+        start = time.perf_counter()
+        try:
+            response = await handle_query(request, on_event=lambda event, data: queue.put_nowait((event, data)))
+        except Exception as e:
+            response = create_error_response(request.input, str(e), request.session_id)
+        finally:
+            if admission is not None:
+                admission.release(time.perf_counter() - start)
+        queue.put_nowait(("done", response))
+
+    # Run the pipeline independently of the client so the session is
+    # still updated if the caller disconnects mid-stream
+    task = asyncio.create_task(run())
+
+    async def event_stream():
+        while True:
+            event, data = await queue.get()
+            yield format_sse(event, data)
+            if event == "done":
+                break
+        await task
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/batch")
+async def process_query_batch(batch: BatchQueryRequest):
+    """
+    Process many queries in one round trip; results come back in request order.
+
+    All inputs are routed locally in one pass and the batch shares one data
+    snapshot. Queries are started grouped by agent and run at most
+    max_parallel (capped by BATCH_MAX_PARALLEL) at a time; queries on the
+    same session run one after another, in order, so each sees the last.
+    """
+    if len(batch.queries) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch of {len(batch.queries)} queries exceeds the limit of {BATCH_MAX_SIZE}")
+
+    snapshot = get_data_snapshot()
+    routes = route_batch([query.input for query in batch.queries])
+    results = [None] * len(batch.queries)
+    semaphore = asyncio.Semaphore(max(1, min(batch.max_parallel or BATCH_MAX_PARALLEL, BATCH_MAX_PARALLEL)))
+
+    async def run_one(i):
+        query = batch.queries[i]
+        async with semaphore:
+            try:
+                if admission is None:
+                    results[i] = await handle_query(query, snapshot=snapshot, route=routes[i])
+                else:
+                    async with admission.admit(query.role):
+                        results[i] = await handle_query(query, snapshot=snapshot, route=routes[i])
+            except QueueFull as e:
+                results[i] = create_error_response(query.input, f"{e} (retry after {e.retry_after}s)", query.session_id)
+            except Exception as e:
+                results[i] = create_error_response(query.input, str(e), query.session_id)
+
+    async def run_chain(indices):
+        for i in indices:
+            await run_one(i)
+
+    # One chain per session (queries without one are independent), started grouped by agent
+    chains = {}
+    for i, query in enumerate(batch.queries):
+        chains.setdefault(query.session_id or i, []).append(i)
+    def chain_agent(indices):
+        route = routes[indices[0]]
+        return (route is None, route[0] if route else "")
+
+    ordered = sorted(chains.values(), key=chain_agent)
+    await asyncio.gather(*(run_chain(indices) for indices in ordered))
+
+    return FastJSONResponse({"results": results})
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Report LLM response cache hits, misses, bypasses and evictions.
+    """
+    return response_cache.snapshot() if response_cache is not None else {"enabled": False}
+
+@app.get("/singleflight/stats")
+async def get_singleflight_stats():
+    """
+    Report how many queries were coalesced onto an identical in-flight query.
+    """
+    return query_flights.snapshot()
+
+@app.get("/usage")
+async def get_usage():
+    """
+    Report real LLM token usage per agent since the process started.
+    """
+    return usage_totals.to_dict()
+
+@app.get("/usage/{session_id}")
+async def get_session_usage(session_id: str):
+    """
+    Report the token usage accumulated by one session.
+    """
+    context = await session_call(sessions.get, session_id)
+    if context is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return context.get("usage", {"total": empty_usage(), "by_agent": {}})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Expose agent, fallback, LLM and session metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+@app.get("/idempotency/stats")
+async def get_idempotency_stats():
+    """
+    Report idempotent /query executions, replays and key conflicts.
+    """
+    return idempotent_responses.snapshot()
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    """
+    Report queries running, queued by role and refused by admission control.
+    """
+    return admission.snapshot() if admission is not None else {"enabled": False}
+
+@app.get("/circuit/stats")
+async def get_circuit_stats():
+    """
+    Report the LLM circuit breaker's state and how many calls it rejected.
+    """
+    return llm_breaker.snapshot() if llm_breaker is not None else {"enabled": False}
+
+@app.get("/llm/stats")
+async def get_llm_stats():
+    """
+    Report the LLM gateway's calls in flight, retries and rate limiter state.
+    """
+    return gateway_stats()
+
+@app.get("/llm/tiers")
+async def get_llm_tiers():
+    """
+    Report latency, tokens and estimated cost per model tier, and which
+    model and max_tokens each agent is using.
+    """
+    return tier_report.snapshot()
+
+@app.get("/matrix/stats")
+async def get_matrix_stats():
+    """
+    Report travel-matrix cache hits, full builds and incremental updates.
+    """
+    return matrix_service.snapshot()
+
+@app.get("/geocoder/stats")
+async def get_geocoder_stats():
+    """
+    Report geocoding lookups, memo hits and street/town match counts.
+    """
+    return geocoder.snapshot()
+
+@app.get("/fleet/index/stats")
+async def get_fleet_index_stats():
+    """
+    Report vehicle spatial-index size, queries and cells searched.
+    """
+    return fleet_index.snapshot()
+
+@app.get("/router/stats")
+async def get_router_stats():
+    """
+    Report how often queries were routed locally versus by the coordinator LLM.
+    """
+    return router_stats.snapshot()
+
+def format_sse(event, data):
+    """Encode one server-sent event."""
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+async def handle_query(request: QueryRequest, on_event=None, snapshot=None, route=None):
+    """
+    Run one query turn against its session and build the response envelope.
+
+    The turn's time budget starts here: deadline_ms from the request, or
+    QUERY_DEADLINE_SECONDS. Batches pass in the data snapshot and routing
+    decision they share across their queries.
+    """
+    budget = request.deadline_ms / 1000 if request.deadline_ms else DEFAULT_DEADLINE_SECONDS
+    deadline = Deadline.after(budget)
+    snapshot = snapshot or get_data_snapshot()
+    with request_scope(data_version=snapshot.version, bypass_cache=request.bypass_cache, deadline=deadline):
+        return await run_query_turn(request, snapshot, on_event, route)
+
+async def run_query_turn(request: QueryRequest, snapshot, on_event=None, route=None):
+    """
+    Process one turn with LLM options for this request already in scope.
+
+    Identical queries in flight at the same time (same normalized input,
+    role and data version) share a single agent run; each caller still
+    records the turn in its own session.
     """
     # Generate a session ID if not provided
-    session_id = request.session_id or f"session_{datetime.now().strftime('%Y%m%d%H%M%S')}_{hash(request.input) % 10000}"
-    
+    session_id = request.session_id or f"session_{uuid.uuid4().hex}"
+
     # Initialize or retrieve session context
-    if session_id not in sessions:
-        sessions[session_id] = {
-            "role": request.role,
-            "mock_data": load_mock_data(),
-            "conversation_history": [],
-            "messages": []
-        }
-    
-    context = sessions[session_id]
-    
+    context = await session_call(sessions.update, session_id, lambda stored: stored or new_session_context(request.role))
+    notifications_seen = len(context.get("notifications", []))
+
+    # Point the session at the current shared data snapshot
+    context["mock_data"] = snapshot.data
+    context["data_version"] = snapshot.version
+
+    # Only turns with the same conversation so far may share a run; the answer
+    # is built from the leader's history and copied into every caller's session
+    history_key = history_fingerprint(context)
+
     # Add user input to conversation history
-    context["conversation_history"].append({"role": "user", "content": request.input})
-    
-    # Start request timing for metrics
-    start_time = time.time()
-    
+    append_turn(context, "user", request.input)
+
+    if SINGLEFLIGHT_ENABLED:
+        key = (normalize_query(request.input), request.role, snapshot.version, history_key, bool(request.bypass_cache))
+        outcome, shared = await coalesced_answer(key, request, context, on_event, route)
+        if shared:
+            adopt_outcome(context, outcome, on_event)
+            query_flights.record_saved_calls(outcome["llm_calls"])
+    else:
+        outcome, shared = await answer_query(request, context, on_event, route), False
+
+    # Save the turn on top of whatever concurrent turns on this session saved meanwhile;
+    # only the caller that ran the agents was billed for them, here and in its response
+    entries = [("user", request.input)]
+    if outcome["content"] is not None:
+        entries.append(("assistant", outcome["content"]))
+    usage = UsageMeter().to_dict() if shared else outcome["usage"]
+    await session_call(sessions.update, session_id, lambda stored: merge_turn(stored, context, entries, usage, notifications_seen))
+
+    if outcome["content"] is None:
+        return create_error_response(request.input, outcome["error"], session_id)
+    return create_response(request.input, outcome["content"], outcome["error"], session_id, agent_used=outcome["agent_used"], usage=usage, skipped_agents=outcome["skipped_agents"], shared=shared)
+
+async def coalesced_answer(key, request: QueryRequest, context, on_event=None, route=None):
+    """
+    answer_query through the singleflight group, waiting no longer than this request's own deadline.
+
+    A caller that joined someone else's run (or whose own run overruns)
+    gets the local answer when its deadline passes; the shared run carries
+    on for the callers still waiting on it.
+    """
+    flight = asyncio.ensure_future(query_flights.do(key, lambda: answer_query(request, context, on_event, route)))
+    try:
+        return await within(current_deadline(), asyncio.shield(flight), "shared query")
+    except DeadlineExceeded as e:
+        flight.add_done_callback(_discard_result)
+        outcome = local_outcome(request, context, str(e), on_event)
+        outcome.update(usage=UsageMeter().to_dict(), llm_calls=0, context_updates={})
+        return outcome, False
+
+def _discard_result(future):
+    """Retrieve an abandoned shared run's exception so it isn't logged as never retrieved."""
+    if not future.cancelled():
+        future.exception()
+
+async def session_call(method, *args):
+    """Call a session store method, off the event loop if the backend does blocking I/O."""
+    if sessions.blocking:
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+def new_session_context(role):
+    return {"role": role, "conversation_history": [], "messages": []}
+
+# Context entries a turn adds to rather than overwrites
+ACCUMULATED_KEYS = ("conversation_history", "history_summary", "usage", "notifications", "messages")
+
+def merge_turn(stored, context, entries, usage, notifications_seen):
+    """
+    Apply a finished turn to the session context as it is stored now.
+
+    Turns running concurrently on one session each started from their own
+    copy, so this turn's history entries, token usage and new notifications
+    are appended to what the others already saved; only the per-turn
+    bookkeeping (routing, retrieved data, data version) overwrites theirs.
+    """
+    merged = stored if stored is not None else new_session_context(context["role"])
+    merged.update({key: value for key, value in context.items() if key not in ACCUMULATED_KEYS})
+    for role, content in entries:
+        append_turn(merged, role, content)
+    if usage is not None:
+        add_session_usage(merged, usage)
+    added = context.get("notifications", [])[notifications_seen:]
+    if added:
+        merged.setdefault("notifications", []).extend(added)
+    merged["messages"] = []  # Clear for next round
+    return merged
+
+def history_fingerprint(context):
+    """Hash of a session's conversation history and summary, for the coalescing key."""
+    history = json.dumps([context.get("conversation_history", []), context.get("history_summary", "")], separators=(",", ":"))
+    return hashlib.blake2b(history.encode(), digest_size=16).hexdigest()
+
+def normalize_query(text):
+    """Canonical form of a query for coalescing: lowercase, single spaces, no trailing punctuation."""
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+# Context entries a coalesced caller copies from the run it shared
+SHARED_CONTEXT_KEYS = ("routing_reason", "routing_path", "next_agent", "retrieved_data")
+
+def adopt_outcome(context, outcome, on_event=None):
+    """Apply another request's agent run to this caller's session context."""
+    for key, value in outcome["context_updates"].items():
+        context[key] = value
+    if outcome["content"] is not None:
+        emit_event(on_event, "delta", {"agent": outcome["agent_used"] or "coordinator", "text": outcome["content"]})
+
+async def answer_query(request: QueryRequest, context, on_event=None, route=None):
+    """
+    Run the agents (or the fallback) for one query without touching the session store.
+
+    Returns an outcome dict with the answer content (None if even the
+    fallback failed), the error if any, the agent used, the context entries
+    other callers may adopt, and the real token usage of the LLM calls made.
+    """
+    meter = UsageMeter()
+    with request_scope(usage=meter):
+        outcome = await run_agents_with_fallback(request, context, on_event, route)
+    outcome["usage"] = meter.to_dict()
+    outcome["llm_calls"] = outcome["usage"]["total"]["calls"]
+    outcome["context_updates"] = {key: context[key] for key in SHARED_CONTEXT_KEYS if key in context}
+    return outcome
+
+async def fallback_completion(request: QueryRequest, on_event=None):
+    """Answer directly with a single LLM call when the agent pipeline fails."""
+    try:
+        fallback_response = await within(current_deadline(), acreate_message(
+            agent="fallback",
+            on_text=text_forwarder(on_event, "fallback"),
+            system=cacheable_system(f"You are a helpful supply chain assistant for a {request.role}. You have mock data about vehicles and fleet operations to reference.", agent="fallback"),
+            messages=[{"role": "user", "content": request.input}]
+        ), "fallback")
+    except Exception:
+        fallback_requests.inc(outcome="error")
+        raise
+    fallback_requests.inc(outcome="ok")
+    return fallback_response.content[0].text
+
+async def run_agents_with_fallback(request: QueryRequest, context, on_event=None, route=None):
+    """Process with the agent pipeline, falling back to a direct LLM answer on error."""
     try:
         # Process with our manual agent workflow instead of LangGraph
-        agent_result = process_with_agents(request.input, context)
+        agent_result = await process_with_agents(request.input, context, on_event=on_event, deadline=current_deadline(), route=route)
         
         if "error" in agent_result:
             # Fall back to direct Claude API if there's an error
-            try:
-                fallback_response = client.messages.create(
-                    model="claude-3-sonnet-20240229",
-                    max_tokens=2000,
-                    system=f"You are a helpful supply chain assistant for a {request.role}. You have mock data about vehicles and fleet operations to reference.",
-                    messages=[{"role": "user", "content": request.input}]
-                )
-                response_content = fallback_response.content[0].text
-                
-                # Update context with fallback response
-                context["conversation_history"].append({"role": "assistant", "content": response_content})
-                sessions[session_id] = context
-                
-                # Return formatted error response
-                return create_response(request.input, response_content, agent_result.get("error"), session_id)
-            except Exception as inner_e:
-                # If even the fallback fails, return an error message
-                error_msg = f"Error processing request: {agent_result.get('error')}. Fallback also failed: {str(inner_e)}"
-                return create_error_response(request.input, error_msg, session_id)
-        else:
-            # Get the final state and context
-            final_context = agent_result.get("context", context)
-            
-            # Get response from messages
-            response_content = "I'm sorry, there was an error processing your request."
-            if "messages" in final_context and final_context["messages"]:
-                response_content = final_context["messages"][-1]["content"]
-            
-            # Update the session context
-            sessions[session_id] = final_context
-            sessions[session_id]["messages"] = []  # Clear for next round
-            
-            # Add to conversation history
-            sessions[session_id]["conversation_history"].append({"role": "assistant", "content": response_content})
-            
-            # Return formatted successful response
-            return create_response(request.input, response_content, None, session_id)
-    
+            return await fallback_outcome(request, context, agent_result.get("error"), on_event)
+        
+        # Get the final state and context
+        final_context = agent_result.get("context", context)
+        
+        # Get response from messages
+        response_content = "I'm sorry, there was an error processing your request."
+        if "messages" in final_context and final_context["messages"]:
+            response_content = final_context["messages"][-1]["content"]
+        
+        return {"content": response_content, "error": None, "agent_used": final_context.get("next_agent"), "skipped_agents": agent_result["skipped"]}
+
     except Exception as e:
         # Log the full exception for debugging
         import traceback
@@ -194,75 +662,151 @@ async def process_query(request: QueryRequest):
         print(traceback.format_exc())
         
         # Fall back to direct Claude API
-        try:
-            fallback_response = client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=2000,
-                system=f"You are a helpful supply chain assistant for a {request.role}. You have mock data about vehicles and fleet operations to reference.",
-                messages=[{"role": "user", "content": request.input}]
-            )
-            response_content = fallback_response.content[0].text
-            
-            # Update context with fallback response
-            context["conversation_history"].append({"role": "assistant", "content": response_content})
-            sessions[session_id] = context
-            
-            # Return formatted error response
-            return create_response(request.input, response_content, str(e), session_id)
-        except Exception as inner_e:
-            # If even the fallback fails, return an error message
-            error_msg = f"Error processing request: {str(e)}. Fallback also failed: {str(inner_e)}"
-            return create_error_response(request.input, error_msg, session_id)
-
-def create_response(input_text, content, error=None, session_id=None):
-    """Create a standardized response object."""
-    # Calculate approximate token counts
-    input_tokens = len(input_text.split()) * 1.3
-    output_tokens = len(content.split()) * 1.3
-    
-    # Determine which agent was used
-    agent_used = determine_next_agent(input_text) or "coordinator"
-    
-    # Create response with the required format
-    response = {
-        "output": {
-            "content": content,
-            "additional_kwargs": {} if not error else {"error": error},
-            "response_metadata": {
-                "token_usage": {
-                    "completion_tokens": int(output_tokens),
-                    "prompt_tokens": int(input_tokens),
-                    "total_tokens": int(input_tokens + output_tokens)
-                },
-                "model_name": "claude-3-sonnet-20240229",
-                "finish_reason": "stop" if not error else "error",
-                "content_filter_results": {
-                    "hate": {"filtered": False, "severity": "safe"},
-                    "self_harm": {"filtered": False, "severity": "safe"},
-                    "sexual": {"filtered": False, "severity": "safe"},
-                    "violence": {"filtered": False, "severity": "safe"}
-                }
-            },
-            "type": "ai",
-            "id": f"run-{session_id}-{int(time.time())}",
-            "example": False,
-            "tool_calls": [],
-            "invalid_tool_calls": [],
-            "usage_metadata": {
-                "input_tokens": int(input_tokens),
-                "output_tokens": int(output_tokens),
-                "total_tokens": int(input_tokens + output_tokens),
-                "input_token_details": {},
-                "output_token_details": {}
-            },
-            "agent_used": agent_used
-        }
+        return await fallback_outcome(request, context, str(e), on_event)
+
+async def fallback_outcome(request: QueryRequest, context, error, on_event=None):
+    """
+    Answer a query whose agent pipeline failed.
+
+    Tries the direct fallback completion, unless the LLM circuit breaker is
+    open or the deadline leaves less than MIN_FALLBACK_SECONDS: then the
+    provider is not asked a second time and the query is answered locally
+    from the data snapshot.
+    """
+    deadline = current_deadline()
+    if llm_breaker is not None and llm_breaker.is_open:
+        return local_outcome(request, context, error, on_event)
+    if deadline is not None and not deadline.allows(MIN_FALLBACK_SECONDS):
+        return local_outcome(request, context, error, on_event)
+    try:
+        response_content = await fallback_completion(request, on_event)
+        return {"content": response_content, "error": error, "agent_used": None, "skipped_agents": []}
+    except (CircuitOpenError, DeadlineExceeded):
+        return local_outcome(request, context, error, on_event)
+    except Exception as inner_e:
+        if llm_breaker is not None and llm_breaker.is_open:
+            # This failure is the one that tripped the breaker
+            return local_outcome(request, context, error, on_event)
+        # If even the fallback fails, return an error message
+        error_msg = f"Error processing request: {error}. Fallback also failed: {str(inner_e)}"
+        return {"content": None, "error": error_msg, "agent_used": None, "skipped_agents": []}
+
+def local_outcome(request: QueryRequest, context, error, on_event=None):
+    """Serve a deterministic answer built from the data snapshot, without any LLM call."""
+    fallback_requests.inc(outcome="local")
+    content = local_answer(request.input, context)
+    emit_event(on_event, "delta", {"agent": "local", "text": content})
+    return {"content": content, "error": f"LLM unavailable, answered from local data: {error}", "agent_used": "local", "skipped_agents": []}
+
+def local_answer(user_input, context):
+    """
+    Summarize the current data for the agent the query was (or would be) routed to.
+
+    Weather and traffic questions get the data_retriever's raw conditions;
+    everything else gets the fleet summary.
+    """
+    mock_data = context.get("mock_data", {})
+    agent = context.get("next_agent") or determine_next_agent(user_input)
+    header = "The AI assistant is temporarily unavailable, so here is a summary taken directly from the current data."
+    if agent == "data_retriever":
+        weather = "\n".join(f"- {city}: {w.get('condition')}, {w.get('temperature_c')}°C, wind {w.get('wind_speed_kmh')} km/h"
+                             for city, w in mock_data.get("weather", {}).items())
+        traffic = "\n".join(f"- {road}: congestion {t.get('congestion_level')}/10, delay {t.get('estimated_delay_minutes')} min"
+                             for road, t in mock_data.get("traffic", {}).items())
+        return f"{header}\n\nWeather:\n{weather}\n\nTraffic:\n{traffic}"
+    return f"{header}\n{create_fleet_summary(mock_data.get('vehicles', []))}"
+
+# Parts of the response envelope that are the same for every response.
+# create_response copies the skeletons and fills in the per-request fields;
+# the nested constants are shared between responses and must not be mutated.
+MODEL_NAME = DEFAULT_MODEL
+CONTENT_FILTER_RESULTS = {
+    "hate": {"filtered": False, "severity": "safe"},
+    "self_harm": {"filtered": False, "severity": "safe"},
+    "sexual": {"filtered": False, "severity": "safe"},
+    "violence": {"filtered": False, "severity": "safe"}
+}
+_NO_DETAILS = {}
+_NO_CALLS = []
+_RESPONSE_METADATA_SKELETON = {
+    "token_usage": None,
+    "usage_by_agent": _NO_DETAILS,
+    "partial": False,
+    "skipped_agents": _NO_CALLS,
+    "model_name": MODEL_NAME,
+    "finish_reason": "stop",
+    "content_filter_results": CONTENT_FILTER_RESULTS
+}
+_OUTPUT_SKELETON = {
+    "content": None,
+    "additional_kwargs": _NO_DETAILS,
+    "response_metadata": None,
+    "type": "ai",
+    "id": None,
+    "example": False,
+    "tool_calls": _NO_CALLS,
+    "invalid_tool_calls": _NO_CALLS,
+    "usage_metadata": None,
+    "agent_used": None
+}
+
+def create_response(input_text, content, error=None, session_id=None, agent_used=None, usage=None, skipped_agents=None, shared=False):
+    """
+    Create a standardized response object.
+
+    usage is the query's UsageMeter.to_dict(); token counts are estimated
+    from the text only when it isn't available. skipped_agents lists the
+    optional hops dropped to meet the deadline, which marks the answer partial.
+    shared marks an answer taken from another request's coalesced run; its
+    usage is zero, since the tokens were billed to that request.
+    """
+    if usage is not None:
+        totals = usage["total"]
+        cache_creation = totals["cache_creation_input_tokens"]
+        cache_read = totals["cache_read_input_tokens"]
+        input_tokens = totals["input_tokens"] + cache_creation + cache_read
+        output_tokens = totals["output_tokens"]
+        input_token_details = {"cache_creation": cache_creation, "cache_read": cache_read}
+    else:
+        # Calculate approximate token counts
+        input_tokens = int(len(input_text.split()) * 1.3)
+        output_tokens = int(len(content.split()) * 1.3)
+        input_token_details = _NO_DETAILS
+    total_tokens = input_tokens + output_tokens
+
+    # Determine which agent was used if the pipeline didn't say
+    agent_used = agent_used or determine_next_agent(input_text) or "coordinator"
+
+    metadata = _RESPONSE_METADATA_SKELETON.copy()
+    metadata["token_usage"] = {"completion_tokens": output_tokens, "prompt_tokens": input_tokens, "total_tokens": total_tokens}
+    if agent_used in AGENT_TIERS:
+        metadata["model_name"] = model_for(agent_used)
+    if usage is not None:
+        metadata["usage_by_agent"] = usage["by_agent"]
+    if shared:
+        metadata["shared"] = True
+    if skipped_agents:
+        metadata["partial"] = True
+        metadata["skipped_agents"] = skipped_agents
+
+    output = _OUTPUT_SKELETON.copy()
+    output["content"] = content
+    output["response_metadata"] = metadata
+    output["id"] = f"run-{session_id}-{int(time.time())}"
+    output["usage_metadata"] = {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": total_tokens,
+        "input_token_details": input_token_details,
+        "output_token_details": _NO_DETAILS
     }
-    
+    output["agent_used"] = agent_used
     if error:
-        response["output"]["error"] = error
-    
-    return response
+        output["additional_kwargs"] = {"error": error}
+        metadata["finish_reason"] = "error"
+        output["error"] = error
+
+    return {"output": output}
 
 def create_error_response(input_text, error_message, session_id=None):
     """Create a standardized error response."""
@@ -276,7 +820,7 @@ def create_error_response(input_text, error_message, session_id=None):
                     "prompt_tokens": int(len(input_text.split()) * 1.3),
                     "total_tokens": int(len(input_text.split()) * 1.3)
                 },
-                "model_name": "claude-3-sonnet-20240229",
+                "model_name": MODEL_NAME,
                 "finish_reason": "error"
             },
             "type": "error",
@@ -4,7 +4,6 @@ import json
 import time
 import random
 from typing import Dict, List, Any, Tuple, Generator
-import anthropic
 from datetime import datetime
 from langgraph.graph import StateGraph, END
 from typing import TypedDict
@@ -19,10 +18,9 @@ from agents.route_optimizer import route_optimizer_agent
 from agents.fleet_monitor import fleet_monitor_agent
 from agents.data_retriever import data_retriever_agent
 from agents.notification import notification_agent
-from utils.api_mock import load_mock_data
-
-# Initialize Claude client (using environment variable for API key)
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", "dummy_key"))
+from utils.api_mock import get_data_snapshot
+from utils.history import append_turn
+from utils.llm import create_message, request_scope
 
 # Define the state schema
 class AgentState(TypedDict):
@@ -389,7 +387,7 @@ def initialize_session_state():
     if 'context' not in st.session_state:
         st.session_state.context = {
             "role": None,
-            "mock_data": load_mock_data(),
+            "mock_data": get_data_snapshot().data,
             "conversation_history": [],
             "messages": []
         }
@@ -458,7 +456,7 @@ def process_user_message(user_message: str, agent_status_placeholder=None):
     st.session_state.messages.append({"role": "user", "content": user_message})
     
     # Add to context
-    st.session_state.context["conversation_history"].append({"role": "user", "content": user_message})
+    append_turn(st.session_state.context, "user", user_message)
     
     # Create a status placeholder in the UI
     status_placeholder = st.empty()
@@ -631,11 +629,12 @@ def process_user_message(user_message: str, agent_status_placeholder=None):
     # Process with LangGraph (actual processing happens here)
     try:
         # Process with LangGraph
-        result = st.session_state.agent_network.invoke({
-            "input": user_message,
-            "context": st.session_state.context,
-            "next": ""
-        })
+        with request_scope(data_version=get_data_snapshot().version):
+            result = st.session_state.agent_network.invoke({
+                "input": user_message,
+                "context": st.session_state.context,
+                "next": ""
+            })
         
         # Clear the status placeholder after processing
         status_placeholder.empty()
@@ -649,7 +648,7 @@ def process_user_message(user_message: str, agent_status_placeholder=None):
         # Add response to chat
         st.session_state.context = final_context
         st.session_state.context["messages"] = []
-        st.session_state.context["conversation_history"].append({"role": "assistant", "content": response})
+        append_turn(st.session_state.context, "assistant", response)
         st.session_state.messages.append({"role": "assistant", "content": response})
         
         # Add agent tag to show which agent was used
@@ -668,9 +667,8 @@ def process_user_message(user_message: str, agent_status_placeholder=None):
         
         # Handle errors with fallback
         try:
-            fallback_response = client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=2000,
+            fallback_response = create_message(
+                agent="fallback",
                 system="You are a helpful supply chain assistant.",
                 messages=[{"role": "user", "content": user_message}]
             )
@@ -678,7 +676,7 @@ def process_user_message(user_message: str, agent_status_placeholder=None):
         except:
             response = f"I encountered an error: {str(e)}. Please try asking in a different way."
         
-        st.session_state.context["conversation_history"].append({"role": "assistant", "content": response})
+        append_turn(st.session_state.context, "assistant", response)
         st.session_state.messages.append({"role": "assistant", "content": response})
 
 def main():
@@ -0,0 +1,117 @@
+"""
+Speed and quality of the order-to-vehicle assignment solvers.
+
+Generates Order and Vehicle models over a 300 km region: orders on the
+streets of a synthetic gazetteer with random "LxWxH cm" packages, windows
+and priorities, and a fleet with --slack more capacity than the orders
+need (negative for a fleet that is short). Reports the cost matrix build,
+the Hungarian one-to-one match, and the many-to-one hybrid against a
+naive baseline that places orders in arrival order on the cheapest
+vehicle with room (which is also the hybrid's greedy phase when the
+fleet can carry every order). The lower bound sends every order to its
+cheapest vehicle and ignores capacity.
+
+Usage:
+    python benchmarks/bench_assignment.py --orders 10000 --vehicles 1000 --slack 0.1
+"""
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, time as clock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logistics.assignment import Assignment, _place, assign_many_to_one, build_costs, match_one_to_one
+from logistics.geocoder import Geocoder
+from models.order import DeliveryWindow, Order, PackageDetails
+from models.vehicle import Capacity, Location, MaintenanceInfo, Vehicle
+
+def write_gazetteer(path, towns, rng):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["street", "city", "state", "latitude", "longitude"])
+        for t in range(towns):
+            lat, lon = 41.0 + rng.uniform(-1.3, 1.3), -74.0 + rng.uniform(-1.8, 1.8)
+            writer.writerow(["", f"Town{t}", "NY", f"{lat:.4f}", f"{lon:.4f}"])
+            for s in range(20):
+                writer.writerow([f"Street{s} Ave", f"Town{t}", "NY",
+                                 f"{lat + rng.uniform(-0.05, 0.05):.4f}", f"{lon + rng.uniform(-0.05, 0.05):.4f}"])
+
+def make_orders(n, towns, rng):
+    orders = []
+    for i in range(n):
+        opens = int(rng.integers(0, 20 * 60))
+        sides = rng.integers(10, 60, 3)
+        orders.append(Order(
+            order_id=f"ORD-{i}",
+            customer_name=f"Customer {i}",
+            address=f"{int(rng.integers(1, 999))} Street{int(rng.integers(0, 20))} Ave, Town{int(rng.integers(0, towns))}, NY",
+            delivery_window=DeliveryWindow(clock(opens // 60, opens % 60), clock((opens + 180) // 60, (opens + 180) % 60)),
+            package_details=PackageDetails(float(rng.uniform(0.5, 40.0)), f"{sides[0]}x{sides[1]}x{sides[2]} cm", False),
+            priority=str(rng.choice(["standard", "express", "priority"], p=[0.6, 0.3, 0.1]))
+        ))
+    return orders
+
+def make_vehicles(n, orders, rng, slack=0.1):
+    total_kg = sum(o.package_details.weight_kg for o in orders)
+    total_m3 = sum(o.package_details.volume_m3 for o in orders)
+    share = rng.uniform(0.5, 1.5, n)
+    share /= share.sum()
+    maintenance = MaintenanceInfo(datetime(2025, 1, 1), datetime(2025, 6, 1), [])
+    return [Vehicle(
+        vehicle_id=f"VEH-{j}", type="van", driver_name=f"Driver {j}",
+        current_location=Location(41.0 + rng.uniform(-1.3, 1.3), -74.0 + rng.uniform(-1.8, 1.8), "En route"),
+        status="active", fuel_level=80, maintenance=maintenance,
+        capacity=Capacity((1 + slack) * total_kg * share[j], (1 + slack) * total_m3 * share[j])
+    ) for j in range(n)]
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def naive(costs):
+    vehicle_of = np.full(len(costs.orders), -1, dtype=np.intp)
+    _place(costs, np.arange(len(costs.orders)), vehicle_of, costs.capacity_kg.copy(), costs.capacity_m3.copy())
+    return Assignment(costs, vehicle_of)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--vehicles", type=int, default=1000)
+    parser.add_argument("--towns", type=int, default=500)
+    parser.add_argument("--slack", type=float, default=0.1, help="Spare fleet capacity as a share of the orders' total")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        write_gazetteer(os.path.join(tmp, "gazetteer.csv"), args.towns, rng)
+        locator = Geocoder(os.path.join(tmp, "gazetteer.csv"), os.path.join(tmp, "gazetteer_index.npz"))
+        orders = make_orders(args.orders, args.towns, rng)
+        vehicles = make_vehicles(args.vehicles, orders, rng, args.slack)
+
+        build_s, costs = timed(lambda: build_costs(orders, vehicles, start=datetime(2025, 1, 1, 6, 0), locator=locator))
+        print(f"{len(costs.orders)} orders x {len(costs.vehicles)} vehicles, cost matrix built in {build_s:.2f} s")
+        lower_bound = float(np.where(costs.fits_empty(), costs.cost, np.inf).min(axis=1).astype(float).sum())
+
+        print(f"{'solver':<28} {'seconds':>8} {'assigned':>9} {'cost':>12} {'road km':>10} {'moves':>6}")
+        results = [
+            ("one-to-one (Hungarian)", timed(lambda: match_one_to_one(costs))),
+            ("many-to-one naive", timed(lambda: naive(costs))),
+            ("many-to-one hybrid", timed(lambda: assign_many_to_one(costs))),
+        ]
+        for name, (seconds, assignment) in results:
+            assigned = int((assignment.vehicle_of >= 0).sum())
+            assert (assignment.load_kg <= costs.capacity_kg + 1e-6).all() and (assignment.load_m3 <= costs.capacity_m3 + 1e-9).all()
+            print(f"{name:<28} {seconds:>8.2f} {assigned:>9} {assignment.total_cost:>12.0f} "
+                  f"{assignment.total_km:>10.0f} {assignment.moves:>6}")
+        print(f"{'lower bound (no capacity)':<28} {'':>8} {len(costs.orders):>9} {lower_bound:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Cost of building travel-time matrices, and what caching and incremental updates save.
+
+For each size: a plain Python double loop (small sizes only), a full
+vectorized build, a rebuild after 5% of the points (the vehicles) moved,
+a rescale after a traffic update, and a cache hit.
+
+Usage:
+    python benchmarks/bench_distance_matrix.py --points 500 2000 5000
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logistics.distance_matrix import EARTH_RADIUS_KM, MatrixService
+
+TRAFFIC = {"Main Highway": {"average_speed_kmh": 76, "estimated_delay_minutes": 14},
+           "Interstate 95": {"average_speed_kmh": 70, "estimated_delay_minutes": 20}}
+TRAFFIC_LATER = {"Main Highway": {"average_speed_kmh": 52, "estimated_delay_minutes": 25},
+                 "Interstate 95": {"average_speed_kmh": 70, "estimated_delay_minutes": 20}}
+
+def python_loop(lat, lon):
+    n = len(lat)
+    km = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(n):
+            p1, p2 = math.radians(lat[i]), math.radians(lat[j])
+            a = math.sin((p1 - p2) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon[i] - lon[j]) / 2) ** 2
+            km[i][j] = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+    return km
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, nargs="+", default=[500, 2000, 5000])
+    parser.add_argument("--moved", type=float, default=0.05, help="Share of points that move between requests")
+    args = parser.parse_args()
+
+    print(f"{'points':>7} {'python ms':>10} {'full ms':>8} {'moved ms':>9} {'traffic ms':>11} {'hit ms':>7}")
+    rng = np.random.default_rng(0)
+    for n in args.points:
+        lat = 41.0 + rng.uniform(-0.7, 0.7, n)
+        lon = -73.0 + rng.uniform(-0.9, 0.9, n)
+        moved_lat = lat.copy()
+        moved_lat[:int(n * args.moved)] += 0.01
+
+        service = MatrixService()
+        slow = f"{timed(lambda: python_loop(lat.tolist(), lon.tolist())):>10.1f}" if n <= 1000 else f"{'-':>10}"
+        full = timed(lambda: service.get(lat, lon, TRAFFIC))
+        moved = timed(lambda: service.get(moved_lat, lon, TRAFFIC))
+        traffic = timed(lambda: service.get(moved_lat, lon, TRAFFIC_LATER))
+        hit = timed(lambda: service.get(moved_lat, lon, TRAFFIC_LATER))
+        print(f"{n:>7} {slow} {full:>8.1f} {moved:>9.1f} {traffic:>11.1f} {hit:>7.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Batch geocoding throughput of the offline geocoder.
+
+Builds a synthetic gazetteer (towns and their streets) in a temporary
+directory, then geocodes a batch of orders whose addresses vary in house
+number, case, suffix spelling, units and ZIP codes, some on unknown
+streets. Reports the index build and load, a cold batch (every address
+normalized and looked up), a warm batch (as after a mock-data reload,
+answered from the memo) and one-by-one geocode() calls for comparison.
+
+Usage:
+    python benchmarks/bench_geocoder.py --orders 100000 --towns 2000 --streets-per-town 25
+"""
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logistics.geocoder import Geocoder
+
+STATES = ["IL", "NY", "CA", "CO", "FL", "TX", "PA", "AZ", "OR", "OH"]
+STREETS = ["Main", "Elm", "Oak", "Pine", "Maple", "Cedar", "Birch", "Spruce", "Walnut", "Cherry",
+           "Lake", "Hill", "Park", "River", "Forest", "Meadow", "Sunset", "Church", "Mill", "Ridge"]
+SUFFIXES = [("St", "Street"), ("Ave", "Avenue"), ("Rd", "Road"), ("Dr", "Drive"), ("Ln", "Lane")]
+
+def write_gazetteer(path, towns, streets_per_town, rng):
+    names = []
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["street", "city", "state", "latitude", "longitude"])
+        for t in range(towns):
+            city, state = f"Town{t}", STATES[t % len(STATES)]
+            lat, lon = rng.uniform(30, 47), rng.uniform(-122, -72)
+            writer.writerow(["", city, state, f"{lat:.4f}", f"{lon:.4f}"])
+            for s in range(streets_per_town):
+                street = STREETS[s % len(STREETS)] + ("" if s < len(STREETS) else str(s))
+                suffix = SUFFIXES[s % len(SUFFIXES)]
+                writer.writerow([f"{street} {suffix[0]}", city, state,
+                                 f"{lat + rng.uniform(-0.03, 0.03):.4f}", f"{lon + rng.uniform(-0.03, 0.03):.4f}"])
+                names.append((street, suffix, city, state))
+    return names
+
+def make_addresses(names, n, rng):
+    addresses = []
+    for i in rng.integers(0, len(names), n):
+        street, suffix, city, state = names[i]
+        number = int(rng.integers(1, 9999))
+        variant = int(rng.integers(0, 5))
+        if variant == 0:
+            addresses.append(f"{number} {street} {suffix[0]}, {city}, {state}")
+        elif variant == 1:
+            addresses.append(f"{number} {street.upper()} {suffix[1].upper()}, {city.upper()}, {state} {int(rng.integers(10000, 99999))}")
+        elif variant == 2:
+            addresses.append(f"{number} {street} {suffix[1]}, Apt {int(rng.integers(1, 40))}, {city}, {state}")
+        elif variant == 3:
+            addresses.append(f"{number} {street}. {suffix[0]}., {city}, {state.lower()}")
+        else:
+            addresses.append(f"{number} Unknown{number} Way, {city}, {state}")
+    return addresses
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--towns", type=int, default=2000)
+    parser.add_argument("--streets-per-town", type=int, default=25)
+    parser.add_argument("--single", type=int, default=10000, help="Addresses geocoded one by one")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        gazetteer = os.path.join(tmp, "gazetteer.csv")
+        index = os.path.join(tmp, "gazetteer_index.npz")
+        names = write_gazetteer(gazetteer, args.towns, args.streets_per_town, rng)
+        addresses = make_addresses(names, args.orders, rng)
+
+        build_ms, _ = timed(lambda: Geocoder(gazetteer, index)._ensure_loaded())
+        geocoder = Geocoder(gazetteer, index)
+        load_ms, _ = timed(geocoder._ensure_loaded)
+        cold_ms, (lat, _) = timed(lambda: geocoder.geocode_many(addresses))
+        warm_ms, _ = timed(lambda: geocoder.geocode_many(addresses))
+        single = Geocoder(gazetteer, index)
+        single._ensure_loaded()
+        single_ms, _ = timed(lambda: [single.geocode(a) for a in addresses[:args.single]])
+        stats = geocoder.snapshot()
+
+        print(f"gazetteer entries: {stats['index_entries']}, index file {os.path.getsize(index) / 1024:.0f} KiB")
+        print(f"index build {build_ms:.0f} ms, load {load_ms:.0f} ms")
+        print(f"{args.orders} orders: cold batch {cold_ms:.0f} ms ({cold_ms * 1000 / args.orders:.1f} us/order), "
+              f"warm batch {warm_ms:.0f} ms")
+        print(f"one by one: {single_ms * 1000 / args.single:.1f} us/order over {args.single} orders")
+        print(f"located {int((~np.isnan(lat)).sum())}: {stats['street']} street and {stats['town']} town matches "
+              f"among distinct addresses, {stats['not_found']} not found")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Throughput of POST /query at increasing concurrency against the stub LLM server.
+
+With the async agent pipeline, each request spends almost all of its time
+awaiting the (stubbed) LLM, so throughput should scale roughly linearly with
+concurrency until the connection pool or CPU saturates.
+
+Usage:
+    python benchmarks/bench_query_concurrency.py --latency 0.2 --requests 64
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_llm_server import start_stub_server
+
+async def run_level(app, concurrency, total_requests):
+    """Send total_requests /query calls with at most `concurrency` in flight."""
+    import httpx
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as http:
+        async def one(i):
+            async with semaphore:
+                response = await http.post("/query", json={
+                    "input": "Show me a summary of our fleet status",
+                    "role": "admin",
+                    "session_id": f"bench-{concurrency}-{i}"
+                })
+                response.raise_for_status()
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total_requests)))
+        return time.perf_counter() - start
+
+async def main(args):
+    server, base_url = start_stub_server(latency=args.latency)
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    # Every request repeats one query; measure the pipeline, not cache hits or coalesced waits
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ["SINGLEFLIGHT_ENABLED"] = "0"
+    
+    import api
+    
+    print(f"stub latency: {args.latency:.3f}s per LLM call, {args.requests} requests per level")
+    print(f"{'concurrency':>12} {'elapsed_s':>10} {'req/s':>8}")
+    for concurrency in args.levels:
+        elapsed = await run_level(api.app, concurrency, args.requests)
+        print(f"{concurrency:>12} {elapsed:>10.2f} {args.requests / elapsed:>8.1f}")
+    
+    server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    asyncio.run(main(parser.parse_args()))
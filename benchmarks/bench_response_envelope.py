@@ -0,0 +1,70 @@
+"""
+Per-response overhead of building and serializing the /query envelope.
+
+Compares FastAPI's default path for a dict returned from an endpoint with a
+response_model (Pydantic validation, jsonable_encoder, stdlib json) against
+the path /query now takes (FastJSONResponse with orjson, or the stdlib
+fallback when orjson isn't installed), for a short answer and a 10 KB one.
+No LLM or server is involved.
+
+Usage:
+    python benchmarks/bench_response_envelope.py --iterations 20000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import api
+from utils import fast_json
+
+USAGE = {
+    "total": {"input_tokens": 812, "output_tokens": 240, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0, "calls": 2, "cached_calls": 0},
+    "by_agent": {
+        "coordinator": {"input_tokens": 400, "output_tokens": 20, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0, "calls": 1, "cached_calls": 0},
+        "fleet_monitor": {"input_tokens": 412, "output_tokens": 220, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0, "calls": 1, "cached_calls": 0}
+    }
+}
+
+ANSWERS = {
+    "small": "All 12 vehicles are operating normally; VEH-004 is due for service on Friday.",
+    "10KB": ("VEH-001 is on schedule near Springfield with no maintenance issues. " * 160)[:10240]
+}
+
+def build(content):
+    return api.create_response("Show me a summary of our fleet status", content, None, "bench", agent_used="fleet_monitor", usage=USAGE)
+
+def fastapi_default(content):
+    """What FastAPI does with a dict returned from a response_model endpoint."""
+    validated = api.QueryResponse.model_validate(build(content))
+    return JSONResponse(jsonable_encoder(validated)).body
+
+def envelope_stdlib(content):
+    return fast_json.stdlib_dumps(build(content))
+
+def envelope_fast(content):
+    return fast_json.FastJSONResponse(build(content)).body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    paths = [("fastapi default", fastapi_default), ("envelope + stdlib json", envelope_stdlib)]
+    encoder = "orjson" if fast_json.orjson is not None else "stdlib fallback"
+    paths.append((f"envelope + FastJSONResponse ({encoder})", envelope_fast))
+
+    print(f"{'answer':>7} {'path':<42} {'us/response':>12} {'bytes':>7}")
+    for size, content in ANSWERS.items():
+        for name, fn in paths:
+            seconds = min(timeit.repeat(lambda: fn(content), number=args.iterations, repeat=3)) / args.iterations
+            print(f"{size:>7} {name:<42} {seconds * 1e6:>12.1f} {len(fn(content)):>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Time-to-first-token of /query/stream versus time-to-response of /query.
+
+Both endpoints run the same coordinator + specialist pipeline against the
+stub LLM server; the streaming endpoint should deliver its first token delta
+as soon as the specialist starts generating instead of after it finishes.
+
+Usage:
+    python benchmarks/bench_stream_ttft.py --latency 0.2 --token-delay 0.02
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_llm_server import start_stub_server
+
+QUERY = {"input": "Show me a summary of our fleet status", "role": "admin"}
+
+async def measure(http, runs):
+    """Return (blocking_latencies, first_token_latencies, stream_total_latencies)."""
+    blocking, first_token, stream_total = [], [], []
+    for i in range(runs):
+        start = time.perf_counter()
+        response = await http.post("/query", json=dict(QUERY, session_id=f"ttft-block-{i}"))
+        response.raise_for_status()
+        blocking.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        first = None
+        async with http.stream("POST", "/query/stream", json=dict(QUERY, session_id=f"ttft-stream-{i}")) as stream:
+            async for line in stream.aiter_lines():
+                if first is None and line == "event: delta":
+                    first = time.perf_counter() - start
+        first_token.append(first)
+        stream_total.append(time.perf_counter() - start)
+    return blocking, first_token, stream_total
+
+def start_api_server(port):
+    """Serve api.app with uvicorn on a background thread (ASGITransport would buffer the stream)."""
+    import threading
+    import uvicorn
+    
+    server = uvicorn.Server(uvicorn.Config("api:app", host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+async def main(args):
+    import httpx
+    
+    server, base_url = start_stub_server(latency=args.latency, token_delay=args.token_delay)
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    # Every request repeats one query; measure the pipeline, not cache hits or coalesced waits
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    os.environ["SINGLEFLIGHT_ENABLED"] = "0"
+    api_server = start_api_server(args.port)
+    
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60) as http:
+        blocking, first_token, stream_total = await measure(http, args.runs)
+    
+    print(f"stub latency {args.latency:.3f}s, token delay {args.token_delay:.3f}s, {args.runs} runs (median)")
+    print(f"/query            full response: {statistics.median(blocking) * 1000:8.1f} ms")
+    print(f"/query/stream     first token:   {statistics.median(first_token) * 1000:8.1f} ms")
+    print(f"/query/stream     done event:    {statistics.median(stream_total) * 1000:8.1f} ms")
+    
+    api_server.should_exit = True
+    server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8765, help="Port for the API server under test")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""
+Query latency of the vehicle spatial index against a brute-force scan.
+
+Scatters vehicles over the continental US with mixed statuses and
+capacities, then times k-nearest queries (unfiltered, and restricted to
+active vehicles with at least 1000 kg free), radius queries and position
+updates. The brute-force column computes the distance to every vehicle
+with NumPy and partitions out the k nearest, which is what the index
+replaces.
+
+Usage:
+    python benchmarks/bench_vehicle_index.py --vehicles 5000 50000 --queries 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logistics.distance_matrix import haversine_km
+from logistics.vehicle_index import VehicleIndex
+
+STATUSES = ["active", "loading", "returning", "maintenance"]
+
+def make_fleet(n, rng):
+    lat, lon = rng.uniform(25, 49, n), rng.uniform(-124, -67, n)
+    status = rng.choice(STATUSES, n)
+    capacity = rng.uniform(500, 3000, n)
+    return [{"vehicle_id": f"VEH-{i}", "current_location": {"latitude": lat[i], "longitude": lon[i]},
+             "status": status[i], "capacity": {"weight_kg": capacity[i], "volume_m3": 20.0}} for i in range(n)]
+
+def latency_us(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(*query)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[5000, 50000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--radius-km", type=float, default=25.0)
+    args = parser.parse_args()
+
+    print(f"{'vehicles':>8} {'build ms':>9} {'knn p50/p99 us':>15} {'filtered p50/p99':>17} "
+          f"{'radius p50/p99':>15} {'brute p50 us':>13} {'update us':>10}")
+    rng = np.random.default_rng(0)
+    for n in args.vehicles:
+        fleet = make_fleet(n, rng)
+        lat = np.array([v["current_location"]["latitude"] for v in fleet])
+        lon = np.array([v["current_location"]["longitude"] for v in fleet])
+        queries = list(zip(rng.uniform(25, 49, args.queries), rng.uniform(-124, -67, args.queries)))
+
+        index = VehicleIndex()
+        start = time.perf_counter()
+        index.sync(fleet)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        knn = latency_us(lambda a, o: index.nearest(a, o, k=args.k), queries)
+        filtered = latency_us(lambda a, o: index.nearest(a, o, k=args.k, statuses=("active",), min_kg=1000), queries)
+        radius = latency_us(lambda a, o: index.within(a, o, args.radius_km), queries)
+        brute = latency_us(lambda a, o: np.argpartition(haversine_km([a], [o], lat, lon)[0], args.k)[:args.k], queries[:200])
+
+        moved = rng.integers(0, n, args.queries)
+        start = time.perf_counter()
+        for i in moved.tolist():
+            index.update(f"VEH-{i}", latitude=lat[i] + 0.05, longitude=lon[i] - 0.05)
+        update_us = (time.perf_counter() - start) * 1e6 / len(moved)
+
+        print(f"{n:>8} {build_ms:>9.0f} {knn[0]:>7.0f}/{knn[1]:<7.0f} {filtered[0]:>8.0f}/{filtered[1]:<8.0f} "
+              f"{radius[0]:>7.0f}/{radius[1]:<7.0f} {brute[0]:>13.0f} {update_us:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Solve time and plan quality of the VRP solver on synthetic instances.
+
+Stops are scattered over a 150 km square around the vehicles, with two-hour
+windows spread over a ten-hour day and mixed priorities. For each size the
+greedy construction alone (no local search) is compared with the full solve
+under the time limit; the travel-time matrix is built beforehand and timed
+separately.
+
+Usage:
+    python benchmarks/bench_vrp.py --stops 1000 3000 5000 --time-limit 0.5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logistics.distance_matrix import TrafficModel, haversine_km
+from logistics.vrp import VRPProblem, solve
+
+def make_problem(n_stops, n_vehicles, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = 41.0 + rng.uniform(-0.7, 0.7, n_vehicles + n_stops)
+    lon = -73.0 + rng.uniform(-0.9, 0.9, n_vehicles + n_stops)
+    opens = rng.uniform(0, 600, n_stops)
+    demand_kg = rng.uniform(0.5, 20.0, n_stops)
+    demand_m3 = rng.uniform(0.001, 0.06, n_stops)
+    start = time.perf_counter()
+    matrix = TrafficModel.from_traffic(None).minutes(haversine_km(lat, lon, lat, lon))
+    matrix_seconds = time.perf_counter() - start
+    problem = VRPProblem(
+        travel_minutes=matrix,
+        demand_kg=demand_kg,
+        demand_m3=demand_m3,
+        window_start=opens,
+        window_end=opens + 120,
+        lateness_weight=rng.choice([1.0, 2.0, 3.0], n_stops),
+        # Room for all stops with about 10% to spare
+        capacity_kg=np.full(n_vehicles, demand_kg.sum() * 1.1 / n_vehicles),
+        capacity_m3=np.full(n_vehicles, demand_m3.sum() * 1.1 / n_vehicles),
+        service_minutes=5.0
+    )
+    return problem, matrix_seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stops", type=int, nargs="+", default=[1000, 3000, 5000])
+    parser.add_argument("--stops-per-vehicle", type=int, default=40)
+    parser.add_argument("--time-limit", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{'stops':>6} {'vehicles':>8} {'matrix s':>9} {'solve s':>8} {'moves':>6} "
+          f"{'greedy obj':>11} {'final obj':>10} {'travel h':>9} {'late stops':>10} {'unassigned':>10}")
+    for n_stops in args.stops:
+        n_vehicles = max(1, n_stops // args.stops_per_vehicle)
+        problem, matrix_seconds = make_problem(n_stops, n_vehicles)
+        greedy = solve(problem, time_limit=0.0)
+        start = time.perf_counter()
+        solution = solve(problem, time_limit=args.time_limit)
+        elapsed = time.perf_counter() - start
+        late_stops = sum(int((route.late_minutes > 0).sum()) for route in solution.routes)
+        print(f"{n_stops:>6} {n_vehicles:>8} {matrix_seconds:>9.3f} {elapsed:>8.3f} {solution.moves:>6} "
+              f"{greedy.objective:>11.0f} {solution.objective:>10.0f} {solution.travel_minutes / 60:>9.1f} "
+              f"{late_stops:>10} {len(solution.unassigned):>10}")
+
+if __name__ == "__main__":
+    main()
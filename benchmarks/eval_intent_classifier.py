@@ -0,0 +1,114 @@
+"""
+Compare routing accuracy and latency: keyword router, intent classifier, coordinator LLM.
+
+The replay set is JSONL of {"input": ..., "label": ...} (or the
+{"input": ..., "next_agent": ...} records from ROUTING_LOG_PATH). The
+classifier is either loaded with --model, trained on --train logs, or, with
+neither, scored by k-fold cross-validation on the replay set itself.
+Pass --llm to also replay every request through the coordinator LLM (needs
+ANTHROPIC_API_KEY, or ANTHROPIC_BASE_URL pointing at a stub server).
+
+Usage:
+    python benchmarks/eval_intent_classifier.py --replay data/routing_replay.jsonl
+    python benchmarks/eval_intent_classifier.py --replay data/routing_replay.jsonl --train data/routing_log.jsonl --llm
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.intent_classifier import IntentClassifier, read_routing_log
+from agents.router import route_locally
+
+def report(name, predictions, labels, latencies):
+    """Print accuracy over answered requests, coverage and latency percentiles."""
+    answered = [(p, l) for p, l in zip(predictions, labels) if p is not None]
+    coverage = len(answered) / len(labels)
+    accuracy = np.mean([p == l for p, l in answered]) if answered else float("nan")
+    p50, p95 = np.percentile(np.array(latencies) * 1e3, [50, 95])
+    print(f"{name:<28} {accuracy:>9.3f} {coverage:>9.3f} {p50:>10.3f} {p95:>10.3f}")
+
+def timed(fn, texts):
+    predictions, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        predictions.append(fn(text))
+        latencies.append(time.perf_counter() - start)
+    return predictions, latencies
+
+def cross_validated_predictions(texts, labels, folds, min_confidence):
+    """Out-of-fold classifier predictions, so nothing is scored on its own training data."""
+    order = np.random.RandomState(0).permutation(len(texts))
+    predictions, confident, latencies = [None] * len(texts), [None] * len(texts), [0.0] * len(texts)
+    for fold in np.array_split(order, folds):
+        held_out = set(fold.tolist())
+        train = [i for i in order if i not in held_out]
+        model = IntentClassifier().fit([texts[i] for i in train], [labels[i] for i in train])
+        for i in fold:
+            start = time.perf_counter()
+            label, probability = model.predict(texts[i])
+            latencies[i] = time.perf_counter() - start
+            predictions[i] = label
+            confident[i] = label if probability >= min_confidence else None
+    return predictions, confident, latencies
+
+async def llm_predictions(texts):
+    from agents.coordinator import ask_coordinator_llm_async
+    
+    predictions, latencies = [], []
+    for text in texts:
+        state = {"input": text, "context": {"role": "logistics_coordinator", "conversation_history": []}, "next": ""}
+        start = time.perf_counter()
+        result = await ask_coordinator_llm_async(state)
+        latencies.append(time.perf_counter() - start)
+        predictions.append(result["next"])
+    return predictions, latencies
+
+def main(args):
+    texts, labels = read_routing_log(args.replay)
+    print(f"replay set: {len(texts)} requests from {args.replay}")
+    print(f"{'method':<28} {'accuracy':>9} {'coverage':>9} {'p50_ms':>10} {'p95_ms':>10}")
+    
+    predictions, latencies = timed(lambda t: route_locally(t).agent, texts)
+    report("keyword router", predictions, labels, latencies)
+    
+    if args.model or args.train:
+        if args.model:
+            start = time.perf_counter()
+            model = IntentClassifier.load(args.model)
+            print(f"(model loaded in {(time.perf_counter() - start) * 1e3:.1f} ms)")
+        else:
+            train_texts, train_labels = [], []
+            for path in args.train:
+                t, l = read_routing_log(path)
+                train_texts += t
+                train_labels += l
+            model = IntentClassifier().fit(train_texts, train_labels)
+        predictions, latencies = timed(lambda t: model.predict(t), texts)
+        classifier = [label for label, _ in predictions]
+        confident = [label if p >= args.min_confidence else None for label, p in predictions]
+    else:
+        classifier, confident, latencies = cross_validated_predictions(texts, labels, args.folds, args.min_confidence)
+        print(f"(classifier scored with {args.folds}-fold cross-validation)")
+    report("intent classifier", classifier, labels, latencies)
+    report(f"classifier p>={args.min_confidence}", confident, labels, latencies)
+    
+    if args.llm:
+        predictions, latencies = asyncio.run(llm_predictions(texts))
+        report("coordinator LLM", predictions, labels, latencies)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replay", default=os.path.join("data", "routing_replay.jsonl"))
+    parser.add_argument("--train", nargs="+", help="Routing logs to train the classifier on")
+    parser.add_argument("--model", help="Evaluate an already trained .npz model")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--min-confidence", type=float, default=0.8)
+    parser.add_argument("--llm", action="store_true", help="Also replay through the coordinator LLM")
+    main(parser.parse_args())
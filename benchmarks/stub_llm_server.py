@@ -0,0 +1,101 @@
+"""
+Minimal local stand-in for the Anthropic Messages API.
+
+Answers POST /v1/messages after a fixed delay so benchmarks can measure the
+API's own concurrency behaviour without network noise or token spend.
+Requests with "stream": true get the reply as Messages API server-sent
+events, one word per text delta.
+Point the agents at it with ANTHROPIC_BASE_URL=http://127.0.0.1:<port>.
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_TEXT = "fleet_monitor should handle this request. All vehicles are operating normally."
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.2
+    token_delay = 0.01
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+        
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub"),
+            "content": [{"type": "text", "text": REPLY_TEXT}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 100, "output_tokens": len(REPLY_TEXT.split())}
+        }
+        if body.get("stream"):
+            self.stream_message(message)
+            return
+        
+        # A non-streamed reply arrives only once every token is generated
+        time.sleep(self.token_delay * len(REPLY_TEXT.split(" ")))
+        payload = json.dumps(message).encode()
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def stream_message(self, message):
+        """Write the message as a Messages API event stream and close the connection."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        
+        def send(event, data):
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+            self.wfile.flush()
+        
+        start = dict(message, content=[], stop_reason=None, usage={"input_tokens": 100, "output_tokens": 0})
+        send("message_start", {"type": "message_start", "message": start})
+        send("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for i, word in enumerate(REPLY_TEXT.split(" ")):
+            text = word if i == 0 else f" {word}"
+            send("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}})
+            time.sleep(self.token_delay)
+        send("content_block_stop", {"type": "content_block_stop", "index": 0})
+        send("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": message["usage"]["output_tokens"]}})
+        send("message_stop", {"type": "message_stop"})
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port=0, latency=0.2, token_delay=0.01):
+    """Start the stub server on a background thread and return (server, base_url)."""
+    handler = type("ConfiguredStubLLMHandler", (StubLLMHandler,), {"latency": latency, "token_delay": token_delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a stub Anthropic Messages API server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds to wait before each reply")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed text deltas")
+    args = parser.parse_args()
+    
+    server, base_url = start_stub_server(args.port, args.latency, args.token_delay)
+    print(f"Stub LLM server listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
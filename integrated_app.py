@@ -4,7 +4,6 @@ import json
 import time
 import random
 from typing import Dict, List, Any, Tuple, Generator
-import anthropic
 from datetime import datetime, timedelta
 import asyncio
 import pandas as pd
@@ -25,6 +24,7 @@ from agents.fleet_monitor import fleet_monitor_agent
 from agents.data_retriever import data_retriever_agent
 from agents.notification import notification_agent
 from utils.api_mock import load_mock_data
+from utils.history import append_turn
 
 # Import components for Q2 deal prioritization system
 from agents.deal_orchestrator_agent import OrchestratorAgent
@@ -39,9 +39,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize Claude client (using environment variable for API key)
-client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY", "dummy_key"))
-
 # Define the state schema for supply chain system
 class AgentState(TypedDict):
     input: str
@@ -464,7 +461,7 @@ def determine_next_agent(user_message):
 def process_user_message(user_message: str, agent_status_placeholder=None):
     """Process a user message through the multi-agent system."""
     # Add user message to conversation history
-    st.session_state.conversation_history.append({"role": "user", "content": user_message})
+    append_turn(st.session_state, "user", user_message)
     
     try:
         # First step: determine which agent should handle this
@@ -523,27 +520,27 @@ def process_user_message(user_message: str, agent_status_placeholder=None):
             if context and "messages" in context and context["messages"]:
                 response_msg = context["messages"][-1]["content"]
                 # Add to conversation history
-                st.session_state.conversation_history.append({"role": "assistant", "content": response_msg})
+                append_turn(st.session_state, "assistant", response_msg)
                 return response_msg, next_agent
             else:
                 fallback_msg = "I processed your request but couldn't generate a proper response."
-                st.session_state.conversation_history.append({"role": "assistant", "content": fallback_msg})
+                append_turn(st.session_state, "assistant", fallback_msg)
                 return fallback_msg, next_agent
         else:
             # Direct coordinator response
             context = coord_result.get("context", {})
             if context and "messages" in context and context["messages"]:
                 response_msg = context["messages"][-1]["content"]
-                st.session_state.conversation_history.append({"role": "assistant", "content": response_msg})
+                append_turn(st.session_state, "assistant", response_msg)
                 return response_msg, "coordinator"
             else:
                 fallback_msg = "I couldn't determine how to process your request."
-                st.session_state.conversation_history.append({"role": "assistant", "content": fallback_msg})
+                append_turn(st.session_state, "assistant", fallback_msg)
                 return fallback_msg, "coordinator"
     
     except Exception as e:
         error_msg = f"Error processing your request: {str(e)}"
-        st.session_state.conversation_history.append({"role": "assistant", "content": error_msg})
+        append_turn(st.session_state, "assistant", error_msg)
         return error_msg, "error"
 
 #----------------------------------------------------
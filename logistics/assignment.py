@@ -0,0 +1,386 @@
+"""
+Bulk assignment of orders to vehicles.
+
+Each (order, vehicle) pair is priced as the vehicle's driving time from
+its current position straight to the order plus the priority-weighted
+minutes it would arrive after the delivery window closes, the same
+objective the route planner uses. The cost matrix is built with NumPy in
+chunks of orders.
+
+Two solvers work on it:
+
+- match_one_to_one gives each vehicle at most one order (say, its next
+  pickup) with the Hungarian algorithm, which is exact; its inner loop
+  over columns is vectorized.
+- assign_many_to_one loads many orders per vehicle under weight and volume
+  capacity. It is a greedy/bin-packing hybrid: a greedy puts each order
+  on the cheapest vehicle that still has room, and
+  relocation and swap passes improve on it; when capacity is tight, the
+  orders left over are packed first-fit decreasing by bumping smaller
+  orders to vehicles with spare room.
+
+Pair costs ignore the other stops on a vehicle; sequencing the stops is
+left to the VRP solver in logistics/vrp.py.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from logistics.distance_matrix import DETOUR_FACTOR, TrafficModel, haversine_km
+from logistics.geocoder import Geocoder, geocoder
+from logistics.route_plan import LATENESS_WEIGHTS, PLANNABLE_STATUSES, window_minutes
+from models.order import Order
+from models.vehicle import Vehicle
+
+# Orders per block when building the cost matrix; bounds the temporaries to
+# a few block x vehicles float64 arrays
+COST_CHUNK_ORDERS = 2048
+
+# Vehicles each order that fits nowhere tries to make room on
+REPAIR_CANDIDATES = 20
+
+# Cost given to pairs the Hungarian solver must not use
+_FORBIDDEN = 1e12
+
+@dataclass
+class AssignmentCosts:
+    """Pair costs between located orders (rows) and available vehicles (columns)."""
+    orders: List[Order]
+    vehicles: List[Vehicle]
+    unlocated: List[Order]     # orders whose address couldn't be geocoded
+    unmeasured: List[Order]    # located orders whose package dimensions couldn't be parsed
+    cost: np.ndarray           # (orders, vehicles) float32: travel minutes + weighted late minutes
+    road_km: np.ndarray        # (orders, vehicles) float32
+    demand_kg: np.ndarray
+    demand_m3: np.ndarray
+    capacity_kg: np.ndarray
+    capacity_m3: np.ndarray
+
+    def fits_empty(self) -> np.ndarray:
+        """(orders, vehicles) mask of pairs where the order fits the empty vehicle."""
+        return (self.demand_kg[:, None] <= self.capacity_kg) & (self.demand_m3[:, None] <= self.capacity_m3)
+
+@dataclass
+class Assignment:
+    """Vehicle index per order (-1 if unassigned) with totals over the assigned pairs."""
+    costs: AssignmentCosts
+    vehicle_of: np.ndarray
+    moves: int = 0  # relocations and swaps made by the improvement passes
+    load_kg: np.ndarray = field(init=False)
+    load_m3: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        assigned = self.vehicle_of >= 0
+        n_vehicles = len(self.costs.vehicles)
+        self.load_kg = np.bincount(self.vehicle_of[assigned], self.costs.demand_kg[assigned], n_vehicles)
+        self.load_m3 = np.bincount(self.vehicle_of[assigned], self.costs.demand_m3[assigned], n_vehicles)
+
+    def _pairs(self):
+        rows = np.flatnonzero(self.vehicle_of >= 0)
+        return rows, self.vehicle_of[rows]
+
+    @property
+    def total_cost(self) -> float:
+        rows, cols = self._pairs()
+        return float(self.costs.cost[rows, cols].astype(float).sum())
+
+    @property
+    def total_km(self) -> float:
+        rows, cols = self._pairs()
+        return float(self.costs.road_km[rows, cols].astype(float).sum())
+
+    @property
+    def unassigned(self) -> List[str]:
+        return [self.costs.orders[i].order_id for i in np.flatnonzero(self.vehicle_of < 0)]
+
+    def by_vehicle(self) -> Dict[str, List[str]]:
+        """Order IDs per vehicle ID, for the vehicles that got any."""
+        plan: Dict[str, List[str]] = {}
+        for row, col in zip(*(part.tolist() for part in self._pairs())):
+            plan.setdefault(self.costs.vehicles[col].vehicle_id, []).append(self.costs.orders[row].order_id)
+        return plan
+
+def build_costs(orders: Sequence[Order], vehicles: Iterable[Vehicle], start: Optional[datetime] = None,
+                traffic: Optional[dict] = None, statuses: Optional[Iterable[str]] = PLANNABLE_STATUSES,
+                locator: Optional[Geocoder] = None) -> AssignmentCosts:
+    """
+    Price every pair of order and vehicle.
+
+    Only vehicles in statuses are included (all if None); orders are
+    located with locator (the shared geocoder by default) and those it
+    can't place are left out, as are orders whose package volume is unknown.
+    """
+    start = start or datetime.now()
+    statuses = None if statuses is None else set(statuses)
+    vehicles = [v for v in vehicles if statuses is None or v.status in statuses]
+    lat, lon = (locator or geocoder).geocode_many(order.address for order in orders)
+    located = ~np.isnan(lat)
+    volume = np.array([order.package_details.volume_m3 for order in orders], dtype=float)
+    measured = ~np.isnan(volume)
+    usable = located & measured
+    kept = [order for order, ok in zip(orders, usable) if ok]
+    lat, lon = lat[usable], lon[usable]
+
+    window_end = np.array([window_minutes({"start": f"{o.delivery_window.start:%H:%M}", "end": f"{o.delivery_window.end:%H:%M}"}, start)[1]
+                           for o in kept], dtype=float)
+    weight = np.array([LATENESS_WEIGHTS.get(o.priority, 1.0) for o in kept], dtype=float)
+    vehicle_lat = np.array([v.current_location.latitude for v in vehicles], dtype=float)
+    vehicle_lon = np.array([v.current_location.longitude for v in vehicles], dtype=float)
+
+    model = TrafficModel.from_traffic(traffic)
+    cost = np.empty((len(kept), len(vehicles)), dtype=np.float32)
+    road_km = np.empty_like(cost)
+    for lo in range(0, len(kept), COST_CHUNK_ORDERS):
+        hi = min(lo + COST_CHUNK_ORDERS, len(kept))
+        km = haversine_km(lat[lo:hi], lon[lo:hi], vehicle_lat, vehicle_lon)
+        minutes = model.minutes(km)
+        late = np.maximum(minutes - window_end[lo:hi, None], 0.0)
+        cost[lo:hi] = minutes + weight[lo:hi, None] * late
+        road_km[lo:hi] = km * DETOUR_FACTOR
+
+    return AssignmentCosts(
+        orders=kept,
+        vehicles=vehicles,
+        unlocated=[order for order, ok in zip(orders, located) if not ok],
+        unmeasured=[order for order, ok, sized in zip(orders, located, measured) if ok and not sized],
+        cost=cost,
+        road_km=road_km,
+        demand_kg=np.array([o.package_details.weight_kg for o in kept], dtype=float),
+        demand_m3=volume[usable],
+        capacity_kg=np.array([v.capacity.weight_kg for v in vehicles], dtype=float),
+        capacity_m3=np.array([v.capacity.volume_m3 for v in vehicles], dtype=float)
+    )
+
+def hungarian(cost: np.ndarray) -> np.ndarray:
+    """
+    Minimum-cost assignment of rows to distinct columns; needs rows <= columns.
+
+    Returns the column of each row. This is the shortest augmenting path
+    form of the Hungarian algorithm with row and column potentials, adding
+    one row per outer iteration; each inner step scans all columns at once.
+    """
+    n, m = cost.shape
+    if n > m:
+        raise ValueError("hungarian needs at least as many columns as rows; pass the transpose")
+    u, v = np.zeros(n + 1), np.zeros(m + 1)
+    row_of = np.zeros(m + 1, dtype=np.intp)  # 1-based row matched to each column; column 0 is the root
+    way = np.zeros(m + 1, dtype=np.intp)
+    reduced = np.empty(m + 1)
+    reduced[0] = np.inf
+    for row in range(1, n + 1):
+        row_of[0] = row
+        col = 0
+        min_reduced = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[col] = True
+            current = row_of[col]
+            reduced[1:] = cost[current - 1] - u[current] - v[1:]
+            better = ~used & (reduced < min_reduced)
+            min_reduced[better] = reduced[better]
+            way[better] = col
+            candidates = np.where(used, np.inf, min_reduced)
+            next_col = int(candidates.argmin())
+            delta = candidates[next_col]
+            u[row_of[used]] += delta
+            v[used] -= delta
+            min_reduced[~used] -= delta
+            col = next_col
+            if row_of[col] == 0:
+                break
+        while col:
+            previous = way[col]
+            row_of[col] = row_of[previous]
+            col = previous
+
+    col_of = np.full(n, -1, dtype=np.intp)
+    matched = np.flatnonzero(row_of[1:])
+    col_of[row_of[1:][matched] - 1] = matched
+    return col_of
+
+def match_one_to_one(costs: AssignmentCosts) -> Assignment:
+    """
+    At most one order per vehicle and one vehicle per order, minimizing total cost.
+
+    Pairs where the order doesn't fit the vehicle are never used; if that
+    leaves someone without a feasible partner, they stay unassigned.
+    """
+    n_orders, n_vehicles = costs.cost.shape
+    vehicle_of = np.full(n_orders, -1, dtype=np.intp)
+    if n_orders == 0 or n_vehicles == 0:
+        return Assignment(costs, vehicle_of)
+    fits = costs.fits_empty()
+    matrix = np.where(fits, costs.cost.astype(float), _FORBIDDEN)
+    if n_vehicles <= n_orders:
+        order_of_vehicle = hungarian(matrix.T)
+        vehicles = np.arange(n_vehicles)
+        feasible = fits[order_of_vehicle, vehicles]
+        vehicle_of[order_of_vehicle[feasible]] = vehicles[feasible]
+    else:
+        chosen = hungarian(matrix)
+        orders = np.arange(n_orders)
+        feasible = fits[orders, chosen]
+        vehicle_of[orders[feasible]] = chosen[feasible]
+    return Assignment(costs, vehicle_of)
+
+def assign_many_to_one(costs: AssignmentCosts, improve_passes: int = 5, repair_candidates: int = REPAIR_CANDIDATES) -> Assignment:
+    """
+    Load orders onto vehicles within weight and volume capacity, minimizing total cost.
+
+    Greedy phase: orders go in arrival order, each to the cheapest vehicle
+    with room left; when the fleet can't carry them all, highest priority
+    goes first so the shortfall lands on standard orders. (Ordering by
+    regret, as computed against empty vehicles, came out worse than arrival
+    order once capacity binds.) Up to improve_passes passes then
+    move orders to cheaper vehicles with room and swap them with orders on
+    their cheapest vehicle.
+
+    Bin-packing phase: orders that fit nowhere are taken highest priority
+    and largest first (first-fit decreasing), and each tries its
+    repair_candidates cheapest vehicles for a smaller order it can bump
+    to another vehicle with room. What still doesn't fit stays unassigned.
+    """
+    n_orders, n_vehicles = costs.cost.shape
+    vehicle_of = np.full(n_orders, -1, dtype=np.intp)
+    if n_orders == 0 or n_vehicles == 0:
+        return Assignment(costs, vehicle_of)
+    free_kg, free_m3 = costs.capacity_kg.copy(), costs.capacity_m3.copy()
+    weight = np.array([LATENESS_WEIGHTS.get(o.priority, 1.0) for o in costs.orders])
+    feasible_cost = np.where(costs.fits_empty(), costs.cost, np.inf)
+    preferred = feasible_cost.argmin(axis=1)
+    short = costs.demand_kg.sum() > costs.capacity_kg.sum() or costs.demand_m3.sum() > costs.capacity_m3.sum()
+    sequence = np.argsort(-weight, kind="stable") if short else np.arange(n_orders)
+    _place(costs, sequence, vehicle_of, free_kg, free_m3)
+    moves = 0
+    for _ in range(improve_passes):
+        made = _relocate(costs, vehicle_of, free_kg, free_m3) + _swap(costs, vehicle_of, free_kg, free_m3, preferred)
+        moves += made
+        if not made:
+            break
+        # Moves may have opened up room for orders that didn't fit anywhere
+        _place(costs, sequence[vehicle_of[sequence] < 0], vehicle_of, free_kg, free_m3)
+
+    leftover = np.flatnonzero(vehicle_of < 0)
+    if len(leftover):
+        size = np.maximum(costs.demand_kg / max(costs.capacity_kg.mean(), 1e-9), costs.demand_m3 / max(costs.capacity_m3.mean(), 1e-9))
+        leftover = leftover[np.lexsort((-size[leftover], -weight[leftover]))]
+        moves += _make_room(costs, leftover, vehicle_of, free_kg, free_m3, feasible_cost, repair_candidates)
+    return Assignment(costs, vehicle_of, moves)
+
+def _place(costs: AssignmentCosts, sequence: np.ndarray, vehicle_of: np.ndarray, free_kg: np.ndarray, free_m3: np.ndarray) -> int:
+    """Put each order in sequence on the cheapest vehicle with room left; returns how many were placed."""
+    placed = 0
+    for i in sequence.tolist():
+        row = np.where((free_kg >= costs.demand_kg[i]) & (free_m3 >= costs.demand_m3[i]), costs.cost[i], np.inf)
+        j = int(row.argmin())
+        if row[j] == np.inf:
+            continue
+        vehicle_of[i] = j
+        free_kg[j] -= costs.demand_kg[i]
+        free_m3[j] -= costs.demand_m3[i]
+        placed += 1
+    return placed
+
+def _relocate(costs: AssignmentCosts, vehicle_of: np.ndarray, free_kg: np.ndarray, free_m3: np.ndarray) -> int:
+    """
+    One relocation pass: find each assigned order's cheapest vehicle with
+    room for it at the start of the pass, then apply the moves biggest
+    saving first, re-checking capacity as earlier moves use it up.
+    """
+    rows = np.flatnonzero(vehicle_of >= 0)
+    if len(rows) == 0:
+        return 0
+    current = costs.cost[rows, vehicle_of[rows]]
+    room = (free_kg >= costs.demand_kg[rows, None]) & (free_m3 >= costs.demand_m3[rows, None])
+    alternative = np.where(room, costs.cost[rows], np.inf)
+    target = alternative.argmin(axis=1)
+    saving = current - alternative[np.arange(len(rows)), target]
+    improving = np.flatnonzero(saving > 1e-6)
+    moves = 0
+    for k in improving[np.argsort(-saving[improving], kind="stable")].tolist():
+        i, j = rows[k], target[k]
+        if free_kg[j] < costs.demand_kg[i] or free_m3[j] < costs.demand_m3[i]:
+            continue
+        old = vehicle_of[i]
+        free_kg[old] += costs.demand_kg[i]
+        free_m3[old] += costs.demand_m3[i]
+        free_kg[j] -= costs.demand_kg[i]
+        free_m3[j] -= costs.demand_m3[i]
+        vehicle_of[i] = j
+        moves += 1
+    return moves
+
+def _swap(costs: AssignmentCosts, vehicle_of: np.ndarray, free_kg: np.ndarray, free_m3: np.ndarray,
+          preferred: np.ndarray) -> int:
+    """
+    One swap pass: each order not on its cheapest vehicle, most to gain
+    first, trades places with the order on that vehicle that saves the most
+    in total, when both still fit after the trade.
+    """
+    rows = np.flatnonzero((vehicle_of >= 0) & (vehicle_of != preferred))
+    if len(rows) == 0:
+        return 0
+    gain = costs.cost[rows, vehicle_of[rows]] - costs.cost[rows, preferred[rows]]
+    cost, kg, m3 = costs.cost, costs.demand_kg, costs.demand_m3
+    swaps = 0
+    for i in rows[np.argsort(-gain, kind="stable")].tolist():
+        a, b = vehicle_of[i], preferred[i]
+        if a == b:
+            continue
+        others = np.flatnonzero(vehicle_of == b)
+        saving = cost[i, a] + cost[others, b] - cost[i, b] - cost[others, a]
+        fits = ((free_kg[b] + kg[others] >= kg[i]) & (free_m3[b] + m3[others] >= m3[i])
+                & (free_kg[a] + kg[i] >= kg[others]) & (free_m3[a] + m3[i] >= m3[others]))
+        saving = np.where(fits, saving, 0.0)
+        if len(others) == 0 or saving.max() <= 1e-6:
+            continue
+        k = others[int(saving.argmax())]
+        free_kg[a] += kg[i] - kg[k]
+        free_m3[a] += m3[i] - m3[k]
+        free_kg[b] += kg[k] - kg[i]
+        free_m3[b] += m3[k] - m3[i]
+        vehicle_of[i], vehicle_of[k] = b, a
+        swaps += 1
+    return swaps
+
+def _make_room(costs: AssignmentCosts, leftover: np.ndarray, vehicle_of: np.ndarray, free_kg: np.ndarray, free_m3: np.ndarray,
+               feasible_cost: np.ndarray, candidates: int) -> int:
+    """
+    Place unassigned orders by bumping an order off one of their cheapest
+    vehicles onto another vehicle with room. Of the bumps that free enough
+    room, the one adding the least cost is made; returns how many orders
+    were placed.
+    """
+    kg, m3, cost = costs.demand_kg, costs.demand_m3, costs.cost
+    candidates = min(candidates, len(free_kg))
+    placed = 0
+    for i in leftover.tolist():
+        best = None
+        for b in np.argsort(feasible_cost[i], kind="stable")[:candidates].tolist():
+            if feasible_cost[i, b] == np.inf:
+                break
+            on_b = np.flatnonzero(vehicle_of == b)
+            # Orders whose removal makes room for i on b
+            on_b = on_b[(free_kg[b] + kg[on_b] >= kg[i]) & (free_m3[b] + m3[on_b] >= m3[i])]
+            if len(on_b) == 0:
+                continue
+            room = (free_kg >= kg[on_b, None]) & (free_m3 >= m3[on_b, None])
+            room[:, b] = False
+            extra = np.where(room, cost[on_b], np.inf) - cost[on_b, b][:, None]
+            k, c = np.unravel_index(int(extra.argmin()), extra.shape)
+            added = cost[i, b] + extra[k, c]
+            if np.isfinite(added) and (best is None or added < best[0]):
+                best = (added, on_b[k], b, c)
+        if best is None:
+            continue
+        _, k, b, c = best
+        free_kg[b] += kg[k] - kg[i]
+        free_m3[b] += m3[k] - m3[i]
+        free_kg[c] -= kg[k]
+        free_m3[c] -= m3[k]
+        vehicle_of[i], vehicle_of[k] = b, c
+        placed += 1
+    return placed
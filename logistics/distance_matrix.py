@@ -0,0 +1,184 @@
+"""
+Distance and travel-time matrices between locations.
+
+Distances are great-circle (haversine) kilometres computed with NumPy over
+all pairs at once. Travel times scale them by a road detour factor and the
+current traffic: the network speed is the harmonic mean of the roads'
+average_speed_kmh, and their estimated_delay_minutes are spread over the
+distance driven.
+
+Matrices are cached by location set and traffic snapshot. When a request
+comes in for a location set that differs from the last one of the same
+size in only a few points (vehicles that moved), just those rows and
+columns are recomputed; when only the traffic changed, the distances are
+reused and only the times are rescaled.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Straight-line distance times this approximates the road distance
+DETOUR_FACTOR = 1.3
+
+# Network speed when there is no traffic data
+DEFAULT_SPEED_KMH = 60.0
+
+# Each road's estimated_delay_minutes is taken to apply per this many km driven
+DELAY_REFERENCE_KM = 50.0
+
+# Recompute changed rows and columns only while at most this share of the points moved
+MAX_CHANGED_FRACTION = 0.25
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+def haversine_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """
+    Great-circle km from each of the first points (rows) to each of the second (columns).
+
+    Uses the chord form of the haversine, sin^2(d/2) = (1 - u1.u2) / 2 for
+    unit vectors u, so the pairwise part is a single matrix product.
+    """
+    half_chord = (1.0 - _unit_vectors(lat1, lon1) @ _unit_vectors(lat2, lon2).T) / 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(half_chord, 0.0, 1.0)))
+
+@dataclass(frozen=True)
+class TrafficModel:
+    """Network-wide driving speed and delay derived from a traffic snapshot."""
+    speed_kmh: float
+    delay_minutes_per_km: float
+    version: str
+
+    @classmethod
+    def from_traffic(cls, traffic: Optional[Mapping[str, Any]]) -> "TrafficModel":
+        roads = list((traffic or {}).values())
+        speeds = [road["average_speed_kmh"] for road in roads if road.get("average_speed_kmh")]
+        delays = [road.get("estimated_delay_minutes", 0) for road in roads]
+        canonical = json.dumps(traffic or {}, sort_keys=True, separators=(",", ":")).encode()
+        return cls(
+            speed_kmh=len(speeds) / sum(1.0 / speed for speed in speeds) if speeds else DEFAULT_SPEED_KMH,
+            delay_minutes_per_km=(sum(delays) / len(delays) / DELAY_REFERENCE_KM) if delays else 0.0,
+            version=hashlib.sha256(canonical).hexdigest()[:12]
+        )
+
+    def minutes(self, km: np.ndarray) -> np.ndarray:
+        road_km = km * DETOUR_FACTOR
+        return road_km * (60.0 / self.speed_kmh + self.delay_minutes_per_km)
+
+@dataclass(frozen=True)
+class TravelMatrix:
+    """Read-only km and minutes between points (rows are origins), stored as float32."""
+    points: np.ndarray  # (n, 2) lat, lon
+    km: np.ndarray
+    minutes: np.ndarray
+    traffic_version: str
+
+    @property
+    def nbytes(self) -> int:
+        return self.points.nbytes + self.km.nbytes + self.minutes.nbytes
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+class MatrixService:
+    """
+    Thread-safe LRU cache of travel matrices keyed on location set and traffic version.
+
+    Matrices are kept as float32, and the cache is bounded both by entry
+    count and by the bytes they hold (the km and minutes pair is 8 n^2
+    bytes, 200 MB at 5,000 points); a matrix larger than max_bytes on its
+    own is returned but not kept.
+    Cached matrices are shared and read-only; callers must not modify them.
+    """
+
+    def __init__(self, max_entries: int = 8, max_bytes: int = 256 * 2**20, max_changed_fraction: float = MAX_CHANGED_FRACTION):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_changed_fraction = max_changed_fraction
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._cache: "OrderedDict[Tuple[str, str], TravelMatrix]" = OrderedDict()
+        self._latest_by_size: Dict[int, TravelMatrix] = {}
+        self.stats = {"hits": 0, "misses": 0, "full_builds": 0, "incremental_builds": 0, "rows_recomputed": 0, "traffic_rescales": 0}
+
+    def get(self, lat: np.ndarray, lon: np.ndarray, traffic: Optional[Mapping[str, Any]] = None) -> TravelMatrix:
+        """The travel matrix between the given points under the given traffic snapshot."""
+        points = np.round(np.column_stack((np.asarray(lat, dtype=float), np.asarray(lon, dtype=float))), 6)
+        model = TrafficModel.from_traffic(traffic)
+        key = (hashlib.sha256(points.tobytes()).hexdigest(), model.version)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return cached
+            self.stats["misses"] += 1
+            base = self._latest_by_size.get(len(points))
+
+        matrix = self._build(points, model, base)
+        with self._lock:
+            if key not in self._cache:
+                self._bytes += matrix.nbytes
+            else:
+                self._bytes += matrix.nbytes - self._cache[key].nbytes
+            self._cache[key] = matrix
+            self._cache.move_to_end(key)
+            self._latest_by_size[len(points)] = matrix
+            while self._cache and (len(self._cache) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._cache.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                if self._latest_by_size.get(len(evicted.points)) is evicted:
+                    del self._latest_by_size[len(evicted.points)]
+        return matrix
+
+    def travel_minutes(self, lat: np.ndarray, lon: np.ndarray, traffic: Optional[Mapping[str, Any]] = None) -> np.ndarray:
+        return self.get(lat, lon, traffic).minutes
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._cache), max_entries=self.max_entries,
+                        bytes=self._bytes, max_bytes=self.max_bytes)
+
+    def _build(self, points: np.ndarray, model: TrafficModel, base: Optional[TravelMatrix]) -> TravelMatrix:
+        changed = np.flatnonzero((points != base.points).any(axis=1)) if base is not None else None
+        if changed is None or len(changed) > self.max_changed_fraction * len(points):
+            km = haversine_km(points[:, 0], points[:, 1], points[:, 0], points[:, 1])
+            self._count("full_builds")
+            return TravelMatrix(_frozen(points), _frozen(km.astype(np.float32)),
+                                _frozen(model.minutes(km).astype(np.float32)), model.version)
+
+        km = base.km.copy()
+        rows = haversine_km(points[changed, 0], points[changed, 1], points[:, 0], points[:, 1])
+        km[changed, :] = rows
+        km[:, changed] = rows.T
+        if model.version == base.traffic_version:
+            minutes = base.minutes.copy()
+            minutes[changed, :] = model.minutes(rows)
+            minutes[:, changed] = minutes[changed, :].T
+        else:
+            minutes = model.minutes(km).astype(np.float32)
+            self._count("traffic_rescales")
+        self._count("incremental_builds")
+        self._count("rows_recomputed", len(changed))
+        return TravelMatrix(_frozen(points), _frozen(km), _frozen(minutes), model.version)
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[stat] += amount
+
+# Shared by the route planner and the API; MATRIX_CACHE_MAX_ENTRIES and MATRIX_CACHE_MAX_MB bound it
+matrix_service = MatrixService(
+    max_entries=int(os.environ.get("MATRIX_CACHE_MAX_ENTRIES", "8")),
+    max_bytes=int(float(os.environ.get("MATRIX_CACHE_MAX_MB", "256")) * 2**20)
+)
@@ -0,0 +1,317 @@
+"""
+Offline geocoding of order addresses.
+
+Addresses are normalized (case, punctuation, house numbers and units
+dropped, street suffixes and state names abbreviated) and the normalized
+"street|city|state" key is hashed to 64 bits. The gazetteer table
+(data/gazetteer.csv, one row per town with an empty street and one per
+known street) is compiled into a compact index of sorted key hashes and
+float32 coordinates, data/gazetteer_index.npz, which is rebuilt whenever
+the table is newer. An address whose street isn't known falls back to its
+town centre.
+
+Single lookups go through a hash -> row dict; batches hash the unique
+addresses and look them up with one searchsorted. Results are memoized
+per raw address string for the life of the process, so reloading the mock
+data doesn't geocode the same addresses again.
+
+Rebuild the index by hand:
+    python -m logistics.geocoder --build
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+DEFAULT_GAZETTEER_PATH = os.path.join(DATA_DIR, "gazetteer.csv")
+DEFAULT_INDEX_PATH = os.path.join(DATA_DIR, "gazetteer_index.npz")
+
+# Memoized raw addresses; the memo is cleared when it grows past this
+MEMO_MAX_ENTRIES = int(os.environ.get("GEOCODER_MEMO_MAX_ENTRIES", "500000"))
+
+# Precision of a result: the street was found, or only its town
+STREET, TOWN = "street", "town"
+
+_SUFFIXES = {
+    "street": "st", "avenue": "ave", "av": "ave", "drive": "dr", "road": "rd", "lane": "ln",
+    "court": "ct", "boulevard": "blvd", "place": "pl", "terrace": "ter", "parkway": "pkwy",
+    "highway": "hwy", "circle": "cir", "square": "sq", "trail": "trl", "way": "way",
+}
+_DIRECTIONS = {"north": "n", "south": "s", "east": "e", "west": "w",
+               "northeast": "ne", "northwest": "nw", "southeast": "se", "southwest": "sw"}
+_STATES = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar", "california": "ca", "colorado": "co",
+    "connecticut": "ct", "delaware": "de", "florida": "fl", "georgia": "ga", "hawaii": "hi", "idaho": "id",
+    "illinois": "il", "indiana": "in", "iowa": "ia", "kansas": "ks", "kentucky": "ky", "louisiana": "la",
+    "maine": "me", "maryland": "md", "massachusetts": "ma", "michigan": "mi", "minnesota": "mn",
+    "mississippi": "ms", "missouri": "mo", "montana": "mt", "nebraska": "ne", "nevada": "nv",
+    "new hampshire": "nh", "new jersey": "nj", "new mexico": "nm", "new york": "ny", "north carolina": "nc",
+    "north dakota": "nd", "ohio": "oh", "oklahoma": "ok", "oregon": "or", "pennsylvania": "pa",
+    "rhode island": "ri", "south carolina": "sc", "south dakota": "sd", "tennessee": "tn", "texas": "tx",
+    "utah": "ut", "vermont": "vt", "virginia": "va", "washington": "wa", "west virginia": "wv",
+    "wisconsin": "wi", "wyoming": "wy", "district of columbia": "dc",
+}
+
+# Country names dropped from the end of an address ("..., IL, USA")
+_COUNTRIES = {"us", "usa", "u s", "u s a", "united states", "united states of america", "america"}
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+_UNIT_RE = re.compile(r"\b(?:apt|apartment|suite|ste|unit|floor|rm|room)\b.*$|#.*$")
+_HOUSE_NUMBER_RE = re.compile(r"^\d+[a-z]?(?:-\d+[a-z]?)?$")
+_ZIP_RE = re.compile(r"^\d{5}(?:\d{4})?$")
+
+def _words(text: str) -> List[str]:
+    return _NON_WORD_RE.sub(" ", text.lower()).split()
+
+def normalize_street(street: str) -> str:
+    """Street line without house number or unit: "456 Elm Avenue, Apt 2" -> "elm ave"."""
+    words = _words(_UNIT_RE.sub("", street.lower()))
+    while words and _HOUSE_NUMBER_RE.match(words[0]):
+        words.pop(0)
+    return " ".join(_SUFFIXES.get(w, _DIRECTIONS.get(w, w)) for w in words)
+
+def normalize_state(state: str) -> str:
+    """State as its code, without a ZIP: "New York 10471" -> "ny"."""
+    words = [w for w in _words(state) if not _ZIP_RE.match(w)]
+    name = " ".join(words)
+    return _STATES.get(name, name)
+
+def split_address(address: str) -> Optional[Tuple[str, str, str]]:
+    """Normalized (street, city, state) of a "street, city, state" address, or None."""
+    parts = [part for part in address.split(",") if part.strip()]
+    if parts and " ".join(_words(parts[-1])) in _COUNTRIES:
+        parts.pop()
+    if len(parts) < 2:
+        return None
+    state = normalize_state(parts[-1])
+    city = " ".join(_words(parts[-2]))
+    street = normalize_street(",".join(parts[:-2])) if len(parts) > 2 else ""
+    if not state or not city:
+        return None
+    return street, city, state
+
+def key_hash(street: str, city: str, state: str) -> int:
+    """64-bit hash of a normalized address key."""
+    digest = hashlib.blake2b(f"{street}|{city}|{state}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+@dataclass(frozen=True)
+class GeocodeResult:
+    latitude: float
+    longitude: float
+    precision: str  # STREET or TOWN
+
+class Geocoder:
+    """Offline geocoder over the gazetteer index. Thread-safe."""
+
+    def __init__(self, gazetteer_path: str = DEFAULT_GAZETTEER_PATH, index_path: str = DEFAULT_INDEX_PATH,
+                 memo_max_entries: int = MEMO_MAX_ENTRIES):
+        self.gazetteer_path = gazetteer_path
+        self.index_path = index_path
+        self.memo_max_entries = memo_max_entries
+        self._lock = threading.Lock()
+        self._keys: Optional[np.ndarray] = None
+        self._coords: Optional[np.ndarray] = None
+        self._rows: Dict[int, int] = {}
+        self._memo: Dict[str, Optional[GeocodeResult]] = {}
+        self.stats = {"lookups": 0, "memo_hits": 0, "street": 0, "town": 0, "not_found": 0, "index_builds": 0,
+                      "index_load_errors": 0}
+
+    def geocode(self, address: str) -> Optional[GeocodeResult]:
+        """Coordinates of one address, or None if neither its street nor its town is known."""
+        with self._lock:
+            self.stats["lookups"] += 1
+            if address in self._memo:
+                self.stats["memo_hits"] += 1
+                return self._memo[address]
+        self._ensure_loaded()
+        result = self._resolve(address)
+        self._remember({address: result})
+        return result
+
+    def geocode_many(self, addresses: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Latitudes and longitudes of many addresses, NaN where not found.
+
+        Each distinct address is normalized once; the ones not in the memo
+        are looked up together.
+        """
+        addresses = list(addresses)
+        unique = list(dict.fromkeys(addresses))
+        with self._lock:
+            self.stats["lookups"] += len(addresses)
+            known = {a: self._memo[a] for a in unique if a in self._memo}
+            self.stats["memo_hits"] += sum(1 for a in addresses if a in known)
+        todo = [a for a in unique if a not in known]
+        if todo:
+            self._ensure_loaded()
+            found = self._resolve_many(todo)
+            self._remember(found)
+            known.update(found)
+
+        lat = np.full(len(addresses), np.nan)
+        lon = np.full(len(addresses), np.nan)
+        for i, address in enumerate(addresses):
+            result = known[address]
+            if result is not None:
+                lat[i], lon[i] = result.latitude, result.longitude
+        return lat, lon
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, memo_entries=len(self._memo), index_entries=len(self._rows))
+
+    def clear_memo(self) -> None:
+        with self._lock:
+            self._memo.clear()
+
+    def _resolve(self, address: str) -> Optional[GeocodeResult]:
+        parts = split_address(address)
+        if parts is None:
+            return None
+        street, city, state = parts
+        row = self._rows.get(key_hash(street, city, state)) if street else None
+        if row is not None:
+            return self._result(row, STREET)
+        row = self._rows.get(key_hash("", city, state))
+        return self._result(row, TOWN) if row is not None else None
+
+    def _resolve_many(self, addresses: List[str]) -> Dict[str, Optional[GeocodeResult]]:
+        parts = [split_address(a) or ("", "", "") for a in addresses]
+        street_keys = np.array([key_hash(*p) if p[0] else 0 for p in parts], dtype=np.uint64)
+        town_keys = np.array([key_hash("", p[1], p[2]) if p[1] else 0 for p in parts], dtype=np.uint64)
+        street_rows, town_rows = self._search(street_keys), self._search(town_keys)
+        results = {}
+        for address, street_row, town_row in zip(addresses, street_rows.tolist(), town_rows.tolist()):
+            if street_row >= 0:
+                results[address] = self._result(street_row, STREET)
+            elif town_row >= 0:
+                results[address] = self._result(town_row, TOWN)
+            else:
+                results[address] = None
+        return results
+
+    def _search(self, hashes: np.ndarray) -> np.ndarray:
+        """Index rows of the given key hashes, -1 where absent."""
+        if len(self._keys) == 0:
+            return np.full(len(hashes), -1)
+        rows = np.minimum(np.searchsorted(self._keys, hashes), len(self._keys) - 1)
+        return np.where(self._keys[rows] == hashes, rows, -1)
+
+    def _result(self, row: int, precision: str) -> GeocodeResult:
+        latitude, longitude = self._coords[row]
+        return GeocodeResult(round(float(latitude), 5), round(float(longitude), 5), precision)
+
+    def _remember(self, results: Dict[str, Optional[GeocodeResult]]) -> None:
+        with self._lock:
+            if len(self._memo) + len(results) > self.memo_max_entries:
+                self._memo.clear()
+            self._memo.update(results)
+            for result in results.values():
+                self.stats[result.precision if result is not None else "not_found"] += 1
+
+    def _ensure_loaded(self) -> None:
+        if self._keys is not None:
+            return
+        with self._lock:
+            if self._keys is not None:
+                return
+            current = self._index_is_current()
+            loaded = load_index(self.index_path) if current else None
+            if loaded is not None:
+                keys, coords = loaded
+            else:
+                if current:
+                    self.stats["index_load_errors"] += 1  # truncated or corrupt; rebuild it from the table
+                keys, coords = build_index(self.gazetteer_path)
+                self.stats["index_builds"] += 1
+                try:
+                    save_index(self.index_path, keys, coords)
+                except OSError:
+                    pass  # read-only data directory; keep the index in memory only
+            self._rows = {key: row for row, key in enumerate(keys.tolist())}
+            self._coords = coords
+            self._keys = keys
+
+    def _index_is_current(self) -> bool:
+        try:
+            return os.path.getmtime(self.index_path) >= os.path.getmtime(self.gazetteer_path)
+        except OSError:
+            return False
+
+def build_index(gazetteer_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted uint64 key hashes and their float32 (lat, lon) from a gazetteer CSV."""
+    hashes, coords = [], []
+    if os.path.exists(gazetteer_path):
+        with open(gazetteer_path, newline="") as f:
+            for record in csv.DictReader(f):
+                street = normalize_street(record.get("street") or "")
+                city = " ".join(_words(record["city"]))
+                hashes.append(key_hash(street, city, normalize_state(record["state"])))
+                coords.append((float(record["latitude"]), float(record["longitude"])))
+    keys = np.array(hashes, dtype=np.uint64)
+    # Sorted for searchsorted; of duplicate keys the first row wins
+    keys, first = np.unique(keys, return_index=True)
+    return keys, np.array(coords, dtype=np.float32).reshape(-1, 2)[first]
+
+def save_index(path: str, keys: np.ndarray, coords: np.ndarray) -> None:
+    """
+    Write the index to path atomically.
+
+    It is written to a temporary file in the same directory and renamed into
+    place, so a concurrent reader or a crash mid-write never sees a partial file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".gazetteer_index-", suffix=".npz")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, keys=keys, coords=coords)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def load_index(path: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Keys and coordinates saved by save_index, or None if the file is missing, truncated or malformed."""
+    try:
+        with np.load(path) as index:
+            keys, coords = index["keys"], index["coords"]
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        return None
+    if keys.dtype != np.uint64 or coords.shape != (len(keys), 2):
+        return None
+    return keys, coords
+
+# Shared by the route planner and the API; GAZETTEER_PATH selects the table
+geocoder = Geocoder(
+    gazetteer_path=os.environ.get("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH),
+    index_path=os.environ.get("GAZETTEER_INDEX_PATH", DEFAULT_INDEX_PATH)
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the offline geocoding index from the gazetteer table")
+    parser.add_argument("--build", action="store_true", help="Rebuild the index even if it is current")
+    parser.add_argument("--gazetteer", default=geocoder.gazetteer_path)
+    parser.add_argument("--out", default=geocoder.index_path)
+    parser.add_argument("addresses", nargs="*", help="Addresses to geocode with the index")
+    args = parser.parse_args()
+
+    target = Geocoder(args.gazetteer, args.out)
+    if args.build or not target._index_is_current():
+        keys, coords = build_index(args.gazetteer)
+        save_index(args.out, keys, coords)
+        print(f"Indexed {len(keys)} gazetteer entries from {args.gazetteer} into {args.out}")
+    for address in args.addresses:
+        print(f"{address}: {target.geocode(address)}")
@@ -0,0 +1,135 @@
+"""
+Delivery route planning over the current orders and fleet.
+
+Builds a VRPProblem from the mock orders and vehicles, solves it locally
+and renders the plan as text, so route_optimizer_agent only has to explain
+a plan that was actually computed instead of making one up.
+"""
+
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from logistics.distance_matrix import matrix_service
+from logistics.geocoder import geocoder
+from logistics.vrp import VRPProblem, VRPSolution, solve
+from models.order import dimensions_volume_m3
+
+# Cost of a minute late per priority level
+LATENESS_WEIGHTS = {"priority": 3.0, "express": 2.0, "standard": 1.0}
+
+# Vehicles in any other status (maintenance) are not planned
+PLANNABLE_STATUSES = ("active", "loading", "returning")
+
+SERVICE_MINUTES = 5.0
+
+# Local search budget per plan, in seconds
+PLAN_TIME_LIMIT = float(os.environ.get("ROUTE_PLAN_TIME_LIMIT", "0.3"))
+
+@dataclass
+class RoutePlan:
+    """A solved plan together with the records it refers to."""
+    solution: VRPSolution
+    orders: List[Mapping[str, Any]]    # the routed orders, indexed like the problem's stops
+    vehicles: List[Mapping[str, Any]]  # the planned vehicles, indexed like the problem's vehicles
+    skipped_orders: List[Mapping[str, Any]]  # orders that couldn't be located
+    unmeasured_orders: List[Mapping[str, Any]]  # located orders whose package dimensions couldn't be parsed
+    start: datetime
+
+def window_minutes(window: Mapping[str, str], start: datetime) -> Tuple[float, float]:
+    """
+    A daily "HH:MM" window as minutes from start.
+
+    Windows may cross midnight; a window that is already open starts at a
+    negative offset, and one that has passed today is taken as tomorrow's.
+    """
+    now = start.hour * 60 + start.minute
+    opens = _clock_minutes(window["start"])
+    duration = (_clock_minutes(window["end"]) - opens) % 1440 or 1440
+    offset = (opens - now) % 1440
+    if offset > 1440 - duration:
+        offset -= 1440
+    return float(offset), float(offset + duration)
+
+def _clock_minutes(value: str) -> int:
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def plan_routes(mock_data: Mapping[str, Any], start: Optional[datetime] = None, time_limit: float = PLAN_TIME_LIMIT) -> RoutePlan:
+    """Plan delivery routes for all orders on the vehicles that are available."""
+    start = start or datetime.now()
+    vehicles = [v for v in mock_data.get("vehicles", ()) if v.get("status") in PLANNABLE_STATUSES]
+    all_orders = list(mock_data.get("orders", ()))
+    order_lat, order_lon = geocoder.geocode_many(order.get("address", "") for order in all_orders)
+    located = ~np.isnan(order_lat)
+    volume = np.array([dimensions_volume_m3(o.get("package_details", {}).get("dimensions")) for o in all_orders], dtype=float)
+    measured = ~np.isnan(volume)
+    usable = located & measured
+    orders = [order for order, ok in zip(all_orders, usable) if ok]
+    skipped = [order for order, ok in zip(all_orders, located) if not ok]
+    unmeasured = [order for order, ok, sized in zip(all_orders, located, measured) if ok and not sized]
+
+    lat = np.concatenate(([v["current_location"]["latitude"] for v in vehicles], order_lat[usable]))
+    lon = np.concatenate(([v["current_location"]["longitude"] for v in vehicles], order_lon[usable]))
+    windows = np.array([window_minutes(o["delivery_window"], start) for o in orders], dtype=float).reshape(-1, 2)
+    problem = VRPProblem(
+        travel_minutes=matrix_service.travel_minutes(lat, lon, mock_data.get("traffic")),
+        demand_kg=np.array([o["package_details"]["weight_kg"] for o in orders], dtype=float),
+        demand_m3=volume[usable],
+        window_start=windows[:, 0],
+        window_end=windows[:, 1],
+        lateness_weight=np.array([LATENESS_WEIGHTS.get(o.get("priority"), 1.0) for o in orders], dtype=float),
+        capacity_kg=np.array([v["capacity"]["weight_kg"] for v in vehicles], dtype=float),
+        capacity_m3=np.array([v["capacity"]["volume_m3"] for v in vehicles], dtype=float),
+        service_minutes=SERVICE_MINUTES
+    )
+    return RoutePlan(solve(problem, time_limit), orders, vehicles, skipped, unmeasured, start)
+
+def _duration(minutes: float) -> str:
+    hours, minutes = divmod(int(round(minutes)), 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m"
+
+def format_plan(plan: RoutePlan) -> str:
+    """Render a plan as plain text for the LLM to explain."""
+    solution = plan.solution
+    used = [route for route in solution.routes if route.stops]
+    assigned = sum(len(route.stops) for route in used)
+    lines = [
+        f"Plan computed at {plan.start:%H:%M}: {assigned} of {len(plan.orders) + len(plan.skipped_orders) + len(plan.unmeasured_orders)} orders assigned "
+        f"to {len(used)} of {len(plan.vehicles)} available vehicles.",
+        f"Total driving time {_duration(solution.travel_minutes)}; "
+        f"{sum(int((route.late_minutes > 0).sum()) for route in used)} stops late, {_duration(solution.late_minutes)} late in total."
+    ]
+    for route in used:
+        vehicle = plan.vehicles[route.vehicle]
+        lines.append("")
+        lines.append(
+            f"{vehicle['vehicle_id']} ({vehicle.get('type', 'vehicle')}, {vehicle.get('driver_name', 'unassigned driver')}): "
+            f"{len(route.stops)} stops, {_duration(route.travel_minutes)} driving, "
+            f"load {route.load_kg:.1f}/{vehicle['capacity']['weight_kg']} kg, {route.load_m3:.3f}/{vehicle['capacity']['volume_m3']} m3"
+        )
+        for number, (stop, arrival, late) in enumerate(zip(route.stops, route.arrival_minutes, route.late_minutes), 1):
+            order = plan.orders[stop]
+            eta = plan.start + timedelta(minutes=float(arrival))
+            status = f"LATE by {_duration(late)}" if late > 0 else "on time"
+            lines.append(
+                f"  {number}. {order['order_id']} ({order.get('priority', 'standard')}) {order['address']}: "
+                f"ETA {eta:%a %H:%M}, window {order['delivery_window']['start']}-{order['delivery_window']['end']}, {status}"
+            )
+    unassigned = [plan.orders[i]["order_id"] for i in solution.unassigned]
+    if unassigned:
+        lines.append("")
+        lines.append(f"Not assigned (no vehicle with enough capacity): {', '.join(unassigned)}")
+    if plan.skipped_orders:
+        lines.append("")
+        lines.append(f"Not routed (address could not be located): {', '.join(o['order_id'] for o in plan.skipped_orders)}")
+    if plan.unmeasured_orders:
+        lines.append("")
+        lines.append(f"Not routed (package dimensions could not be read): {', '.join(o['order_id'] for o in plan.unmeasured_orders)}")
+    idle = [plan.vehicles[route.vehicle]["vehicle_id"] for route in solution.routes if not route.stops]
+    if idle:
+        lines.append(f"Idle vehicles: {', '.join(idle)}")
+    return "\n".join(lines)
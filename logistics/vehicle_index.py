@@ -0,0 +1,331 @@
+"""
+Spatial index of vehicle positions for nearest-available-vehicle queries.
+
+Vehicles are bucketed into a uniform latitude/longitude grid. A k-nearest
+query searches rings of cells outward from the query's cell and stops once
+no unsearched cell can hold anything closer than the k-th match; a radius
+query searches the cells overlapping the circle's bounding box. Candidates
+are filtered by status and remaining capacity and their great-circle
+distances computed with NumPy over per-vehicle unit vectors.
+
+Moving, re-statusing or loading a vehicle only touches its own slot and at
+most two cells, so the index is kept current incrementally rather than
+rebuilt. Longitudes don't wrap at the antimeridian.
+"""
+
+import math
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from logistics.distance_matrix import EARTH_RADIUS_KM
+
+# Grid cell size; about 28 km north-south
+DEFAULT_CELL_DEGREES = 0.25
+
+@dataclass(frozen=True)
+class Neighbor:
+    vehicle_id: str
+    distance_km: float
+    status: str
+    free_kg: float
+    free_m3: float
+
+def _unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    lat, lon = math.radians(lat), math.radians(lon)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+class VehicleIndex:
+    """
+    Grid index over vehicle positions with status and remaining-capacity filters. Thread-safe.
+
+    Remaining capacity is capacity minus the current load, which is 0
+    unless a vehicle record has a "load" with weight_kg/volume_m3 or
+    update() sets one.
+    """
+
+    def __init__(self, cell_degrees: float = DEFAULT_CELL_DEGREES, initial_capacity: int = 1024):
+        self.cell_degrees = cell_degrees
+        self._lock = threading.RLock()
+        self._slots: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = [None] * initial_capacity
+        self._free: List[int] = []
+        self._lat = np.zeros(initial_capacity)
+        self._lon = np.zeros(initial_capacity)
+        self._xyz = np.zeros((initial_capacity, 3))
+        self._status = np.full(initial_capacity, -1, dtype=np.int16)
+        self._capacity = np.zeros((initial_capacity, 2))  # kg, m3
+        self._load = np.zeros((initial_capacity, 2))
+        self._cell_of: List[Optional[Tuple[int, int]]] = [None] * initial_capacity
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self._status_codes: Dict[str, int] = {}
+        self._status_names: List[str] = []
+        # Cell-index bounding box of everything ever indexed; only grows
+        self._bounds = [math.inf, -math.inf, math.inf, -math.inf]
+        self._synced_from: Optional[Sequence[Mapping[str, Any]]] = None
+        self.stats = {"knn_queries": 0, "radius_queries": 0, "cells_searched": 0, "full_scans": 0, "updates": 0}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def upsert(self, vehicle: Mapping[str, Any]) -> None:
+        """Add a vehicle record (as in mock_vehicles.json) or refresh an indexed one."""
+        location, capacity, load = vehicle["current_location"], vehicle.get("capacity", {}), vehicle.get("load") or {}
+        with self._lock:
+            if vehicle["vehicle_id"] not in self._slots:
+                self._add(vehicle["vehicle_id"])
+            self.update(
+                vehicle["vehicle_id"],
+                latitude=location["latitude"], longitude=location["longitude"],
+                status=vehicle.get("status", "unknown"),
+                capacity_kg=capacity.get("weight_kg", 0.0), capacity_m3=capacity.get("volume_m3", 0.0),
+                load_kg=load.get("weight_kg", 0.0), load_m3=load.get("volume_m3", 0.0)
+            )
+
+    def update(self, vehicle_id: str, latitude: Optional[float] = None, longitude: Optional[float] = None,
+               status: Optional[str] = None, capacity_kg: Optional[float] = None, capacity_m3: Optional[float] = None,
+               load_kg: Optional[float] = None, load_m3: Optional[float] = None) -> None:
+        """Change any of an indexed vehicle's position, status, capacity or load."""
+        with self._lock:
+            slot = self._slots[vehicle_id]
+            self.stats["updates"] += 1
+            if latitude is not None or longitude is not None:
+                lat = self._lat[slot] if latitude is None else float(latitude)
+                lon = self._lon[slot] if longitude is None else float(longitude)
+                self._lat[slot], self._lon[slot] = lat, lon
+                self._xyz[slot] = _unit_vector(lat, lon)
+                self._move_to_cell(slot, self._cell(lat, lon))
+            if status is not None:
+                if status not in self._status_codes:
+                    self._status_codes[status] = len(self._status_names)
+                    self._status_names.append(status)
+                self._status[slot] = self._status_codes[status]
+            for column, value in ((0, capacity_kg), (1, capacity_m3)):
+                if value is not None:
+                    self._capacity[slot, column] = value
+            for column, value in ((0, load_kg), (1, load_m3)):
+                if value is not None:
+                    self._load[slot, column] = value
+
+    def remove(self, vehicle_id: str) -> None:
+        with self._lock:
+            slot = self._slots.pop(vehicle_id)
+            self._move_to_cell(slot, None)
+            self._ids[slot] = None
+            self._status[slot] = -1
+            self._free.append(slot)
+
+    def sync(self, vehicles: Sequence[Mapping[str, Any]]) -> None:
+        """
+        Bring the index in line with a list of vehicle records.
+
+        Only vehicles that are new, gone or changed are touched. Passing the
+        same (frozen snapshot) sequence as last time is a no-op.
+        """
+        with self._lock:
+            if vehicles is self._synced_from:
+                return
+            seen = set()
+            for vehicle in vehicles:
+                seen.add(vehicle["vehicle_id"])
+                if self._changed(vehicle):
+                    self.upsert(vehicle)
+            for vehicle_id in [v for v in self._slots if v not in seen]:
+                self.remove(vehicle_id)
+            self._synced_from = vehicles
+
+    def nearest(self, latitude: float, longitude: float, k: int = 5, statuses: Optional[Iterable[str]] = None,
+                min_kg: float = 0.0, min_m3: float = 0.0) -> List[Neighbor]:
+        """
+        The k vehicles closest to a point, nearest first.
+
+        Only vehicles in one of statuses (any status if None) with at least
+        min_kg and min_m3 of remaining capacity are considered.
+        """
+        with self._lock:
+            self.stats["knn_queries"] += 1
+            codes = self._codes(statuses)
+            if k <= 0 or not self._cells or (codes is not None and len(codes) == 0):
+                return []
+            query = np.array(_unit_vector(latitude, longitude))
+            ci, cj = self._cell(latitude, longitude)
+            max_ring = int(max(abs(ci - self._bounds[0]), abs(ci - self._bounds[1]),
+                               abs(cj - self._bounds[2]), abs(cj - self._bounds[3])))
+            best_slots, best_km = np.empty(0, dtype=np.intp), np.empty(0)
+            ring = 0
+            while True:
+                # Past this many cells it's cheaper to scan every vehicle
+                if (2 * ring + 1) ** 2 > 4 * len(self._cells):
+                    self.stats["full_scans"] += 1
+                    slots = np.fromiter(self._slots.values(), dtype=np.intp, count=len(self._slots))
+                    best_slots, best_km = self._closest(slots, query, codes, min_kg, min_m3, k)
+                    break
+                slots = self._ring_slots(ci, cj, ring)
+                if len(slots):
+                    slots, km = self._closest(slots, query, codes, min_kg, min_m3, k)
+                    best_slots, best_km = self._merge(best_slots, best_km, slots, km, k)
+                if ring >= max_ring or (len(best_km) == k and best_km[-1] <= self._ring_bound_km(latitude, ring)):
+                    break
+                ring += 1
+            return self._neighbors(best_slots, best_km)
+
+    def within(self, latitude: float, longitude: float, radius_km: float, statuses: Optional[Iterable[str]] = None,
+               min_kg: float = 0.0, min_m3: float = 0.0) -> List[Neighbor]:
+        """All vehicles within radius_km of a point that pass the filters, nearest first."""
+        with self._lock:
+            self.stats["radius_queries"] += 1
+            codes = self._codes(statuses)
+            if radius_km < 0 or not self._cells or (codes is not None and len(codes) == 0):
+                return []
+            query = np.array(_unit_vector(latitude, longitude))
+            i_range, j_range = self._box(latitude, longitude, radius_km)
+            n_cells = (i_range[1] - i_range[0] + 1) * (j_range[1] - j_range[0] + 1)
+            if n_cells > len(self._cells):
+                keys = [key for key in self._cells if i_range[0] <= key[0] <= i_range[1] and j_range[0] <= key[1] <= j_range[1]]
+            else:
+                keys = [(i, j) for i in range(i_range[0], i_range[1] + 1) for j in range(j_range[0], j_range[1] + 1)]
+            slots = self._gather(keys)
+            slots, km = self._closest(slots, query, codes, min_kg, min_m3, len(slots))
+            inside = km <= radius_km
+            return self._neighbors(slots[inside], km[inside])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, vehicles=len(self._slots), cells=len(self._cells), cell_degrees=self.cell_degrees)
+
+    def _add(self, vehicle_id: str) -> None:
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self._slots[vehicle_id] = slot
+        self._ids[slot] = vehicle_id
+        self._capacity[slot] = self._load[slot] = 0.0
+
+    def _grow(self) -> None:
+        size = len(self._ids)
+        new_size = max(2 * size, 16)
+        for name in ("_lat", "_lon", "_xyz", "_capacity", "_load"):
+            array = getattr(self, name)
+            grown = np.zeros((new_size,) + array.shape[1:])
+            grown[:size] = array
+            setattr(self, name, grown)
+        self._status = np.concatenate((self._status, np.full(new_size - size, -1, dtype=np.int16)))
+        self._ids += [None] * (new_size - size)
+        self._cell_of += [None] * (new_size - size)
+        # Pop from the end, so hand out the low slots first
+        self._free.extend(range(new_size - 1, size - 1, -1))
+
+    def _changed(self, vehicle: Mapping[str, Any]) -> bool:
+        slot = self._slots.get(vehicle["vehicle_id"])
+        if slot is None:
+            return True
+        location, capacity, load = vehicle["current_location"], vehicle.get("capacity", {}), vehicle.get("load") or {}
+        return (self._lat[slot] != location["latitude"] or self._lon[slot] != location["longitude"]
+                or self._status[slot] != self._status_codes.get(vehicle.get("status", "unknown"), -2)
+                or self._capacity[slot, 0] != capacity.get("weight_kg", 0.0)
+                or self._capacity[slot, 1] != capacity.get("volume_m3", 0.0)
+                or self._load[slot, 0] != load.get("weight_kg", 0.0)
+                or self._load[slot, 1] != load.get("volume_m3", 0.0))
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def _move_to_cell(self, slot: int, cell: Optional[Tuple[int, int]]) -> None:
+        old = self._cell_of[slot]
+        if old == cell:
+            return
+        if old is not None:
+            members = self._cells[old]
+            members.remove(slot)
+            if not members:
+                del self._cells[old]
+        if cell is not None:
+            self._cells.setdefault(cell, []).append(slot)
+            bounds = self._bounds
+            bounds[0], bounds[1] = min(bounds[0], cell[0]), max(bounds[1], cell[0])
+            bounds[2], bounds[3] = min(bounds[2], cell[1]), max(bounds[3], cell[1])
+        self._cell_of[slot] = cell
+
+    def _ring_slots(self, ci: int, cj: int, ring: int) -> np.ndarray:
+        if ring == 0:
+            keys = [(ci, cj)]
+        else:
+            keys = [(ci + di, cj + dj) for di in (-ring, ring) for dj in range(-ring, ring + 1)]
+            keys += [(ci + di, cj + dj) for di in range(-ring + 1, ring) for dj in (-ring, ring)]
+        return self._gather(keys)
+
+    def _gather(self, keys: Iterable[Tuple[int, int]]) -> np.ndarray:
+        slots: List[int] = []
+        searched = 0
+        for key in keys:
+            members = self._cells.get(key)
+            searched += 1
+            if members:
+                slots.extend(members)
+        self.stats["cells_searched"] += searched
+        return np.array(slots, dtype=np.intp)
+
+    def _ring_bound_km(self, latitude: float, ring: int) -> float:
+        """
+        A lower bound on the distance to anything outside rings 0..ring.
+
+        Such a vehicle is at least ring cells away in latitude, or in
+        longitude while within ring + 1 cells in latitude; for the latter,
+        hav(d) >= cos^2(max |lat|) * hav(dlon).
+        """
+        gap = math.radians(ring * self.cell_degrees)
+        max_lat = min(math.radians(abs(latitude) + (ring + 1) * self.cell_degrees), math.pi / 2)
+        lon_bound = 2 * math.asin(min(1.0, math.cos(max_lat) * math.sin(gap / 2)))
+        return EARTH_RADIUS_KM * min(gap, lon_bound)
+
+    def _box(self, latitude: float, longitude: float, radius_km: float) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        """Cell-index ranges of the latitude/longitude box around a circle."""
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        max_lat = math.radians(min(abs(latitude) + dlat, 90.0))
+        ratio = math.sin(radius_km / EARTH_RADIUS_KM / 2) / max(math.cos(max_lat), 1e-12)
+        i_range = (int(math.floor((latitude - dlat) / self.cell_degrees)), int(math.floor((latitude + dlat) / self.cell_degrees)))
+        if ratio >= 1.0:
+            j_range = (int(self._bounds[2]), int(self._bounds[3]))
+        else:
+            dlon = math.degrees(2 * math.asin(ratio))
+            j_range = (int(math.floor((longitude - dlon) / self.cell_degrees)), int(math.floor((longitude + dlon) / self.cell_degrees)))
+        return i_range, j_range
+
+    def _codes(self, statuses: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        if statuses is None:
+            return None
+        return np.array([self._status_codes[s] for s in statuses if s in self._status_codes], dtype=np.int16)
+
+    def _closest(self, slots: np.ndarray, query: np.ndarray, codes: Optional[np.ndarray],
+                 min_kg: float, min_m3: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The (at most) k filtered slots nearest the query unit vector, sorted, with their km."""
+        free = self._capacity[slots] - self._load[slots]
+        keep = (free[:, 0] >= min_kg) & (free[:, 1] >= min_m3)
+        if codes is not None:
+            keep &= np.isin(self._status[slots], codes)
+        slots = slots[keep]
+        half_chord = (1.0 - self._xyz[slots] @ query) / 2
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(half_chord, 0.0, 1.0)))
+        if len(km) > k:
+            part = np.argpartition(km, k - 1)[:k]
+            slots, km = slots[part], km[part]
+        order = np.argsort(km, kind="stable")
+        return slots[order], km[order]
+
+    @staticmethod
+    def _merge(slots_a: np.ndarray, km_a: np.ndarray, slots_b: np.ndarray, km_b: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        slots, km = np.concatenate((slots_a, slots_b)), np.concatenate((km_a, km_b))
+        order = np.argsort(km, kind="stable")[:k]
+        return slots[order], km[order]
+
+    def _neighbors(self, slots: np.ndarray, km: np.ndarray) -> List[Neighbor]:
+        free = self._capacity[slots] - self._load[slots]
+        return [
+            Neighbor(self._ids[slot], round(float(d), 3), self._status_names[self._status[slot]], float(f[0]), float(f[1]))
+            for slot, d, f in zip(slots.tolist(), km.tolist(), free)
+        ]
+
+# Shared by the fleet monitor and the API; kept in line with the data snapshot via sync()
+fleet_index = VehicleIndex()
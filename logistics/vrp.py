@@ -0,0 +1,363 @@
+"""
+Vehicle routing solver.
+
+Plans open routes (each vehicle starts where it is and finishes at its last
+stop) for delivery stops with weight and volume demands, time windows and
+priorities. The objective is total travel minutes plus minutes late,
+weighted by each stop's priority. Stops that can't be carried are left
+unassigned, lowest priority first.
+
+The solver is deterministic and works on a precomputed travel-time matrix.
+A time-oriented greedy construction hands out stops in window order to the
+vehicle that can serve each one most cheaply. Local search (2-opt and
+or-opt within routes, relocation between routes) then improves the plan
+until no move helps or the time limit runs out. Candidate moves are scored
+with NumPy over whole routes at once, and only the most promising few are
+checked against the exact schedule.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Local search budget in seconds; the construction always runs to completion
+DEFAULT_TIME_LIMIT = 0.5
+
+# Moves of each kind checked against the exact schedule per attempt
+CANDIDATES_PER_MOVE = 8
+
+# Stops considered for moving to another route per local search sweep
+RELOCATIONS_PER_SWEEP = 8
+
+# Cost of a minute spent waiting for a window to open, when choosing a vehicle
+# during construction; waiting isn't part of the objective but ties up the vehicle
+WAIT_COST = 0.2
+
+_EPSILON = 1e-9
+
+@dataclass
+class VRPProblem:
+    """
+    One routing instance as arrays.
+
+    Nodes 0..n_vehicles-1 of travel_minutes are the vehicles' start
+    positions and nodes n_vehicles.. are the stops, in the order of the
+    per-stop arrays. Times are in minutes from the start of the plan; a
+    window_start below zero means the window is already open.
+    """
+    travel_minutes: np.ndarray   # (n_vehicles + n_stops) square matrix
+    demand_kg: np.ndarray
+    demand_m3: np.ndarray
+    window_start: np.ndarray
+    window_end: np.ndarray
+    lateness_weight: np.ndarray  # cost of one minute late, higher for urgent stops
+    capacity_kg: np.ndarray
+    capacity_m3: np.ndarray
+    service_minutes: float = 5.0
+
+    @property
+    def n_vehicles(self) -> int:
+        return len(self.capacity_kg)
+
+    @property
+    def n_stops(self) -> int:
+        return len(self.demand_kg)
+
+@dataclass
+class Route:
+    """A vehicle's stops in visiting order, with their scheduled arrivals."""
+    vehicle: int
+    stops: List[int]
+    arrival_minutes: np.ndarray
+    late_minutes: np.ndarray
+    travel_minutes: float
+    load_kg: float
+    load_m3: float
+
+@dataclass
+class VRPSolution:
+    routes: List[Route]  # one per vehicle, possibly empty
+    unassigned: List[int]
+    objective: float
+    travel_minutes: float
+    late_minutes: float
+    construction_seconds: float
+    search_seconds: float
+    moves: int
+
+def solve(problem: VRPProblem, time_limit: float = DEFAULT_TIME_LIMIT) -> VRPSolution:
+    """Construct a plan and improve it by local search for at most time_limit seconds."""
+    return _Solver(problem).run(time_limit)
+
+class _Solver:
+    def __init__(self, problem: VRPProblem):
+        self.problem = problem
+        self.T = np.asarray(problem.travel_minutes, dtype=float)
+        self.m = problem.n_vehicles
+        self.ws = np.asarray(problem.window_start, dtype=float)
+        self.we = np.asarray(problem.window_end, dtype=float)
+        self.weight = np.asarray(problem.lateness_weight, dtype=float)
+        self.demand_kg = np.asarray(problem.demand_kg, dtype=float)
+        self.demand_m3 = np.asarray(problem.demand_m3, dtype=float)
+        self.capacity_kg = np.asarray(problem.capacity_kg, dtype=float)
+        self.capacity_m3 = np.asarray(problem.capacity_m3, dtype=float)
+        self.service = float(problem.service_minutes)
+        self.routes: List[np.ndarray] = []
+        self.costs: List[float] = []
+        self.load_kg = np.zeros(self.m)
+        self.load_m3 = np.zeros(self.m)
+        self.unassigned: List[int] = []
+        self.moves = 0
+
+    def run(self, time_limit: float) -> VRPSolution:
+        start = time.perf_counter()
+        self._construct()
+        built = time.perf_counter()
+        self._improve(built + time_limit)
+        searched = time.perf_counter()
+
+        routes = []
+        for v, stops in enumerate(self.routes):
+            arrival, late, travel, _ = self._schedule(v, stops)
+            routes.append(Route(v, stops.tolist(), arrival, late, travel, self.load_kg[v], self.load_m3[v]))
+        return VRPSolution(
+            routes=routes,
+            unassigned=sorted(self.unassigned),
+            objective=float(sum(self.costs)),
+            travel_minutes=float(sum(route.travel_minutes for route in routes)),
+            late_minutes=float(sum(route.late_minutes.sum() for route in routes)),
+            construction_seconds=built - start,
+            search_seconds=searched - built,
+            moves=self.moves
+        )
+
+    def _schedule(self, v: int, stops: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float, float]:
+        """
+        Arrival and lateness at each stop of a route, its travel minutes and its cost.
+
+        Arrival follows a_k = max(a_{k-1} + service + travel_k, window_start_k).
+        With D_k the cumulative service and travel time up to stop k, that is
+        a_k = D_k + max(0, max_{j<=k}(window_start_j - D_j)), a running
+        maximum NumPy computes in one pass.
+        """
+        if not len(stops):
+            empty = np.zeros(0)
+            return empty, empty, 0.0, 0.0
+        nodes = stops + self.m
+        legs = self.T[np.concatenate(([v], nodes[:-1])), nodes]
+        elapsed = np.cumsum(legs) + self.service * np.arange(len(stops))
+        arrival = elapsed + np.maximum.accumulate(np.maximum(self.ws[stops] - elapsed, 0.0))
+        late = np.maximum(arrival - self.we[stops], 0.0)
+        travel = float(legs.sum())
+        return arrival, late, travel, travel + float(self.weight[stops] @ late)
+
+    def _cost(self, v: int, stops: np.ndarray) -> float:
+        return self._schedule(v, stops)[3]
+
+    def _select_served(self) -> np.ndarray:
+        """Stops that can be carried at all: most urgent first, while the fleet's total capacity lasts."""
+        fits_somewhere = (
+            (self.demand_kg[:, None] <= self.capacity_kg[None, :])
+            & (self.demand_m3[:, None] <= self.capacity_m3[None, :])
+        ).any(axis=1) if self.m else np.zeros(len(self.demand_kg), dtype=bool)
+        rank = np.lexsort((self.ws, -self.weight))
+        ranked = rank[fits_somewhere[rank]]
+        within = (
+            (np.cumsum(self.demand_kg[ranked]) <= self.capacity_kg.sum())
+            & (np.cumsum(self.demand_m3[ranked]) <= self.capacity_m3.sum())
+        )
+        served = np.zeros(len(self.demand_kg), dtype=bool)
+        served[ranked[within]] = True
+        return served
+
+    def _construct(self) -> None:
+        """Time-oriented greedy: in window order, append each stop to the vehicle that serves it cheapest."""
+        served = self._select_served()
+        order = np.lexsort((-self.weight, self.ws))
+        order = order[served[order]]
+        self.unassigned = np.flatnonzero(~served).tolist()
+
+        routes: List[List[int]] = [[] for _ in range(self.m)]
+        tail = np.arange(self.m)
+        clock = np.zeros(self.m)
+        for s in order:
+            fits = (self.load_kg + self.demand_kg[s] <= self.capacity_kg) & (self.load_m3 + self.demand_m3[s] <= self.capacity_m3)
+            if not fits.any():
+                self.unassigned.append(int(s))
+                continue
+            travel = self.T[tail, s + self.m]
+            arrival = np.maximum(clock + travel, self.ws[s])
+            cost = travel + WAIT_COST * (arrival - clock - travel) + self.weight[s] * np.maximum(arrival - self.we[s], 0.0)
+            v = int(np.argmin(np.where(fits, cost, np.inf)))
+            routes[v].append(int(s))
+            tail[v] = s + self.m
+            clock[v] = arrival[v] + self.service
+            self.load_kg[v] += self.demand_kg[s]
+            self.load_m3[v] += self.demand_m3[s]
+
+        self.routes = [np.array(stops, dtype=int) for stops in routes]
+        self.costs = [self._cost(v, stops) for v, stops in enumerate(self.routes)]
+
+    def _improve(self, deadline: float) -> None:
+        """Sweep all routes with 2-opt and or-opt, then relocate between routes, until nothing improves."""
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for v in range(self.m):
+                if time.perf_counter() >= deadline:
+                    return
+                improved |= self._two_opt(v)
+                improved |= self._or_opt(v)
+            if time.perf_counter() < deadline:
+                improved |= self._relocate()
+
+    def _path_matrix(self, v: int, stops: np.ndarray) -> np.ndarray:
+        """
+        Travel minutes between the positions of a route's path: the start,
+        each stop, and a free dummy end that makes the route open.
+        """
+        path = np.concatenate(([v], stops + self.m))
+        n = len(path)
+        A = np.zeros((n + 1, n + 1))
+        A[:n, :n] = self.T[np.ix_(path, path)]
+        return A
+
+    def _try(self, v: int, candidates: List[np.ndarray]) -> bool:
+        """Adopt the cheapest candidate stop order for route v if it beats the current one."""
+        best_cost, best = self.costs[v] - _EPSILON, None
+        for stops in candidates:
+            cost = self._cost(v, stops)
+            if cost < best_cost:
+                best_cost, best = cost, stops
+        if best is None:
+            return False
+        self.routes[v], self.costs[v] = best, best_cost
+        self.moves += 1
+        return True
+
+    def _two_opt(self, v: int) -> bool:
+        """Reverse the segment whose reversal saves the most travel, if the schedule agrees."""
+        stops = self.routes[v]
+        L = len(stops)
+        if L < 2:
+            return False
+        A = self._path_matrix(v, stops)
+        edges = A[np.arange(L + 1), np.arange(1, L + 2)]
+        # Reversing path positions i+1..j replaces edges (i, i+1) and (j, j+1) with (i, j) and (i+1, j+1)
+        delta = A[:L + 1, :L + 1] + A[1:, 1:] - edges[:, None] - edges[None, :]
+        delta[np.tril_indices(L + 1, 1)] = np.inf
+        candidates = []
+        for flat in _smallest(delta, CANDIDATES_PER_MOVE):
+            i, j = divmod(int(flat), L + 1)
+            reordered = stops.copy()
+            reordered[i:j] = stops[i:j][::-1]
+            candidates.append(reordered)
+        return self._try(v, candidates)
+
+    def _or_opt(self, v: int) -> bool:
+        """Move a run of one to three consecutive stops to the position that saves the most travel."""
+        stops = self.routes[v]
+        L = len(stops)
+        if L < 2:
+            return False
+        A = self._path_matrix(v, stops)
+        after = np.arange(L + 1)  # insert after path position j, before j + 1
+        gap = A[after, after + 1]
+        candidates = []
+        for length in (1, 2, 3):
+            if length >= L:
+                break
+            first = np.arange(1, L - length + 2)  # path positions of each segment's first stop
+            last = first + length - 1
+            removal = A[first - 1, first] + A[last, last + 1] - A[first - 1, last + 1]
+            insertion = A[after[None, :], first[:, None]] + A[last[:, None], after[None, :] + 1] - gap[None, :]
+            delta = insertion - removal[:, None]
+            delta[(after[None, :] >= first[:, None] - 1) & (after[None, :] <= last[:, None])] = np.inf
+            for flat in _smallest(delta, CANDIDATES_PER_MOVE):
+                row, j = divmod(int(flat), L + 1)
+                start = int(first[row]) - 1  # index into stops
+                segment = stops[start:start + length]
+                rest = np.concatenate((stops[:start], stops[start + length:]))
+                at = j if j < start else j - length
+                candidates.append(np.concatenate((rest[:at], segment, rest[at:])))
+        return self._try(v, candidates)
+
+    def _relocate(self) -> bool:
+        """
+        Move single stops to another vehicle.
+
+        Looks at the stops whose removal saves the most (travel plus
+        weighted lateness, estimated from their legs) and tries the
+        cheapest insertion points on other vehicles with room for them.
+        """
+        if self.m < 2:
+            return False
+        gains = []
+        for v, stops in enumerate(self.routes):
+            if not len(stops):
+                continue
+            arrival, late, _, _ = self._schedule(v, stops)
+            path = np.concatenate(([v], stops + self.m))
+            following = np.append(self.T[path[1:-1], path[2:]], 0.0)
+            bypass = np.append(self.T[path[:-2], path[2:]], 0.0)
+            gain = self.T[path[:-1], path[1:]] + following - bypass + self.weight[stops] * late
+            for position in np.argsort(-gain)[:RELOCATIONS_PER_SWEEP]:
+                gains.append((float(gain[position]), v, int(position)))
+        gains.sort(reverse=True)
+
+        moved = False
+        for _, v, position in gains[:RELOCATIONS_PER_SWEEP]:
+            if position >= len(self.routes[v]):
+                continue  # the route changed under an earlier move
+            moved |= self._relocate_stop(v, position)
+        return moved
+
+    def _relocate_stop(self, v: int, position: int) -> bool:
+        stops = self.routes[v]
+        s = int(stops[position])
+        node = s + self.m
+        remaining = np.delete(stops, position)
+        saved = self.costs[v] - self._cost(v, remaining)
+
+        options = []
+        for u, route in enumerate(self.routes):
+            if u == v:
+                continue
+            if self.load_kg[u] + self.demand_kg[s] > self.capacity_kg[u] or self.load_m3[u] + self.demand_m3[s] > self.capacity_m3[u]:
+                continue
+            path = np.concatenate(([u], route + self.m))
+            onward = np.append(self.T[node, path[1:]], 0.0)
+            existing = np.append(self.T[path[:-1], path[1:]], 0.0)
+            insertion = self.T[path, node] + onward - existing
+            for at in np.argsort(insertion)[:CANDIDATES_PER_MOVE]:
+                options.append((float(insertion[at]), u, int(at)))
+        options.sort()
+
+        best = None
+        for _, u, at in options[:CANDIDATES_PER_MOVE]:
+            extended = np.insert(self.routes[u], at, s)
+            added = self._cost(u, extended) - self.costs[u]
+            if added < saved - _EPSILON and (best is None or added < best[0]):
+                best = (added, u, extended)
+        if best is None:
+            return False
+        _, u, extended = best
+        self.routes[v], self.costs[v] = remaining, self._cost(v, remaining)
+        self.routes[u], self.costs[u] = extended, self._cost(u, extended)
+        for w, sign in ((v, -1), (u, 1)):
+            self.load_kg[w] += sign * self.demand_kg[s]
+            self.load_m3[w] += sign * self.demand_m3[s]
+        self.moves += 1
+        return True
+
+def _smallest(delta: np.ndarray, k: int) -> np.ndarray:
+    """Flat indices of up to k negative entries of delta, most negative first."""
+    flat = delta.ravel()
+    k = min(k, flat.size)
+    if not k:
+        return flat[:0].astype(int)
+    picked = np.argpartition(flat, k - 1)[:k]
+    picked = picked[flat[picked] < -_EPSILON]
+    return picked[np.argsort(flat[picked])]
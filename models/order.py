@@ -1,7 +1,29 @@
+import math
+import re
 from dataclasses import dataclass
 from typing import Dict, Optional
 from datetime import datetime, time
 
+# Metres per unit of a dimensions string; centimetres when no unit is given
+_DIMENSION_UNITS = {"mm": 0.001, "cm": 0.01, "m": 1.0, "in": 0.0254}
+_DIMENSIONS_RE = re.compile(r"^\s*([\d.]+)\s*x\s*([\d.]+)\s*x\s*([\d.]+)\s*(mm|cm|m|in)?\s*$")
+
+def dimensions_volume_m3(dimensions: str) -> float:
+    """
+    Volume in cubic metres of a "LxWxH cm" dimensions string (also mm, m or in).
+
+    NaN if it can't be parsed, so an unknown volume is never mistaken for an
+    empty package; callers leave such orders out and report them.
+    """
+    match = _DIMENSIONS_RE.match(dimensions.lower()) if isinstance(dimensions, str) else None
+    if match is None:
+        return math.nan
+    try:
+        sides = [float(side) for side in match.groups()[:3]]
+    except ValueError:
+        return math.nan
+    return math.prod(sides) * _DIMENSION_UNITS[match.group(4) or "cm"] ** 3
+
 @dataclass
 class DeliveryWindow:
     start: time
@@ -13,6 +35,10 @@ class PackageDetails:
     dimensions: str
     fragile: bool
 
+    @property
+    def volume_m3(self) -> float:
+        return dimensions_volume_m3(self.dimensions)
+
 @dataclass
 class Order:
     order_id: str
@@ -0,0 +1,180 @@
+"""
+Admission control for the query pipeline.
+
+At most max_concurrent queries run the agents at once. Further queries wait
+in a priority queue ordered by role (drivers en route first, then
+coordinators, then admins) and, once max_queue are waiting, new arrivals
+are refused with a Retry-After hint instead of piling up behind a saturated
+LLM provider.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from utils.metrics import admission_rejected, admission_wait
+
+# Lower runs first; roles not listed get the lowest priority
+ROLE_PRIORITY = {"driver": 0, "logistics_coordinator": 1, "coordinator": 1, "admin": 2}
+
+class QueueFull(Exception):
+    """Raised when a query can't be admitted; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after: int, message: str = "Server is at capacity, retry later"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Bounded concurrency with a per-role priority queue.
+
+    A finishing query hands its slot straight to the highest-priority waiter
+    (FIFO within a role), so a stream of admin queries can't starve drivers.
+    When the queue is full, a new arrival displaces the newest waiter of a
+    lower priority, if there is one, rather than being refused itself.
+    Single event loop only: acquire/release must be called from the loop
+    that serves the requests.
+    """
+
+    def __init__(self, max_concurrent: int = 32, max_queue: int = 256, role_priority: Optional[Dict[str, int]] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.role_priority = dict(ROLE_PRIORITY if role_priority is None else role_priority)
+        self.lowest_priority = max(self.role_priority.values(), default=0)
+        self.in_flight = 0
+        self._waiters: List[list] = []  # heap of [priority, seq, role, future]
+        self._queued_by_role: Dict[str, int] = {}
+        self._seq = itertools.count()
+        # Smoothed time a query holds a slot, for the Retry-After estimate
+        self._avg_hold_seconds = 1.0
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._queued_by_role.values())
+
+    def queue_depth_by_role(self) -> Dict[str, int]:
+        return dict(self._queued_by_role)
+
+    def priority(self, role: Optional[str]) -> int:
+        return self.role_priority.get(role or "admin", self.lowest_priority)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new arrival."""
+        backlog = (self.queue_depth + 1) / self.max_concurrent
+        return max(1, math.ceil(backlog * self._avg_hold_seconds))
+
+    async def acquire(self, role: Optional[str] = None) -> None:
+        """Wait for a slot; raises QueueFull if the queue is already full."""
+        role = role or "admin"
+        start = time.perf_counter()
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            admission_wait.observe(0.0, role=role)
+            return
+        if self.queue_depth >= self.max_queue and not self._shed_lower_than(self.priority(role)):
+            self._reject(role)
+            raise QueueFull(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [self.priority(role), next(self._seq), role, future]
+        heapq.heappush(self._waiters, entry)
+        self._queued_by_role[role] = self._queued_by_role.get(role, 0) + 1
+        self.stats["queued"] += 1
+        try:
+            await future
+        except QueueFull:
+            # Displaced from the queue by a higher-priority arrival
+            self._reject(role)
+            raise
+        except asyncio.CancelledError:
+            if not future.done() or future.cancelled():
+                self._remove(entry)
+            elif future.exception() is None:
+                # The slot was handed over just as the caller gave up
+                self.release()
+            else:
+                # Displaced just as the caller gave up; it never held a slot
+                self._reject(role)
+            raise
+        self.stats["admitted"] += 1
+        admission_wait.observe(time.perf_counter() - start, role=role)
+
+    def release(self, held_seconds: Optional[float] = None) -> None:
+        """Free a slot, handing it to the next waiter if there is one."""
+        if held_seconds is not None:
+            self._avg_hold_seconds = 0.8 * self._avg_hold_seconds + 0.2 * held_seconds
+        while self._waiters:
+            _, _, role, future = heapq.heappop(self._waiters)
+            self._dequeued(role)
+            if not future.done():
+                future.set_result(None)  # the slot passes over, in_flight is unchanged
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self, role: Optional[str] = None):
+        """Hold a slot for the duration of the block."""
+        await self.acquire(role)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(
+            self.stats,
+            in_flight=self.in_flight,
+            max_concurrent=self.max_concurrent,
+            queue_depth=self.queue_depth,
+            max_queue=self.max_queue,
+            queued_by_role=self.queue_depth_by_role(),
+            retry_after=self.retry_after()
+        )
+
+    def _shed_lower_than(self, priority: int) -> bool:
+        """Refuse the newest waiter of the lowest priority below priority, making room in the queue."""
+        victims = [entry for entry in self._waiters if entry[0] > priority and not entry[3].done()]
+        if not victims:
+            return False
+        victim = max(victims, key=lambda entry: (entry[0], entry[1]))
+        self._remove(victim)
+        victim[3].set_exception(QueueFull(self.retry_after()))
+        return True
+
+    def _reject(self, role: str) -> None:
+        self.stats["rejected"] += 1
+        admission_rejected.inc(role=role)
+
+    def _remove(self, entry: list) -> None:
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self._waiters)
+        self._dequeued(entry[2])
+
+    def _dequeued(self, role: str) -> None:
+        self._queued_by_role[role] -= 1
+        if not self._queued_by_role[role]:
+            del self._queued_by_role[role]
+
+def create_admission_controller() -> Optional[AdmissionController]:
+    """
+    Build the admission controller from the environment, or None if disabled.
+
+    ADMISSION_ENABLED=0 turns it off.
+    """
+    if os.environ.get("ADMISSION_ENABLED", "1") == "0":
+        return None
+    return AdmissionController(
+        max_concurrent=int(os.environ.get("ADMISSION_MAX_CONCURRENT", "32")),
+        max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", "256"))
+    )
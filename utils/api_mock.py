@@ -1,8 +1,79 @@
 import json
 import os
 import random
+import hashlib
+import threading
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+
+DATA_FILES = ("mock_orders.json", "mock_vehicles.json", "mock_weather.json", "mock_traffic.json")
+
+class FrozenDict(dict):
+    """A dict that refuses mutation, so a shared snapshot can't be edited in place."""
+    
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("data snapshot is read-only")
+    
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+def freeze(value: Any) -> Any:
+    """Recursively convert dicts to FrozenDict and lists to tuples."""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    """An immutable, versioned view of the mock data shared by every session."""
+    version: str
+    data: FrozenDict
+    loaded_at: datetime
+
+_snapshot: Optional[DataSnapshot] = None
+_snapshot_signature: Optional[Tuple] = None
+_snapshot_lock = threading.Lock()
+
+def _data_signature(data_path: str) -> Tuple:
+    """Cheap change detector for the data files: their sizes and mtimes."""
+    signature = []
+    for name in DATA_FILES:
+        try:
+            stat = os.stat(os.path.join(data_path, name))
+            signature.append((name, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append((name, None, None))
+    return tuple(signature)
+
+def get_data_snapshot() -> DataSnapshot:
+    """
+    Return the shared mock-data snapshot, reloading it only when a data file changed.
+
+    Sessions keep a reference to snapshot.data instead of their own copy of
+    load_mock_data(), and record snapshot.version so caches can tell which
+    data an answer was computed from.
+    """
+    global _snapshot, _snapshot_signature
+    data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+    signature = _data_signature(data_path)
+    if _snapshot is not None and signature == _snapshot_signature:
+        return _snapshot
+    
+    with _snapshot_lock:
+        if _snapshot is None or signature != _snapshot_signature:
+            data = load_mock_data()
+            canonical = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+            _snapshot = DataSnapshot(
+                version=hashlib.sha256(canonical).hexdigest()[:12],
+                data=freeze(data),
+                loaded_at=datetime.now()
+            )
+            # Re-read the signature, load_mock_data may have generated the files
+            _snapshot_signature = _data_signature(data_path)
+        return _snapshot
 
 def load_mock_data() -> Dict[str, Any]:
     """Load mock data for various APIs and systems."""
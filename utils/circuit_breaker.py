@@ -0,0 +1,118 @@
+"""
+Circuit breaker for the upstream LLM provider.
+
+After failure_threshold consecutive upstream failures the breaker opens and
+every call fails fast with CircuitOpenError, instead of each query waiting
+on (and adding load to) a provider that is already struggling. Once
+reset_seconds have passed it goes half-open and lets a single probe call
+through: success closes it again, failure re-opens it for another period.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import anthropic
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the breaker is open."""
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the provider is unhealthy.
+
+    Connection errors, timeouts, 429s and 5xx count; a rejected request
+    (400, 401, ...) is our problem, not the provider's, and does not.
+    """
+    if isinstance(error, anthropic.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+class CircuitBreaker:
+    """Thread-safe closed/open/half-open breaker with a single half-open probe."""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected (open, or half-open with its probe out)."""
+        with self._lock:
+            state = self._current_state()
+            return state == OPEN or (state == HALF_OPEN and self._probe_in_flight)
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError; admitted calls must report back."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self.stats["probes"] += 1
+                return
+            self.stats["rejected"] += 1
+        raise CircuitOpenError("LLM provider circuit is open; failing fast")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.stats["opened"] += 1
+                self._state = OPEN
+                self._opened_at = self.clock()
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Report an admitted call that ended without a verdict (e.g. it was cancelled)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, state=self._current_state(), consecutive_failures=self._failures)
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self.clock() - self._opened_at >= self.reset_seconds:
+            return HALF_OPEN
+        return self._state
+
+def create_circuit_breaker() -> Optional[CircuitBreaker]:
+    """
+    Build the LLM breaker from the environment, or None if disabled.
+
+    LLM_BREAKER_ENABLED=0 turns it off.
+    """
+    if os.environ.get("LLM_BREAKER_ENABLED", "1") == "0":
+        return None
+    return CircuitBreaker(
+        failure_threshold=int(os.environ.get("LLM_BREAKER_FAILURE_THRESHOLD", "5")),
+        reset_seconds=float(os.environ.get("LLM_BREAKER_RESET_SECONDS", "30"))
+    )
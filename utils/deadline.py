@@ -0,0 +1,71 @@
+"""
+End-to-end time budget for one query.
+
+A Deadline is created when a request arrives and carried in the LLM request
+scope; every stage checks what is left, LLM calls get it as their timeout,
+and optional hops are skipped once too little remains for them.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+# Budget for a query that doesn't set deadline_ms
+DEFAULT_DEADLINE_SECONDS = float(os.environ.get("QUERY_DEADLINE_SECONDS", "60"))
+
+# Longest budget a request may ask for with deadline_ms
+MAX_DEADLINE_SECONDS = float(os.environ.get("QUERY_MAX_DEADLINE_SECONDS", "300"))
+
+# Optional hops (data_retriever, notification) are skipped with less than this left
+MIN_OPTIONAL_HOP_SECONDS = float(os.environ.get("DEADLINE_MIN_HOP_SECONDS", "3"))
+
+# The fallback LLM call isn't attempted with less than this left; the query is answered locally instead
+MIN_FALLBACK_SECONDS = float(os.environ.get("DEADLINE_MIN_FALLBACK_SECONDS", "1"))
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage cannot start or finish within the query's deadline."""
+
+@dataclass(frozen=True)
+class Deadline:
+    """A point on the monotonic clock by which the query must be answered."""
+    expires_at: float
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    def allows(self, seconds: float) -> bool:
+        """Whether at least seconds of budget are left."""
+        return self.remaining() >= seconds
+
+    def timeout(self, stage: str = "request") -> float:
+        """The remaining budget as a timeout; raises DeadlineExceeded if none is left."""
+        remaining = self.remaining()
+        if remaining == 0.0:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+        return remaining
+
+    async def run(self, awaitable: Awaitable[T], stage: str) -> T:
+        """Await within the remaining budget, raising DeadlineExceeded on timeout."""
+        try:
+            timeout = self.timeout(stage)
+        except DeadlineExceeded:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Deadline exceeded during {stage}") from None
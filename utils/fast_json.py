@@ -0,0 +1,40 @@
+"""
+JSON encoding for API responses.
+
+Uses orjson when it is installed (pip install orjson) and falls back to the
+standard library otherwise; both produce compact UTF-8 JSON.
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+def stdlib_dumps(obj: Any) -> bytes:
+    """Encode with the standard library, in the same compact form as orjson."""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+def dumps(obj: Any) -> bytes:
+    """Encode obj as compact UTF-8 JSON bytes with the fastest available encoder."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return stdlib_dumps(obj)
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoded with dumps.
+
+    Returning one from an endpoint also skips FastAPI's response_model
+    validation and jsonable_encoder pass, so the content must already be
+    plain JSON types.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,116 @@
+"""
+Conversation history management.
+
+Sessions keep at most HISTORY_MAX_TURNS turns verbatim; older turns are
+folded into a rolling extractive summary (the first sentence of each turn)
+stored next to them as `history_summary`. When an agent builds its prompt,
+history_messages() picks the most recent turns that fit the agent's token
+budget, truncating long ones, and sums up everything older in a single
+summary message, so prompt size stays bounded however verbose earlier
+answers were.
+"""
+
+import math
+import os
+import re
+from typing import Any, Dict, List, MutableMapping, Optional
+
+# Turns kept verbatim in a session before the oldest are folded into the summary
+HISTORY_MAX_TURNS = int(os.environ.get("HISTORY_MAX_TURNS", "20"))
+
+# Upper bound on the rolling summary; its oldest lines are dropped beyond this
+SUMMARY_MAX_CHARS = int(os.environ.get("HISTORY_SUMMARY_MAX_CHARS", "2000"))
+
+# Longest a single earlier turn may be in a prompt
+ENTRY_MAX_TOKENS = int(os.environ.get("HISTORY_ENTRY_MAX_TOKENS", "400"))
+
+# Prompt tokens each agent may spend on history; HISTORY_TOKEN_BUDGET_<AGENT> overrides.
+# The coordinator only needs enough context to resolve follow-ups like "and now?"
+AGENT_TOKEN_BUDGETS = {
+    "coordinator": 400,
+    "route_optimizer": 1500,
+    "fleet_monitor": 1500,
+}
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "1000"))
+
+# Rough size of a token in English text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s|\n")
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def token_budget(agent: str) -> int:
+    """The history token budget for an agent."""
+    override = os.environ.get(f"HISTORY_TOKEN_BUDGET_{agent.upper()}")
+    if override is not None:
+        return int(override)
+    return AGENT_TOKEN_BUDGETS.get(agent, DEFAULT_TOKEN_BUDGET)
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, marking the cut."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + " ... [truncated]"
+
+def summarize_turn(entry: Dict[str, str], max_chars: int = 200) -> str:
+    """One line for a turn: who spoke and the first sentence of what they said."""
+    content = entry["content"].strip()
+    first = _SENTENCE_END.split(content, maxsplit=1)[0].strip()
+    if len(first) > max_chars:
+        first = first[:max_chars].rstrip() + "..."
+    speaker = "User" if entry["role"] == "user" else "Assistant"
+    return f"- {speaker}: {first}"
+
+def roll_summary(summary: str, entries: List[Dict[str, str]], max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """Append one line per entry to summary, dropping the oldest lines beyond max_chars."""
+    lines = [line for line in summary.splitlines() if line]
+    lines += [summarize_turn(entry) for entry in entries]
+    while lines and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+def append_turn(context: MutableMapping[str, Any], role: str, content: str, max_turns: int = HISTORY_MAX_TURNS) -> None:
+    """Add a turn to context["conversation_history"], folding turns beyond max_turns into the summary."""
+    history = context.setdefault("conversation_history", [])
+    history.append({"role": role, "content": content})
+    overflow = len(history) - max_turns
+    if overflow > 0:
+        context["history_summary"] = roll_summary(context.get("history_summary", ""), history[:overflow])
+        del history[:overflow]
+
+def history_messages(context: MutableMapping[str, Any], agent: str, max_entries: int = 5, budget: Optional[int] = None) -> List[Dict[str, str]]:
+    """
+    Build the history part of an agent's messages within its token budget.
+
+    Takes up to max_entries of the most recent turns, newest first, while
+    they fit the budget (each capped at ENTRY_MAX_TOKENS), then, budget
+    permitting, puts a summary of everything older in front of them.
+    """
+    budget = token_budget(agent) if budget is None else budget
+    history = context.get("conversation_history", [])
+
+    messages = []
+    used = 0
+    for entry in reversed(history[-max_entries:] if max_entries else []):
+        remaining = budget - used
+        if remaining < 50:
+            break
+        content = truncate(entry["content"], min(remaining, ENTRY_MAX_TOKENS))
+        messages.append({"role": "user" if entry["role"] == "user" else "assistant", "content": content})
+        used += estimate_tokens(content)
+    messages.reverse()
+
+    # Summarize what didn't make it, keeping the newest lines that fit
+    remaining = budget - used
+    if remaining >= 50:
+        older = history[:len(history) - len(messages)]
+        summary = roll_summary(context.get("history_summary", ""), older, max_chars=min(SUMMARY_MAX_CHARS, remaining * CHARS_PER_TOKEN - 40))
+        if summary:
+            messages.insert(0, {"role": "user", "content": f"Summary of the earlier conversation:\n{summary}"})
+    # The conversation sent to the model has to open with a user turn
+    while messages and messages[0]["role"] != "user":
+        messages.pop(0)
+    return messages
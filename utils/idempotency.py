@@ -0,0 +1,244 @@
+"""
+Idempotency-Key support for retried requests.
+
+The first request with a given key runs normally and its response bytes are
+kept for ttl_seconds; retries with the same key get exactly those bytes back
+without re-running anything. A retry that arrives while the original is
+still running waits for it instead of starting a second run. With the
+SQLite store this holds across worker processes, not just within one.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.session_store import session_db_path
+
+class IdempotencyConflict(Exception):
+    """Raised when a key is reused with a different request body."""
+
+@dataclass(frozen=True)
+class StoredResponse:
+    """A completed response, kept exactly as it was sent."""
+    status_code: int
+    body: bytes
+    media_type: str
+    fingerprint: str
+
+class IdempotencyStore:
+    """
+    In-process store of completed responses by idempotency key, for a single worker.
+
+    Completed entries are evicted after ttl_seconds or, once over
+    max_entries, least recently used first. A run that raises is not stored,
+    so the client's next retry runs again.
+    """
+
+    def __init__(self, ttl_seconds: float = 86400, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._completed: "OrderedDict[str, Tuple[float, StoredResponse]]" = OrderedDict()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.stats = {"executions": 0, "replayed": 0, "waited": 0, "conflicts": 0}
+
+    async def run(self, key: str, fingerprint: str, fn: Callable[[], Awaitable[StoredResponse]]) -> Tuple[StoredResponse, bool]:
+        """
+        Return (response, replayed) for key, running fn only if no response exists yet.
+
+        fingerprint identifies the request body; reusing a key with a different
+        one raises IdempotencyConflict.
+        """
+        stored = self._get(key)
+        if stored is not None:
+            self._check(stored.fingerprint, fingerprint)
+            self.stats["replayed"] += 1
+            return stored, True
+
+        if key in self._in_flight:
+            original_fingerprint, future = self._in_flight[key]
+            self._check(original_fingerprint, fingerprint)
+            self.stats["waited"] += 1
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            response = await self._claim(key, fingerprint)
+            replayed = response is not None
+            if replayed:
+                self.stats["waited"] += 1
+            else:
+                self.stats["executions"] += 1
+                try:
+                    response = await fn()
+                except BaseException:
+                    self._release(key)
+                    raise
+                self._put(key, response)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            del self._in_flight[key]
+        future.set_result(response)
+        return response, replayed
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats, stored=len(self._completed), in_flight=len(self._in_flight))
+
+    def _check(self, stored_fingerprint: str, fingerprint: str) -> None:
+        if stored_fingerprint != fingerprint:
+            self.stats["conflicts"] += 1
+            raise IdempotencyConflict("Idempotency-Key was already used with a different request body")
+
+    async def _claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """
+        Reserve key for a run in this process.
+
+        Returns None once the caller owns the key, or the response if another
+        process completed it meanwhile. In-process runs are already
+        coalesced through _in_flight, so there is nothing to reserve here.
+        """
+        return None
+
+    def _release(self, key: str) -> None:
+        """Give up a claim after the run failed, so the next retry runs again."""
+
+    def _get(self, key: str) -> Optional[StoredResponse]:
+        entry = self._completed.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if self.clock() >= expires_at:
+            del self._completed[key]
+            return None
+        self._completed.move_to_end(key)
+        return response
+
+    def _put(self, key: str, response: StoredResponse) -> None:
+        now = self.clock()
+        self._completed[key] = (now + self.ttl_seconds, response)
+        self._completed.move_to_end(key)
+        while self._completed:
+            oldest, (expires_at, _) = next(iter(self._completed.items()))
+            if len(self._completed) <= self.max_entries and expires_at > now:
+                break
+            del self._completed[oldest]
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    """
+    Store of completed responses in the SQLite file shared with the session backend.
+
+    A worker claims a key by inserting its row before running; a retry that
+    lands on another worker meanwhile polls that row until the response is
+    stored, or runs itself if the claim is released because the original
+    failed. A claim left behind by a worker that died is taken over after
+    claim_timeout seconds. Completed rows expire after ttl_seconds and are
+    pruned, oldest first beyond max_entries, every prune_every writes.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_entries: int = 10000,
+                 claim_timeout: float = 300, poll_interval: float = 0.05, prune_every: int = 100):
+        super().__init__(ttl_seconds, max_entries, clock=time.time)
+        self.path = path
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+            "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, status_code INTEGER, body BLOB, "
+            "media_type TEXT, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idempotency_keys_expires_at ON idempotency_keys (expires_at)")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM idempotency_keys WHERE body IS NOT NULL AND expires_at > ?", (self.clock(),)
+            ).fetchone()
+        return dict(self.stats, stored=row[0], in_flight=len(self._in_flight))
+
+    async def _claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND expires_at <= ?", (key, now))
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO idempotency_keys (key, fingerprint, expires_at) VALUES (?, ?, ?)",
+                    (key, fingerprint, now + self.claim_timeout)
+                )
+                if cursor.rowcount:
+                    return None
+                row = self._conn.execute(
+                    "SELECT fingerprint, status_code, body, media_type FROM idempotency_keys WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                continue  # released between the insert and the select
+            self._check(row[0], fingerprint)
+            if row[2] is not None:
+                return StoredResponse(row[1], row[2], row[3], row[0])
+            await asyncio.sleep(self.poll_interval)
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND body IS NULL", (key,))
+
+    def _get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, status_code, body, media_type FROM idempotency_keys "
+                "WHERE key = ? AND body IS NOT NULL AND expires_at > ?",
+                (key, self.clock())
+            ).fetchone()
+        return StoredResponse(row[1], row[2], row[3], row[0]) if row else None
+
+    def _put(self, key: str, response: StoredResponse) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO idempotency_keys (key, fingerprint, status_code, body, media_type, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET fingerprint = excluded.fingerprint, "
+                "status_code = excluded.status_code, body = excluded.body, media_type = excluded.media_type, "
+                "expires_at = excluded.expires_at",
+                (key, response.fingerprint, response.status_code, response.body, response.media_type,
+                 self.clock() + self.ttl_seconds)
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune()
+
+    def _prune(self) -> None:
+        self._conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (self.clock(),))
+        self._conn.execute(
+            "DELETE FROM idempotency_keys WHERE key IN ("
+            "SELECT key FROM idempotency_keys WHERE body IS NOT NULL ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+def create_idempotency_store() -> IdempotencyStore:
+    """
+    Build the store from IDEMPOTENCY_TTL_SECONDS and IDEMPOTENCY_MAX_ENTRIES.
+
+    Follows SESSION_BACKEND: with "sqlite" the keys live in the same file
+    as the sessions (SESSION_DB_PATH), so every worker sees them.
+    """
+    ttl_seconds = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    max_entries = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+    if os.environ.get("SESSION_BACKEND", "memory").lower() == "sqlite":
+        claim_timeout = float(os.environ.get("IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS", "300"))
+        return SQLiteIdempotencyStore(session_db_path(), ttl_seconds, max_entries, claim_timeout)
+    return IdempotencyStore(ttl_seconds=ttl_seconds, max_entries=max_entries)
@@ -0,0 +1,419 @@
+"""
+Gateway for every Messages API call.
+
+Agents and apps call create_message / acreate_message instead of holding
+their own Anthropic client. The gateway owns the shared clients and their
+connection pools and, in order, applies the response cache, the
+client-side rate limiter (LLM_RATE_LIMIT_*), a process-wide cap on calls
+in flight (LLM_MAX_CONCURRENT_CALLS), the circuit breaker, the request's
+deadline, retries of upstream failures with jittered backoff
+(LLM_MAX_RETRIES) and timing and usage instrumentation.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import anthropic
+import httpx
+from anthropic.types import Message
+
+from utils.circuit_breaker import create_circuit_breaker, is_upstream_failure
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.llm_cache import cache_key, create_llm_cache
+from utils.history import estimate_tokens
+from utils.model_tiers import LARGE, TIER_MODELS, model_for, model_settings, prompt_cache_min_tokens, tier_for, tier_report
+from utils.metrics import llm_cost, llm_latency, llm_tier_latency, llm_requests, llm_retries, llm_tokens, llm_wait, track
+from utils.rate_limit import create_rate_limiter
+from utils.usage import USAGE_FIELDS, usage_totals
+
+# Model of the large tier, and of agents without a tier
+DEFAULT_MODEL = TIER_MODELS[LARGE]
+
+# Connection pool sizing for the shared clients
+MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+# Most calls in flight at once across all agents; further calls wait for a slot
+MAX_CONCURRENT_CALLS = int(os.environ.get("LLM_MAX_CONCURRENT_CALLS", "64"))
+
+# Retries of upstream failures (connection errors, timeouts, 429s, 5xx). The
+# SDK's own retries are turned off, so these are the only ones.
+MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+RETRY_BASE_SECONDS = float(os.environ.get("LLM_RETRY_BASE_SECONDS", "0.5"))
+RETRY_MAX_SECONDS = float(os.environ.get("LLM_RETRY_MAX_SECONDS", "8"))
+
+_async_client: Optional[anthropic.AsyncAnthropic] = None
+_client: Optional[anthropic.Anthropic] = None
+
+# Response cache shared by every agent; None when LLM_CACHE_ENABLED=0
+response_cache = create_llm_cache()
+
+# Set PROMPT_CACHE_ENABLED=0 to send plain string system prompts without cache breakpoints
+PROMPT_CACHE_ENABLED = os.environ.get("PROMPT_CACHE_ENABLED", "1") != "0"
+
+# Breaker shared by every agent; None when LLM_BREAKER_ENABLED=0
+llm_breaker = create_circuit_breaker()
+
+# Client-side rate limiter; None unless LLM_RATE_LIMIT_RPS is set
+llm_limiter = create_rate_limiter()
+
+# Concurrency slots: one semaphore for blocking callers, one per event loop for async ones
+_sync_slots = threading.BoundedSemaphore(MAX_CONCURRENT_CALLS)
+_async_slots: Optional[asyncio.Semaphore] = None
+_async_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+_stats_lock = threading.Lock()
+_stats = {"in_flight": 0, "retries": 0}
+
+# Per-request options for every LLM call made while handling one query
+_request_scope: ContextVar[Dict[str, Any]] = ContextVar("llm_request_scope", default={})
+
+@contextmanager
+def request_scope(**options):
+    """
+    Apply per-request options to every LLM call made inside the block.
+
+    Recognised options: data_version (the data snapshot the prompts were
+    built from, part of the cache key), bypass_cache (always call the
+    model, but still store the fresh answer), usage (a UsageMeter that
+    records the tokens of every call, per agent) and deadline (a Deadline
+    whose remaining budget becomes each call's timeout).
+    """
+    token = _request_scope.set({**_request_scope.get(), **options})
+    try:
+        yield
+    finally:
+        _request_scope.reset(token)
+
+def cacheable_system(*blocks: str, agent: str) -> Union[str, List[Dict[str, Any]]]:
+    """
+    Build a system prompt from static blocks, marked for Anthropic prompt caching.
+
+    Pass the fixed instructions first and any data snapshot after them; the
+    cache breakpoint goes on the last block, so the API reuses the whole
+    prefix across calls and only the messages that follow are processed
+    anew. The breakpoint is only set when the agent's model supports prompt
+    caching and the prefix reaches its minimum (1024 tokens, 2048 for
+    Haiku); anything else is sent as a plain string, since it would never
+    be cached.
+    """
+    blocks = [block for block in blocks if block]
+    min_tokens = prompt_cache_min_tokens(model_for(agent))
+    if not PROMPT_CACHE_ENABLED or min_tokens is None or estimate_tokens("\n\n".join(blocks)) < min_tokens:
+        return "\n\n".join(blocks)
+    system = [{"type": "text", "text": block} for block in blocks]
+    system[-1]["cache_control"] = {"type": "ephemeral"}
+    return system
+
+def current_deadline() -> Optional[Deadline]:
+    """The deadline of the request being handled, if any."""
+    return _request_scope.get().get("deadline")
+
+def _apply_deadline(kwargs: Dict[str, Any], agent: str) -> Dict[str, Any]:
+    """Bound the call by the request's remaining budget; raises DeadlineExceeded if it is spent."""
+    deadline = current_deadline()
+    if deadline is None:
+        return kwargs
+    return {**kwargs, "timeout": deadline.timeout(agent)}
+
+@contextmanager
+def _guarded(agent: str):
+    """
+    Run one provider call through the circuit breaker.
+
+    Raises CircuitOpenError without calling while the breaker is open. A
+    timeout caused by the request's own deadline running out says nothing
+    about the provider, so it is not counted as a failure.
+    """
+    if llm_breaker is None:
+        yield
+        return
+    try:
+        llm_breaker.before_call()
+    except Exception:
+        llm_requests.inc(agent=agent, outcome="rejected")
+        raise
+    try:
+        yield
+    except Exception as e:
+        deadline = current_deadline()
+        if is_upstream_failure(e) and not (deadline is not None and deadline.expired):
+            llm_breaker.record_failure()
+        elif isinstance(e, anthropic.APIStatusError):
+            llm_breaker.record_success()
+        else:
+            llm_breaker.release()
+        raise
+    except BaseException:
+        llm_breaker.release()
+        raise
+    llm_breaker.record_success()
+
+def get_async_client() -> anthropic.AsyncAnthropic:
+    """
+    Return the process-wide AsyncAnthropic client, creating it on first use.
+
+    Every async agent goes through this client so that concurrent /query
+    requests share one HTTP connection pool instead of each agent module
+    holding its own blocking client.
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = anthropic.AsyncAnthropic(
+            api_key=os.environ.get("ANTHROPIC_API_KEY", "dummy_key"),
+            max_retries=0,
+            http_client=anthropic.DefaultAsyncHttpxClient(limits=_pool_limits())
+        )
+    return _async_client
+
+def get_client() -> anthropic.Anthropic:
+    """Return the process-wide blocking client used by the LangGraph (Streamlit) path."""
+    global _client
+    if _client is None:
+        _client = anthropic.Anthropic(
+            api_key=os.environ.get("ANTHROPIC_API_KEY", "dummy_key"),
+            max_retries=0,
+            http_client=anthropic.DefaultHttpxClient(limits=_pool_limits())
+        )
+    return _client
+
+async def close_async_client() -> None:
+    """Close the shared async client and release its connection pool."""
+    global _async_client, _async_slots, _async_slots_loop
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    _async_slots = _async_slots_loop = None
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+
+def gateway_stats() -> Dict[str, Any]:
+    """Calls in flight, retries so far and the limits in force."""
+    with _stats_lock:
+        stats = dict(_stats)
+    return dict(
+        stats,
+        tier_models=dict(TIER_MODELS),
+        max_concurrent_calls=MAX_CONCURRENT_CALLS,
+        max_retries=MAX_RETRIES,
+        rate_limit=llm_limiter.snapshot() if llm_limiter is not None else None
+    )
+
+def _count(stat: str, delta: int = 1) -> None:
+    with _stats_lock:
+        _stats[stat] += delta
+
+def retry_delay(error: BaseException, attempt: int) -> float:
+    """
+    Seconds to wait before retry number attempt (1-based).
+
+    Honours a Retry-After header from the provider, otherwise uses
+    exponential backoff with full jitter so that callers that failed
+    together don't retry together.
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(max(0.0, float(response.headers.get("retry-after"))), RETRY_MAX_SECONDS)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+
+def _retry_delay_for(error: Exception, attempt: int, agent: str) -> Optional[float]:
+    """The backoff before retrying a failed attempt, or None if it shouldn't be retried."""
+    if attempt > MAX_RETRIES or not is_upstream_failure(error):
+        return None
+    delay = retry_delay(error, attempt)
+    deadline = current_deadline()
+    if deadline is not None and not deadline.allows(delay):
+        return None
+    _count("retries")
+    llm_retries.inc(agent=agent)
+    return delay
+
+def _rate_limit_delay(agent: str) -> float:
+    """Reserve a rate-limiter token; raises DeadlineExceeded if the wait would outlast the deadline."""
+    if llm_limiter is None:
+        return 0.0
+    delay = llm_limiter.reserve()
+    deadline = current_deadline()
+    if delay and deadline is not None and not deadline.allows(delay):
+        llm_limiter.cancel()
+        raise DeadlineExceeded(f"Deadline exceeded waiting for the LLM rate limit before {agent}")
+    return delay
+
+def _get_async_slots() -> asyncio.Semaphore:
+    """The concurrency semaphore for the running event loop (asyncio primitives are bound to one loop)."""
+    global _async_slots, _async_slots_loop
+    loop = asyncio.get_running_loop()
+    if _async_slots is None or _async_slots_loop is not loop:
+        _async_slots, _async_slots_loop = asyncio.Semaphore(MAX_CONCURRENT_CALLS), loop
+    return _async_slots
+
+@contextmanager
+def _call_slot(agent: str):
+    """Wait for the rate limiter and a concurrency slot, then hold the slot for one attempt."""
+    start = time.perf_counter()
+    delay = _rate_limit_delay(agent)
+    if delay:
+        time.sleep(delay)
+    deadline = current_deadline()
+    if not _sync_slots.acquire(timeout=deadline.timeout(agent) if deadline is not None else None):
+        raise DeadlineExceeded(f"Deadline exceeded waiting for an LLM slot before {agent}")
+    llm_wait.observe(time.perf_counter() - start, agent=agent)
+    _count("in_flight")
+    try:
+        yield
+    finally:
+        _count("in_flight", -1)
+        _sync_slots.release()
+
+@asynccontextmanager
+async def _async_call_slot(agent: str):
+    """Async counterpart of _call_slot."""
+    start = time.perf_counter()
+    delay = _rate_limit_delay(agent)
+    if delay:
+        await asyncio.sleep(delay)
+    slots = _get_async_slots()
+    deadline = current_deadline()
+    if deadline is None:
+        await slots.acquire()
+    else:
+        await deadline.run(slots.acquire(), f"waiting for an LLM slot before {agent}")
+    llm_wait.observe(time.perf_counter() - start, agent=agent)
+    _count("in_flight")
+    try:
+        yield
+    finally:
+        _count("in_flight", -1)
+        slots.release()
+
+def _cache_lookup(kwargs: Dict[str, Any]):
+    """Return (key, cached Message or None); key is None when caching doesn't apply."""
+    if response_cache is None:
+        return None, None
+    scope = _request_scope.get()
+    key = cache_key(kwargs, scope.get("data_version"))
+    if scope.get("bypass_cache"):
+        response_cache.record_bypass()
+        return key, None
+    cached = response_cache.get(key)
+    return key, Message.model_validate(cached) if cached is not None else None
+
+def _record_usage(agent: str, message: Message, cached: bool = False, seconds: Optional[float] = None) -> None:
+    """
+    Count the call's real token usage for the process and the current
+    request; seconds, the latency of a call that reached the API, also
+    goes into the per-tier report.
+    """
+    usage_totals.record(agent, message.usage, cached)
+    if not cached:
+        for field in USAGE_FIELDS:
+            llm_tokens.inc(getattr(message.usage, field, None) or 0, agent=agent, kind=field)
+    if seconds is not None:
+        tier = tier_for(agent)
+        cost = tier_report.record(agent, message.model, seconds, message.usage)
+        llm_tier_latency.observe(seconds, tier=tier)
+        if cost is not None:
+            llm_cost.inc(cost, tier=tier, model=message.model)
+    meter = _request_scope.get().get("usage")
+    if meter is not None:
+        meter.record(agent, message.usage, cached)
+
+def _cache_store(key: Optional[str], message: Message) -> None:
+    if key is not None:
+        response_cache.set(key, message.model_dump(mode="json"))
+
+def create_message(agent: str = "unknown", **kwargs) -> Message:
+    """
+    Send a Messages API request on the shared blocking client, through the
+    response cache, rate limiter, concurrency limit, circuit breaker and
+    retries.
+
+    agent names the caller for usage accounting and picks the default model
+    and max_tokens; it is not sent to the API.
+    """
+    kwargs = {**model_settings(agent), **kwargs}
+    key, cached = _cache_lookup(kwargs)
+    if cached is not None:
+        _record_usage(agent, cached, cached=True)
+        llm_requests.inc(agent=agent, outcome="cached")
+        return cached
+
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            with _call_slot(agent):
+                request = _apply_deadline(kwargs, agent)
+                started = time.perf_counter()
+                with _guarded(agent), track(llm_requests, llm_latency, agent=agent):
+                    message = get_client().messages.create(**request)
+            break
+        except Exception as e:
+            delay = _retry_delay_for(e, attempt, agent)
+            if delay is None:
+                raise
+            time.sleep(delay)
+    _record_usage(agent, message, seconds=time.perf_counter() - started)
+    _cache_store(key, message)
+    return message
+
+async def acreate_message(agent: str = "unknown", on_text: Optional[Callable[[str], None]] = None, **kwargs) -> Message:
+    """
+    Send a Messages API request on the shared async client, through the
+    response cache, rate limiter, concurrency limit, circuit breaker
+    (cached answers are still served while it is open) and retries.
+
+    When on_text is given the response is streamed and on_text is called with
+    each text delta as it arrives; the assembled final message is returned
+    either way, so callers handle both modes identically. A cached response
+    is delivered to on_text as a single delta, and a stream that has already
+    delivered text is not retried. agent names the caller for usage
+    accounting and picks the default model and max_tokens; it is not sent
+    to the API.
+    """
+    kwargs = {**model_settings(agent), **kwargs}
+    key, cached = _cache_lookup(kwargs)
+    if cached is not None:
+        _record_usage(agent, cached, cached=True)
+        llm_requests.inc(agent=agent, outcome="cached")
+        if on_text is not None:
+            on_text(cached.content[0].text)
+        return cached
+
+    client = get_async_client()
+    attempt = 0
+    while True:
+        attempt += 1
+        streamed = False
+        try:
+            async with _async_call_slot(agent):
+                request = _apply_deadline(kwargs, agent)
+                started = time.perf_counter()
+                with _guarded(agent), track(llm_requests, llm_latency, agent=agent):
+                    if on_text is None:
+                        message = await client.messages.create(**request)
+                    else:
+                        async with client.messages.stream(**request) as stream:
+                            async for text in stream.text_stream:
+                                streamed = True
+                                on_text(text)
+                            message = await stream.get_final_message()
+            break
+        except Exception as e:
+            delay = None if streamed else _retry_delay_for(e, attempt, agent)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+
+    _record_usage(agent, message, seconds=time.perf_counter() - started)
+    _cache_store(key, message)
+    return message
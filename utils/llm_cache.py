@@ -0,0 +1,173 @@
+"""
+Content-addressed cache for Messages API responses.
+
+Responses are keyed on a hash of everything that determines them: model,
+max_tokens, system prompt, messages and the data-snapshot version the
+prompt was built from. A bounded in-memory LRU tier sits in front of an
+optional on-disk tier, so identical prompts (demo scenarios, repeated fleet
+status questions) are answered without another LLM call, even after a
+restart.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Request fields that determine the response; anything else (timeouts,
+# streaming flags) does not change what the model returns
+KEY_FIELDS = ("model", "max_tokens", "system", "messages", "temperature", "stop_sequences")
+
+def cache_key(request: Dict[str, Any], data_version: Optional[str] = None) -> str:
+    """Hash the response-determining fields of a request plus the data version."""
+    material = {field: request.get(field) for field in KEY_FIELDS}
+    material["data_version"] = data_version
+    canonical = json.dumps(material, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class LLMCache:
+    """
+    Two-tier response cache: in-memory LRU in front of an optional directory.
+
+    Entries are plain dicts (a serialized Message) with a creation time;
+    anything older than ttl_seconds is treated as a miss and dropped.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600,
+                 disk_dir: Optional[str] = None, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+        value = self._read_disk(key, now)
+        with self._lock:
+            if value is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+        self._remember(key, value[0], value[1])
+        return value[1]
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a response in both tiers."""
+        created = time.time()
+        self._remember(key, created, value)
+        with self._lock:
+            self.stats["stores"] += 1
+        self._write_disk(key, created, value)
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.stats["bypassed"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            return dict(self.stats, entries=len(self._memory), hit_ratio=hits / lookups if lookups else 0.0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    def _remember(self, key: str, created: float, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._memory[key] = (created, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str, now: float):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if now - entry["created"] >= self.ttl_seconds:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        return entry["created"], entry["value"]
+
+    def _write_disk(self, key: str, created: float, value: Dict[str, Any]) -> None:
+        if not self.disk_dir:
+            return
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"created": created, "value": value}, f, separators=(",", ":"))
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            return
+
+        self._disk_writes += 1
+        if self._disk_writes % 100 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Delete the oldest files until the disk tier is under max_disk_bytes."""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                try:
+                    stat = os.stat(os.path.join(self.disk_dir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+                total -= size
+                with self._lock:
+                    self.stats["evictions"] += 1
+            except OSError:
+                pass
+
+def create_llm_cache() -> Optional[LLMCache]:
+    """
+    Build the response cache from the environment, or None if disabled.
+
+    LLM_CACHE_ENABLED=0 turns caching off; LLM_CACHE_DIR enables the disk tier.
+    """
+    if os.environ.get("LLM_CACHE_ENABLED", "1") == "0":
+        return None
+    return LLMCache(
+        max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "1000")),
+        ttl_seconds=float(os.environ.get("LLM_CACHE_TTL_SECONDS", "3600")),
+        disk_dir=os.environ.get("LLM_CACHE_DIR") or None,
+        max_disk_bytes=int(float(os.environ.get("LLM_CACHE_MAX_DISK_MB", "256")) * 1024 * 1024)
+    )
@@ -0,0 +1,226 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Counters, gauges and histograms live in a registry that /metrics renders on
+each scrape, so any Prometheus-compatible scraper can collect them without
+a client library or a push gateway.
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from a cached or fast-path answer up to a slow chained query
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric(ABC):
+    """Base for a named metric family with a fixed set of label names."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return lines + self._samples()
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines of the family, one per label set (and bucket)."""
+
+class Counter(_Metric):
+    """A monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(v)}" for key, v in items]
+
+class Gauge(_Metric):
+    """
+    A current value, either set explicitly or read from a callback at scrape time.
+
+    A callback for a labelled gauge returns {label values tuple: value}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), fn: Optional[Callable[[], Any]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self) -> List[str]:
+        if self.fn is not None and not self.labelnames:
+            return [f"{self.name} {_format_value(self.fn())}"]
+        if self.fn is not None:
+            items = sorted((tuple(str(v) for v in key), value) for key, value in self.fn().items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(v)}" for key, v in items]
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """The set of metrics exposed on /metrics, in registration order."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), fn: Optional[Callable[[], Any]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, fn))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render every metric in the text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Content type of the text exposition format (the response adds charset=utf-8)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+metrics = MetricsRegistry()
+
+# Metrics shared by the API, the LLM gateway and admission control
+agent_requests = metrics.counter(
+    "supply_chain_agent_requests_total", "Agent invocations by agent and outcome (ok or error).", ("agent", "outcome"))
+agent_latency = metrics.histogram(
+    "supply_chain_agent_latency_seconds", "Wall-clock time of one agent invocation, LLM call included.", ("agent",))
+fallback_requests = metrics.counter(
+    "supply_chain_fallback_total", "Queries that took the fallback path, by outcome (ok, error, or local when answered without the LLM).", ("outcome",))
+llm_requests = metrics.counter(
+    "supply_chain_llm_requests_total", "Messages API calls by calling agent and outcome (ok, error, cancelled, rejected by the circuit breaker, or cached).", ("agent", "outcome"))
+llm_tokens = metrics.counter(
+    "supply_chain_llm_tokens_total", "Tokens reported by the Messages API, by agent and usage field (cache reads and writes included).", ("agent", "kind"))
+llm_latency = metrics.histogram(
+    "supply_chain_llm_latency_seconds", "Latency of Messages API calls that reached the API.", ("agent",))
+llm_tier_latency = metrics.histogram(
+    "supply_chain_llm_tier_latency_seconds", "Latency of successful Messages API calls, by model tier.", ("tier",))
+llm_cost = metrics.counter(
+    "supply_chain_llm_cost_usd_total", "Estimated spend on Messages API calls in USD, by model tier and model.", ("tier", "model"))
+llm_wait = metrics.histogram(
+    "supply_chain_llm_wait_seconds", "Time a Messages API call waited for the client-side rate limiter and a concurrency slot.", ("agent",))
+llm_retries = metrics.counter(
+    "supply_chain_llm_retries_total", "Messages API calls retried after an upstream failure, by agent.", ("agent",))
+admission_wait = metrics.histogram(
+    "supply_chain_admission_wait_seconds", "Time a query waited in the admission queue, by role.", ("role",))
+admission_rejected = metrics.counter(
+    "supply_chain_admission_rejected_total", "Queries refused with 429 because the admission queue was full, by role.", ("role",))
+
+@contextmanager
+def track(counter: Counter, histogram: Histogram, **labels):
+    """Time the block into histogram and count it as outcome ok, error or cancelled in counter."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        histogram.observe(time.perf_counter() - start, **labels)
+        counter.inc(outcome="error", **labels)
+        raise
+    except asyncio.CancelledError:
+        counter.inc(outcome="cancelled", **labels)
+        raise
+    histogram.observe(time.perf_counter() - start, **labels)
+    counter.inc(outcome="ok", **labels)
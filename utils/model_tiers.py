@@ -0,0 +1,155 @@
+"""
+Model tiering: which model, and how many output tokens, each agent gets.
+
+Agents are assigned to a tier rather than to a model. Routing, data
+formatting, fleet summaries and notifications go to the fast tier; route
+plans and the free-form fallback answer, which benefit most from a larger
+model, go to the large tier. Every level can be overridden from the
+environment:
+
+    LLM_MODEL_FAST / LLM_MODEL_LARGE   the model behind each tier
+    LLM_TIER_<AGENT>                   move an agent to another tier
+    LLM_MODEL_<AGENT>                  pin an agent to a specific model
+    LLM_MAX_TOKENS_<AGENT>             an agent's max_tokens
+
+TierReport keeps per-tier latency, token and cost totals for /llm/tiers.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+FAST = "fast"
+LARGE = "large"
+
+TIER_MODELS = {
+    FAST: os.environ.get("LLM_MODEL_FAST", "claude-3-haiku-20240307"),
+    LARGE: os.environ.get("LLM_MODEL_LARGE", os.environ.get("LLM_MODEL", "claude-3-sonnet-20240229")),
+}
+
+AGENT_TIERS = {
+    "coordinator": FAST,
+    "data_retriever": FAST,
+    "fleet_monitor": FAST,
+    "notification": FAST,
+    "route_optimizer": LARGE,
+    "fallback": LARGE,
+}
+
+# Agents not listed use the large tier, so an unclassified caller never gets a worse answer
+DEFAULT_TIER = LARGE
+
+# The coordinator only has to name an agent and give a one-line reason
+AGENT_MAX_TOKENS = {
+    "coordinator": 200,
+    "data_retriever": 1000,
+    "fleet_monitor": 1500,
+    "notification": 600,
+    "route_optimizer": 2000,
+    "fallback": 2000,
+}
+DEFAULT_MAX_TOKENS = 1000
+
+# USD per million tokens (input, output); cache writes cost 1.25x input, cache reads 0.1x
+MODEL_PRICES = {
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-3-sonnet-20240229": (3.00, 15.00),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+    "claude-3-opus-20240229": (15.00, 75.00),
+}
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+# Shortest system prefix, in tokens, each model will cache; None where prompt caching isn't supported
+PROMPT_CACHE_MIN_TOKENS = {
+    "claude-3-haiku-20240307": 2048,
+    "claude-3-5-haiku-20241022": 2048,
+    "claude-3-sonnet-20240229": None,
+    "claude-3-5-sonnet-20241022": 1024,
+    "claude-3-opus-20240229": 1024,
+}
+DEFAULT_PROMPT_CACHE_MIN_TOKENS = 1024
+
+def tier_for(agent: str) -> str:
+    return os.environ.get(f"LLM_TIER_{agent.upper()}", AGENT_TIERS.get(agent, DEFAULT_TIER))
+
+def model_for(agent: str) -> str:
+    pinned = os.environ.get(f"LLM_MODEL_{agent.upper()}")
+    if pinned:
+        return pinned
+    return TIER_MODELS.get(tier_for(agent), TIER_MODELS[DEFAULT_TIER])
+
+def max_tokens_for(agent: str) -> int:
+    override = os.environ.get(f"LLM_MAX_TOKENS_{agent.upper()}")
+    if override is not None:
+        return int(override)
+    return AGENT_MAX_TOKENS.get(agent, DEFAULT_MAX_TOKENS)
+
+def prompt_cache_min_tokens(model: str) -> Optional[int]:
+    return PROMPT_CACHE_MIN_TOKENS.get(model, DEFAULT_PROMPT_CACHE_MIN_TOKENS)
+
+def model_settings(agent: str) -> Dict[str, Any]:
+    """The model and max_tokens an agent's calls are sent with unless the caller passes its own."""
+    return {"model": model_for(agent), "max_tokens": max_tokens_for(agent)}
+
+def call_cost(model: str, usage: Any) -> Optional[float]:
+    """USD cost of one call from its API usage, or None for a model without a known price."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    input_price, output_price = prices
+    micro_usd = (
+        (getattr(usage, "input_tokens", 0) or 0) * input_price
+        + (getattr(usage, "cache_creation_input_tokens", 0) or 0) * input_price * CACHE_WRITE_MULTIPLIER
+        + (getattr(usage, "cache_read_input_tokens", 0) or 0) * input_price * CACHE_READ_MULTIPLIER
+        + (getattr(usage, "output_tokens", 0) or 0) * output_price
+    )
+    return micro_usd / 1_000_000
+
+class TierReport:
+    """Thread-safe latency, token and cost totals per tier, for calls that reached the API."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, agent: str, model: str, seconds: float, usage: Any) -> Optional[float]:
+        """Add one call to its agent's tier; returns the call's cost, if known."""
+        tier = tier_for(agent)
+        cost = call_cost(model, usage)
+        with self._lock:
+            entry = self._tiers.setdefault(tier, {
+                "calls": 0, "latency_seconds_total": 0.0, "latency_seconds_max": 0.0,
+                "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "unpriced_calls": 0,
+                "models": {}, "agents": {}
+            })
+            entry["calls"] += 1
+            entry["latency_seconds_total"] += seconds
+            entry["latency_seconds_max"] = max(entry["latency_seconds_max"], seconds)
+            entry["input_tokens"] += getattr(usage, "input_tokens", 0) or 0
+            entry["output_tokens"] += getattr(usage, "output_tokens", 0) or 0
+            if cost is None:
+                entry["unpriced_calls"] += 1
+            else:
+                entry["cost_usd"] += cost
+            entry["models"][model] = entry["models"].get(model, 0) + 1
+            entry["agents"][agent] = entry["agents"].get(agent, 0) + 1
+        return cost
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-tier totals with mean latency and cost per call."""
+        with self._lock:
+            tiers = {tier: dict(entry, models=dict(entry["models"]), agents=dict(entry["agents"]))
+                     for tier, entry in self._tiers.items()}
+        for entry in tiers.values():
+            calls = entry["calls"]
+            entry["latency_seconds_mean"] = entry["latency_seconds_total"] / calls
+            entry["cost_usd_per_call"] = entry["cost_usd"] / calls
+        return {
+            "tiers": tiers,
+            "assignments": {agent: {"tier": tier_for(agent), **model_settings(agent)} for agent in AGENT_TIERS}
+        }
+
+# Process-wide report, fed by the LLM gateway
+tier_report = TierReport()
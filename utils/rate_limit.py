@@ -0,0 +1,68 @@
+"""
+Client-side rate limiting for LLM calls.
+
+A token bucket refills at `rate` requests per second up to `burst`. Callers
+reserve a token and sleep for the delay they are handed, so bursts above
+the provider's limit are smoothed out locally instead of coming back as
+429s that then have to be retried.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that hands out reservations.
+
+    reserve() takes a token immediately, letting the bucket go into debt,
+    and returns how long the caller must wait before using it; waiting is
+    left to the caller, so one bucket serves both the blocking and the
+    async client.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+        self.stats = {"reserved": 0, "delayed": 0, "waited_seconds": 0.0}
+
+    def reserve(self) -> float:
+        """Take one token; return the seconds to wait before it may be used."""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.stats["reserved"] += 1
+            if delay:
+                self.stats["delayed"] += 1
+                self.stats["waited_seconds"] += delay
+            return delay
+
+    def cancel(self) -> None:
+        """Give back a reservation that won't be used (e.g. its wait exceeded the deadline)."""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, rate=self.rate, burst=self.burst)
+
+def create_rate_limiter() -> Optional[TokenBucket]:
+    """
+    Build the LLM rate limiter from the environment, or None if unlimited.
+
+    LLM_RATE_LIMIT_RPS sets the sustained requests per second (0, the
+    default, disables it) and LLM_RATE_LIMIT_BURST how many may go out
+    back to back.
+    """
+    rate = float(os.environ.get("LLM_RATE_LIMIT_RPS", "0"))
+    if rate <= 0:
+        return None
+    return TokenBucket(rate=rate, burst=int(os.environ.get("LLM_RATE_LIMIT_BURST", "10")))
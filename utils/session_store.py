@@ -0,0 +1,263 @@
+import json
+import os
+import sqlite3
+import time
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Context keys that are rebuilt on every turn and never persisted
+TRANSIENT_KEYS = ("mock_data",)
+
+def serialize_context(context: Dict[str, Any]) -> bytes:
+    """
+    Encode a session context as compact, compressed JSON.
+
+    The shared data snapshot is dropped (only its version is kept), so a
+    stored session is just its role, history and agent bookkeeping.
+    """
+    persistent = {k: v for k, v in context.items() if k not in TRANSIENT_KEYS}
+    return zlib.compress(json.dumps(persistent, separators=(",", ":")).encode())
+
+def deserialize_context(blob: bytes) -> Dict[str, Any]:
+    """Decode a context produced by serialize_context."""
+    return json.loads(zlib.decompress(blob))
+
+class SessionBackend(ABC):
+    """
+    Storage for per-session conversation context.
+
+    get() returns a private copy of the context. Concurrent turns on one
+    session each work on their own copy, so a turn saves itself with
+    update(), which re-reads the stored context and applies the turn to it
+    atomically; set() overwrites whatever is stored. Implementations evict sessions
+    that have been idle longer than ttl_seconds and, once over max_sessions,
+    the least recently used ones.
+
+    Backends whose calls do disk I/O set blocking, so async callers run
+    them in a worker thread instead of on the event loop.
+    """
+
+    blocking = False
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.evicted_expired = 0
+        self.evicted_lru = 0
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the session context, or None if it is unknown or has expired."""
+
+    @abstractmethod
+    def set(self, session_id: str, context: Dict[str, Any]) -> None:
+        """Store a session context, evicting the coldest sessions if over capacity."""
+
+    @abstractmethod
+    def update(self, session_id: str, fn: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Atomically replace a session context with fn(current context, or None).
+
+        No other update or set on the session can interleave; returns a
+        private copy of the new context.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Forget a session."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of live sessions."""
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+class InMemorySessionBackend(SessionBackend):
+    """
+    Bounded in-process session store with idle TTL and LRU eviction.
+
+    Sessions are kept serialized in least-recently-used order, so expired
+    sessions are always at the front and both eviction rules only ever look
+    at the oldest entries.
+    """
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 3600, clock: Callable[[], float] = time.monotonic):
+        super().__init__(max_sessions, ttl_seconds)
+        self.clock = clock
+        self._sessions: "OrderedDict[str, bytes]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._evict_expired()
+            blob = self._sessions.get(session_id)
+            if blob is None:
+                return None
+            self._touch(session_id)
+        return deserialize_context(blob)
+
+    def set(self, session_id: str, context: Dict[str, Any]) -> None:
+        blob = serialize_context(context)
+        with self._lock:
+            self._store(session_id, blob)
+
+    def update(self, session_id: str, fn: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            self._evict_expired()
+            blob = self._sessions.get(session_id)
+            blob = serialize_context(fn(deserialize_context(blob) if blob is not None else None))
+            self._store(session_id, blob)
+        return deserialize_context(blob)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._last_access.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict_expired()
+            return len(self._sessions)
+
+    def _store(self, session_id: str, blob: bytes) -> None:
+        self._sessions[session_id] = blob
+        self._touch(session_id)
+        self._evict_expired()
+        while len(self._sessions) > self.max_sessions:
+            oldest, _ = self._sessions.popitem(last=False)
+            del self._last_access[oldest]
+            self.evicted_lru += 1
+
+    def _touch(self, session_id: str) -> None:
+        self._sessions.move_to_end(session_id)
+        self._last_access[session_id] = self.clock()
+
+    def _evict_expired(self) -> None:
+        cutoff = self.clock() - self.ttl_seconds
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if self._last_access[oldest] > cutoff:
+                break
+            self._sessions.popitem(last=False)
+            del self._last_access[oldest]
+            self.evicted_expired += 1
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Session store in a SQLite file, shared by every worker process on a host.
+
+    Runs in WAL mode so concurrent uvicorn workers can read while another
+    one writes; a follow-up turn therefore finds its history no matter which
+    worker it lands on. Expired and over-capacity sessions are pruned every
+    prune_every writes rather than on each one.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, max_sessions: int = 10000, ttl_seconds: float = 3600, prune_every: int = 100):
+        super().__init__(max_sessions, ttl_seconds)
+        self.path = path
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND updated_at > ?",
+                (session_id, time.time() - self.ttl_seconds)
+            ).fetchone()
+        return deserialize_context(row[0]) if row else None
+
+    def set(self, session_id: str, context: Dict[str, Any]) -> None:
+        blob = serialize_context(context)
+        with self._lock:
+            self._store(session_id, blob)
+            self._count_write()
+
+    def update(self, session_id: str, fn: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so other workers' updates queue behind this one
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data FROM sessions WHERE session_id = ? AND updated_at > ?",
+                    (session_id, time.time() - self.ttl_seconds)
+                ).fetchone()
+                blob = serialize_context(fn(deserialize_context(row[0]) if row else None))
+                self._store(session_id, blob)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self._count_write()
+        return deserialize_context(blob)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE updated_at > ?",
+                (time.time() - self.ttl_seconds,)
+            ).fetchone()
+        return row[0]
+
+    def _store(self, session_id: str, blob: bytes) -> None:
+        self._conn.execute(
+            "INSERT INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (session_id, blob, time.time())
+        )
+
+    def _count_write(self) -> None:
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self._prune()
+
+    def _prune(self) -> None:
+        cursor = self._conn.execute("DELETE FROM sessions WHERE updated_at <= ?", (time.time() - self.ttl_seconds,))
+        self.evicted_expired += cursor.rowcount
+        cursor = self._conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+        self.evicted_lru += cursor.rowcount
+
+def session_db_path() -> str:
+    """Path of the SQLite file shared by the workers (SESSION_DB_PATH, default data/sessions.db)."""
+    default_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "sessions.db")
+    return os.environ.get("SESSION_DB_PATH", default_path)
+
+def create_session_backend() -> SessionBackend:
+    """
+    Build the session backend selected by the environment.
+
+    SESSION_BACKEND is "memory" (default, single process) or "sqlite"
+    (shared across workers, stored at SESSION_DB_PATH).
+    """
+    max_sessions = int(os.environ.get("SESSION_MAX_SIZE", "10000"))
+    ttl_seconds = float(os.environ.get("SESSION_TTL_SECONDS", "3600"))
+    backend = os.environ.get("SESSION_BACKEND", "memory").lower()
+
+    if backend == "sqlite":
+        return SQLiteSessionBackend(session_db_path(), max_sessions, ttl_seconds)
+    if backend == "memory":
+        return InMemorySessionBackend(max_sessions, ttl_seconds)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class SingleFlight:
+    """
+    Coalesce concurrent async calls that share a key into one execution.
+
+    The first caller for a key runs the work; callers arriving while it is
+    still in flight wait for and share its result (or exception) instead of
+    repeating it. Nothing is cached once the call completes.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"executions": 0, "coalesced": 0, "llm_calls_saved": 0}
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run fn() once per in-flight key; returns (result, shared) where shared is True for waiters."""
+        future = self._inflight.get(key)
+        if future is not None:
+            self._count("coalesced")
+            return await asyncio.shield(future), True
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._count("executions")
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody was waiting
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._inflight[key]
+    
+    def record_saved_calls(self, count: int) -> None:
+        """Credit LLM calls a waiter avoided by sharing the leader's result."""
+        self._count("llm_calls_saved", count)
+    
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, in_flight=len(self._inflight))
+    
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
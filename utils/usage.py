@@ -0,0 +1,68 @@
+import threading
+from typing import Any, Dict
+
+# Token counters taken from each Messages API response's `usage`
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+def empty_usage() -> Dict[str, int]:
+    """A zeroed usage record; `calls` counts API calls, `cached_calls` cache hits."""
+    return dict({field: 0 for field in USAGE_FIELDS}, calls=0, cached_calls=0)
+
+def add_usage(total: Dict[str, int], usage: Dict[str, int]) -> Dict[str, int]:
+    """Add one usage record into another in place and return it."""
+    for field, value in usage.items():
+        total[field] = total.get(field, 0) + (value or 0)
+    return total
+
+class UsageMeter:
+    """
+    Aggregates real token usage per agent.
+
+    One meter per query collects the calls made while answering it, and a
+    process-wide meter keeps running totals for the /usage endpoint.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_agent: Dict[str, Dict[str, int]] = {}
+    
+    def record(self, agent: str, usage: Any = None, cached: bool = False) -> None:
+        """Record one LLM call; `usage` is the response's usage object (ignored for cache hits)."""
+        entry = empty_usage()
+        if cached:
+            entry["cached_calls"] = 1
+        else:
+            entry["calls"] = 1
+            for field in USAGE_FIELDS:
+                entry[field] = getattr(usage, field, None) or 0
+        with self._lock:
+            add_usage(self.by_agent.setdefault(agent, empty_usage()), entry)
+    
+    def merge(self, other: "UsageMeter") -> None:
+        with other._lock:
+            items = [(agent, dict(usage)) for agent, usage in other.by_agent.items()]
+        with self._lock:
+            for agent, usage in items:
+                add_usage(self.by_agent.setdefault(agent, empty_usage()), usage)
+    
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            total = empty_usage()
+            for usage in self.by_agent.values():
+                add_usage(total, usage)
+            return total
+    
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            by_agent = {agent: dict(usage) for agent, usage in self.by_agent.items()}
+        return {"total": self.totals(), "by_agent": by_agent}
+
+def add_session_usage(context: Dict[str, Any], query_usage: Dict[str, Any]) -> None:
+    """Accumulate a query's UsageMeter.to_dict() into the session context (plain dicts, so it persists)."""
+    session_usage = context.setdefault("usage", {"total": empty_usage(), "by_agent": {}})
+    for agent, usage in query_usage["by_agent"].items():
+        add_usage(session_usage["by_agent"].setdefault(agent, empty_usage()), usage)
+        add_usage(session_usage["total"], usage)
+
+# Running totals for every LLM call this process has made
+usage_totals = UsageMeter()